@@ -1,7 +1,12 @@
 from pydub import AudioSegment, silence
 import os
+import sys
 from pydub.silence import detect_silence
 
+import session_catalog
+from loudness_envelope import detect_silence as detect_silence_in_envelope, load_envelope
+from track_reader import read_audio_segment
+
 # MIN_SILENCE_THRESH = -40
 # MIN_SILENCE_LEN = 1000
 # AUDIO_FOLDER = 'recordings'
@@ -16,8 +21,20 @@ from pydub.silence import detect_silence
 
 class Audiosegment():
     def __init__(self, audio_file):
-        self.audio = AudioSegment.from_file(audio_file)
+        self.audio_file = audio_file
+        # Tracks recorded by the bot come with a loudness envelope; silence is found in that
+        self.envelope = load_envelope(audio_file)
+        self._audio = None
+
+    @property
+    def audio(self):
+        if self._audio is None:
+            self._audio = read_audio_segment(self.audio_file)
+        return self._audio
+
     def split_on_silence(self, min_silence_len=1000, silence_thresh=-40):
+        if self.envelope is not None:
+            return detect_silence_in_envelope(self.envelope, min_silence_len, silence_thresh)
         return detect_silence(
             self.audio,
             min_silence_len=min_silence_len,
@@ -33,46 +50,51 @@ class Audiosegment():
             f.write("]\n")
         print(f"Time line data saved to {output_file}")
     
-    def process_audio(self, min_silence_len=1000, silence_thresh=-40, output_folder='output',i=1):
-        
+    def process_audio(self, min_silence_len=1000, silence_thresh=-40, output_folder='output', i=1, output_file=None):
+        """Write the silent parts' timestamps to output_file (default <output_folder>/silent_parts.txt<i>)"""
         try:
             non_silent = self.split_on_silence(min_silence_len, silence_thresh)
-            audio_silent = AudioSegment.empty()
             silent_parts_times = []
 
-            for i, (start_time, end_time) in enumerate(non_silent):
-                if i == 0:
+            for n, (start_time, end_time) in enumerate(non_silent):
+                if n == 0:
                     silent_start_times = 0
                 else:
-                    #silence start time is i-1 ka end time
-                    silent_start_times = non_silent[i-1][1]
+                    #silence start time is n-1 ka end time
+                    silent_start_times = non_silent[n-1][1]
                 silent_end_time = start_time
-                audio_silent += self.audio[silent_start_times:silent_end_time]
                 silent_parts_times.append((silent_start_times, silent_end_time))
-            if not os.path.exists(output_folder):
-                os.makedirs(output_folder)
-            silent_text_path = os.path.join(output_folder, f'silent_parts.txt{i}')
+            silent_text_path = output_file or os.path.join(output_folder, f'silent_parts.txt{i}')
+            os.makedirs(os.path.dirname(silent_text_path) or '.', exist_ok=True)
             self.save_time(silent_parts_times, silent_text_path)
             print(f"Processed audio saved to and time data to {silent_text_path}")
+            return silent_text_path
         except Exception as e:
             print(f"An error occurred while processing the audio: {e}")
+            raise
 
-AUDIO_FOLDER = 'recordings'
-def process_all_audio_files(folder=AUDIO_FOLDER):
-    if not os.path.exists(folder):
-        print(f"Folder {folder} does not exist.")
+def process_all_audio_files(session_id=None):
+    """Silence timestamps for every catalogued track, or one session's tracks"""
+    if session_id is None:
+        tracks = session_catalog.list_tracks()
+    else:
+        tracks = session_catalog.session_tracks(session_id)
+    if not tracks:
+        print("No tracks in catalog (python session_catalog.py import recordings)")
         return
-    
-    for i, filename in enumerate(os.listdir(folder)):
-        if filename.endswith('.wav') or filename.endswith('.mp3'):
-            audio_file_path = os.path.join(folder, filename)
-            print(f"Processing {audio_file_path}...")
-            audio_segment = Audiosegment(audio_file_path)
-            output_folder = os.path.join(folder, f'time_stamps-{filename}')
-            os.makedirs(output_folder, exist_ok=True)
+
+    for i, track in enumerate(tracks):
+        audio_file_path = track['path']
+        print(f"Processing {audio_file_path}...")
+        audio_segment = Audiosegment(audio_file_path)
+        folder, filename = os.path.split(audio_file_path)
+        output_folder = os.path.join(folder, f'time_stamps-{filename}')
+        os.makedirs(output_folder, exist_ok=True)
+        try:
             audio_segment.process_audio(output_folder=output_folder, i=i)
-        else:
-            print(f"Skipping non-audio file: {filename}")
+        except Exception:
+            continue
+        session_catalog.update_track(audio_file_path, status='cleaned')
 
 if __name__ == "__main__":
-    process_all_audio_files(AUDIO_FOLDER)
+    process_all_audio_files(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,10 +1,19 @@
 import os
+import sys
 import json
+import wave
+import numpy as np
 from pydub import AudioSegment
 from datetime import datetime
 
 from pydub.utils import which
 
+import session_catalog
+from loudness import LoudnessMeter, TARGET_LUFS, envelope_loudness, normalization_gain_db
+from loudness_envelope import load_envelope
+from multitrack_export import AlignedSession
+from track_reader import open_track, read_audio_segment
+
 # Set FFmpeg path
 ffmpeg_path = which("ffmpeg")
 if ffmpeg_path:
@@ -13,54 +22,119 @@ if ffmpeg_path:
 else:
     print("Warning: FFmpeg not found")
 
-def load_audio_files():
-    """Load audio files with proper error handling"""
+def load_audio_files(session_id):
+    """Load a session's tracks from the catalog, keyed by timeline speaker"""
     speakers = {}
-    for filename in os.listdir('recordings'):
-        if filename.endswith('.wav'):
-            filepath = os.path.join('recordings', filename)
-            try:
-                if not os.path.exists(filepath):
-                    print(f"File does not exist: {filepath}")
-                    continue
-                file_size = os.path.getsize(filepath)
-                if file_size == 0:
-                    print(f"File is empty: {filepath}")
-                    continue
-                speaker_num = filename.split('_')[0]
-                speaker_id = f"speaker_{speaker_num}"
-                try:
-                    audio = AudioSegment.from_wav(filepath)
-                except:
-                    try:
-                        audio = AudioSegment.from_file(filepath, format="wav")
-                    except:
-                        audio = AudioSegment.from_file(filepath)
-                speakers[speaker_id] = audio
-                print(f"✅ Loaded {speaker_id}: {len(audio):,} ms ({len(audio)/1000:.2f}s)")
-            except Exception as e:
-                print(f'❌ Error processing {filename}: {e}')
+    for track in session_catalog.session_tracks(session_id):
+        filepath = track['path']
+        try:
+            if track['sample_count'] == 0:
+                print(f"File is empty: {filepath}")
+                continue
+            audio = read_audio_segment(filepath)
+            speakers[track['speaker']] = audio
+            print(f"✅ Loaded {track['speaker']}: {len(audio):,} ms ({len(audio)/1000:.2f}s)")
+        except Exception as e:
+            print(f'❌ Error processing {filepath}: {e}')
     return speakers
 
-def load_timeline():
+def find_session(session_id=None):
+    """Catalog row for session_id, or the most recent session"""
+    session = session_catalog.get_session(session_id)
+    if session is None:
+        print("❌ Session not in catalog (python session_catalog.py import recordings)")
+    return session
+
+def load_timeline(session):
     """Load timeline JSON file"""
     timeline = {}
-    for filename in os.listdir('recordings'):
-        if filename.endswith('.json'):
-            filepath = os.path.join('recordings', filename)
-            try:
-                with open(filepath, 'r') as f:
-                    timeline = json.load(f)
-                print(f"✅ Timeline loaded from {filename} with {len(timeline)} speakers")
-                break
-            except Exception as e:
-                print(f'❌ Error loading {filename}: {e}')
+    filepath = session['timeline_path']
+    if not filepath:
+        return timeline
+    try:
+        with open(filepath, 'r') as f:
+            timeline = json.load(f)
+        print(f"✅ Timeline loaded from {os.path.basename(filepath)} with {len(timeline)} speakers")
+    except Exception as e:
+        print(f'❌ Error loading {filepath}: {e}')
     return timeline
 
-def create_natural_conversation_mix(speakers, timeline, max_gap_seconds=2.0):
+def has_sample_positions(timeline):
+    return any('session_sample' in seg for segments in timeline.values() for seg in segments)
+
+def speaker_gains(session, target=TARGET_LUFS):
+    """
+    dB of gain per speaker of an AlignedSession to bring each one to target.
+
+    Read from the loudness envelopes when every track has one; otherwise
+    measured (K-weighted with scipy) in one streaming pass over the session.
+    """
+    envelopes = [load_envelope(session.files[sp]) for sp in session.speakers]
+    if all(envelope is not None for envelope in envelopes):
+        loudness = [envelope_loudness(envelope, session.channels) for envelope in envelopes]
+    else:
+        meter = LoudnessMeter(len(session.speakers), session.channels, session.sample_rate)
+        for _, block in session.blocks():
+            meter.add(block)
+        loudness = meter.integrated()
+    gains = {}
+    for speaker, value in zip(session.speakers, loudness):
+        gains[speaker] = normalization_gain_db(value, target)
+        print(f"   🔊 {speaker}: {value:.1f} LUFS, {gains[speaker]:+.1f} dB")
+    return gains
+
+def write_aligned_mix(session, output_path, gains=None):
+    """Stream the session's blocks into one WAV, each speaker scaled by its gain (dB)"""
+    gains = gains or {}
+    scale = np.array([10 ** (gains.get(sp, 0.0) / 20) for sp in session.speakers], dtype=np.float32)
+    with wave.open(output_path, 'wb') as out:
+        out.setnchannels(session.channels)
+        out.setsampwidth(2)
+        out.setframerate(session.sample_rate)
+        for _, block in session.blocks():
+            mix = np.einsum('ijk,j->ik', block.astype(np.float32), scale)
+            out.writeframesraw(np.clip(np.rint(mix), -32768, 32767).astype(np.int16).tobytes())
+    return session.total_samples
+
+def track_loudness(path):
+    """
+    Integrated loudness of one track file without loading it whole: from
+    its envelope sidecar when it has one, otherwise streamed through
+    LoudnessMeter a second at a time. None for tracks that aren't 16-bit.
+    """
+    with open_track(path) as reader:
+        channels, rate = reader.getnchannels(), reader.getframerate()
+        if reader.getsampwidth() != 2:
+            return None
+        envelope = load_envelope(path)
+        if envelope is not None:
+            return envelope_loudness(envelope, channels)
+        meter = LoudnessMeter(1, channels, rate)
+        while pcm := reader.readframes(rate):
+            meter.add(np.frombuffer(pcm, dtype=np.int16).reshape(-1, 1, channels))
+        return meter.integrated()[0]
+
+def natural_mix_gains(session_id, speakers, target=TARGET_LUFS):
+    """dB of gain per loaded speaker for create_natural_conversation_mix, measured from the track files"""
+    gains = {}
+    for track in session_catalog.session_tracks(session_id):
+        speaker = track['speaker']
+        if speaker not in speakers:
+            continue
+        loudness = track_loudness(track['path'])
+        if loudness is None:
+            continue
+        gains[speaker] = normalization_gain_db(loudness, target)
+        print(f"   🔊 {speaker}: {loudness:.1f} LUFS, {gains[speaker]:+.1f} dB")
+    return gains
+
+def create_natural_conversation_mix(speakers, timeline, max_gap_seconds=2.0, gains=None):
     """
     Create natural conversation flow with minimal silence gaps.
+
+    gains (dB per speaker) is applied to each chunk as it is added.
     """
+    gains = gains or {}
     all_speech_events = []
     audio_positions = {sp: 0 for sp in speakers.keys()}
     for speaker, segments in timeline.items():
@@ -71,21 +145,29 @@ def create_natural_conversation_mix(speakers, timeline, max_gap_seconds=2.0):
                 start_dt = datetime.fromisoformat(seg['start'])
                 end_dt = datetime.fromisoformat(seg['end'])
                 duration_ms = int((end_dt - start_dt).total_seconds() * 1000)
-                all_speech_events.append({
+                event = {
                     'speaker': speaker,
                     'start_dt': start_dt,
                     'end_dt': end_dt,
                     'duration_ms': duration_ms
-                })
+                }
+                if 'sample_offset' in seg:
+                    # Exact track position instead of the running wall-clock estimate
+                    rate = speakers[speaker].frame_rate
+                    event['offset_ms'] = seg['sample_offset'] * 1000 // rate
+                    event['duration_ms'] = (seg['end_sample_offset'] - seg['sample_offset']) * 1000 // rate
+                all_speech_events.append(event)
     all_speech_events.sort(key=lambda x: x['start_dt'])
     conversation_mix = AudioSegment.silent(duration=0)
     overlap_segments = []
     for i, event in enumerate(all_speech_events):
         speaker = event['speaker']
         duration_ms = event['duration_ms']
-        start_pos = audio_positions[speaker]
+        start_pos = event.get('offset_ms', audio_positions[speaker])
         end_pos = start_pos + duration_ms
         audio_chunk = speakers[speaker][start_pos:end_pos]
+        if gains.get(speaker):
+            audio_chunk = audio_chunk.apply_gain(gains[speaker])
         audio_positions[speaker] = end_pos
         is_overlap = False
         if i > 0:
@@ -110,29 +192,57 @@ def create_natural_conversation_mix(speakers, timeline, max_gap_seconds=2.0):
         conversation_mix += overlap['audio']
     return conversation_mix
 
-def main():
+def main_aligned(session_id, output_path="aligned_conversation.wav", normalize=True):
+    print("\n2. 📁 OPENING SPEAKER TRACKS:")
+    session = AlignedSession(session_id)
+    if not session.speakers:
+        print("❌ No speaker tracks loaded!")
+        return None
+    gains = None
+    if normalize:
+        print(f"\n3. 📏 MEASURING LOUDNESS (target {TARGET_LUFS} LUFS):")
+        gains = speaker_gains(session)
+    print("\n4. 🛠️  MIXING SAMPLE-ALIGNED BLOCKS:")
+    total = write_aligned_mix(session, output_path, gains)
+    if total > 0:
+        print(f"   ✅ Saved {output_path} ({total / session.sample_rate:.2f}s)")
+        return output_path
+    print("   ❌ FAILURE: Combined track is 0 samples")
+    return None
+
+def main(session_id=None, output_path=None, normalize=True):
     print("🎙️  DISCORD AUDIO PROCESSING — NATURAL CONVERSATION FLOW")
     print("=" * 60)
-    print("\n1. 📁 LOADING AUDIO FILES:")
-    speakers = load_audio_files()
-    if not speakers:
-        print("❌ No audio files loaded!")
+    session = find_session(session_id)
+    if session is None:
         return
-    print("\n2. 📋 LOADING TIMELINE:")
-    timeline = load_timeline()
+    session_id = session['session_id']
+    print(f"\n1. 📋 LOADING TIMELINE ({session_id}):")
+    timeline = load_timeline(session)
     if not timeline:
         print("❌ No timeline loaded!")
         return
+    if has_sample_positions(timeline):
+        # Recorded with RecordingVoiceClient: place audio by sample index
+        return main_aligned(session_id, output_path or "aligned_conversation.wav", normalize)
+    print("\n2. 📁 LOADING AUDIO FILES:")
+    speakers = load_audio_files(session_id)
+    if not speakers:
+        print("❌ No audio files loaded!")
+        return
+    gains = natural_mix_gains(session_id, speakers) if normalize else None
     print("\n3. 🛠️  BUILDING NATURAL CONVERSATION MIX:")
-    conversation_mix = create_natural_conversation_mix(speakers, timeline, max_gap_seconds=2.0)
+    conversation_mix = create_natural_conversation_mix(speakers, timeline, max_gap_seconds=2.0, gains=gains)
     print("\n4. 💾 SAVING RESULT:")
     if len(conversation_mix) > 0:
-        conversation_mix.export("natural_conversation.wav", format="wav")
-        print(f"   ✅ Saved natural_conversation.wav ({len(conversation_mix):,}ms / {len(conversation_mix)/1000:.2f}s)")
+        output_path = output_path or "natural_conversation.wav"
+        conversation_mix.export(output_path, format="wav")
+        print(f"   ✅ Saved {output_path} ({len(conversation_mix):,}ms / {len(conversation_mix)/1000:.2f}s)")
         print("   🎉 SUCCESS: Audio processing completed!")
     else:
         print("   ❌ FAILURE: Combined track is 0ms")
     return conversation_mix
 
 if __name__ == "__main__":
-    main()
+    args = [arg for arg in sys.argv[1:] if arg != '--no-normalize']
+    main(args[0] if args else None, normalize='--no-normalize' not in sys.argv)
@@ -0,0 +1,122 @@
+import gc
+import math
+import statistics
+import struct
+import sys
+import time
+import types
+
+from discord import opus
+
+from decode_manager import DECODER_POOL, RecordingDecodeManager
+
+# Defaults: 20 back-to-back sessions of 8 speakers talking for 2 s each
+SESSIONS = 20
+SPEAKERS = 8
+PACKETS = 100
+
+
+class GCPauses:
+    """Wall time of every garbage collection while active, via gc.callbacks"""
+
+    def __init__(self):
+        self.pauses = []
+        self._started = None
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            self.pauses.append((info['generation'], time.perf_counter() - self._started))
+            self._started = None
+
+
+class BenchClient:
+    """Stands in for the voice client: counts decoded frames"""
+
+    def __init__(self):
+        self.frames = 0
+
+    def recv_decoded_audio(self, data):
+        self.frames += 1
+
+
+def opus_packets(count):
+    """`count` encoded 20 ms frames of a 440 Hz tone"""
+    encoder = opus.Encoder()
+    samples = opus.Encoder.SAMPLES_PER_FRAME
+    packets = []
+    for i in range(count):
+        frame = b''.join(
+            struct.pack('<hh', value, value)
+            for value in (int(8000 * math.sin(2 * math.pi * 440 * (i * samples + n) / 48000))
+                          for n in range(samples)))
+        packets.append(encoder.encode(frame, samples))
+    return packets
+
+
+def run_session(manager_cls, payloads, speakers):
+    client = BenchClient()
+    start = time.perf_counter()
+    manager = manager_cls(client)
+    manager.start()
+    for ssrc in range(speakers):
+        manager.get_decoder(ssrc)
+    start_latency = time.perf_counter() - start
+
+    def feed(first, last):
+        for seq in range(first, last):
+            for ssrc in range(speakers):
+                manager.decode_queue.append(types.SimpleNamespace(
+                    ssrc=ssrc, sequence=seq, timestamp=seq * 960, receive_time=time.perf_counter(),
+                    decrypted_data=payloads[seq], decoded_data=None, silence=False))
+
+    # Stop while the last packets are still queued, like a real /stop mid-sentence
+    feed(0, len(payloads) - 5)
+    while manager.decode_queue:
+        time.sleep(0.001)
+    feed(len(payloads) - 5, len(payloads))
+    stop = time.perf_counter()
+    manager.stop()
+    manager.join(timeout=5)
+    return start_latency, time.perf_counter() - stop
+
+
+def benchmark(name, manager_cls, payloads, sessions, speakers):
+    starts, stops = [], []
+    with GCPauses() as gc_pauses:
+        for _ in range(sessions):
+            start_latency, stop_latency = run_session(manager_cls, payloads, speakers)
+            starts.append(start_latency)
+            stops.append(stop_latency)
+    pauses = [duration for _, duration in gc_pauses.pauses]
+    full = [duration for generation, duration in gc_pauses.pauses if generation == 2]
+    print(f"\n⏱️  {name}")
+    print(f"   session start: median {statistics.median(starts) * 1000:7.2f} ms, max {max(starts) * 1000:7.2f} ms")
+    print(f"   session stop:  median {statistics.median(stops) * 1000:7.2f} ms, max {max(stops) * 1000:7.2f} ms")
+    print(f"   GC: {len(pauses)} collections ({len(full)} full), "
+          f"total {sum(pauses) * 1000:.2f} ms, longest {max(pauses, default=0) * 1000:.2f} ms")
+
+
+def main(sessions=SESSIONS, speakers=SPEAKERS, packets=PACKETS):
+    if not opus.is_loaded() and not opus._load_default():
+        print("❌ libopus not found")
+        return False
+    payloads = opus_packets(packets)
+    print(f"🎙️  {sessions} sessions × {speakers} speakers × {packets} packets")
+    benchmark("py-cord DecodeManager", opus.DecodeManager, payloads, sessions, speakers)
+    benchmark("RecordingDecodeManager (pooled decoders)", RecordingDecodeManager, payloads, sessions, speakers)
+    print(f"\n♻️  Decoder pool: {DECODER_POOL.stats()}")
+    return True
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:4]]
+    raise SystemExit(0 if main(*args) else 1)
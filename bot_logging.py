@@ -0,0 +1,112 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+from datetime import datetime
+
+# Context fields that are copied from `extra=` into every JSON record
+CONTEXT_FIELDS = ('guild_id', 'session_id', 'user_id', 'speaker')
+
+logger = logging.getLogger('recorder')
+_listener = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line, with guild/session ids when present"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['traceback'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Same `[timestamp] message` line the bot always printed"""
+
+    def format(self, record):
+        timestamp = datetime.fromtimestamp(record.created).isoformat()
+        line = f"[{timestamp}] {record.getMessage()}"
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file grows past max_bytes or is older than interval seconds"""
+
+    def __init__(self, filename, max_bytes, backup_count, interval):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding='utf-8', delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class _PassthroughQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only snapshot the message here; the listener thread does the formatting.
+        # The traceback travels as exc_text so it can become its own JSON field.
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(log_file, max_bytes=5 * 1024 * 1024, backup_count=5,
+                  interval=24 * 60 * 60, console=True):
+    """Route the `recorder` logger through a queue to a background writer thread.
+
+    Callers only pay for a queue put; formatting, console output and file
+    I/O (including rotation) happen on the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        return logger
+
+    file_handler = SizeAndTimeRotatingFileHandler(log_file, max_bytes, backup_count, interval)
+    file_handler.setFormatter(JsonLinesFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(_PassthroughQueueHandler(log_queue))
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
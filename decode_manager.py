@@ -0,0 +1,219 @@
+import collections
+import threading
+import time
+
+from discord import opus
+
+from jitter_buffer import JitterBuffer, seq_delta
+
+JITTER_DEPTH_MS = 60
+# Longest run of lost packets that gets concealed (100 ms); longer gaps stay silence
+MAX_CONCEALED_FRAMES = 5
+RTP_WRAP = 1 << 32
+OPUS_RESET_STATE = 4028
+# Decoder states kept around for reuse; more than this are freed when released
+MAX_IDLE_DECODERS = 64
+
+
+class DecoderPool:
+    """
+    Process-wide free list of opus.Decoder states.
+
+    Creating a decoder allocates libopus state through ctypes; a released
+    one is reset with OPUS_RESET_STATE and handed to the next SSRC or
+    session instead. Extra decoders are dropped on release and freed by
+    their refcount right away, with no need for the garbage collector.
+    """
+
+    def __init__(self, max_idle=MAX_IDLE_DECODERS):
+        self.max_idle = max_idle
+        self.idle = []
+        self.created = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                self.reused += 1
+                return self.idle.pop()
+            self.created += 1
+        return opus.Decoder()
+
+    def release(self, decoder):
+        opus._lib.opus_decoder_ctl(decoder._state, OPUS_RESET_STATE)
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(decoder)
+
+    def stats(self):
+        with self.lock:
+            return {'created': self.created, 'reused': self.reused, 'idle': len(self.idle)}
+
+
+DECODER_POOL = DecoderPool()
+
+
+class ConcealedFrame:
+    """Stands in for a lost packet, so recv_decoded_audio sees a contiguous stream"""
+
+    def __init__(self, ssrc, sequence, timestamp, receive_time, decoded_data):
+        self.ssrc = ssrc
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.receive_time = receive_time
+        self.decrypted_data = None
+        self.decoded_data = decoded_data
+
+
+class RecordingDecodeManager(opus.DecodeManager):
+    """
+    py-cord's DecodeManager with a per-SSRC jitter buffer in front of the
+    decoders, so each Opus decoder sees its stream in sequence order and
+    recv_decoded_audio gets packets in order too.
+
+    Discord's silence frames come through here as well (RecordingVoiceClient
+    doesn't drop them early) so they count as received rather than lost;
+    they are dropped after reordering.
+
+    A lost packet is rebuilt from the in-band FEC of the packet after it
+    when that one has arrived, and otherwise concealed with an Opus PLC
+    frame. Either way it costs one decode call, and runs of more than
+    MAX_CONCEALED_FRAMES losses (or losses before a silence frame, i.e. the
+    speaker stopping) are left to recv_decoded_audio's silence padding.
+    """
+
+    def __init__(self, client, depth_ms=JITTER_DEPTH_MS):
+        super().__init__(client)
+        self.decode_queue = collections.deque()
+        self.depth_ms = depth_ms
+        self.jitter = {}
+        self.last = {}  # ssrc -> (sequence, timestamp, receive_time) of the last frame passed on
+        self.loss_run = {}
+        self.recovered = collections.Counter()
+        self.concealed = collections.Counter()
+        # Set when a voice_reactor.DecodeWorker drives this manager instead of its own thread
+        self.worker = None
+
+    def run(self):
+        while not self._end_thread.is_set():
+            if not self.pump():
+                time.sleep(0.001)
+        self.finish()
+
+    def pump(self):
+        """Decode what is queued and release timed-out jitter holds; False if there was nothing queued"""
+        worked = False
+        while True:
+            try:
+                data = self.decode_queue.popleft()
+            except IndexError:
+                break
+            worked = True
+            jitter = self.jitter.get(data.ssrc)
+            if jitter is None:
+                jitter = self.jitter[data.ssrc] = JitterBuffer(self.depth_ms)
+            self._release(data.ssrc, jitter.push(data, time.perf_counter()))
+        self._poll_all()
+        self._release_parked()
+        return worked
+
+    def finish(self):
+        """Release everything the jitter buffers still hold; the last call before stopping"""
+        self.pump()
+        for ssrc, jitter in self.jitter.items():
+            self._release(ssrc, jitter.flush())
+        self._release_parked()
+
+    def get_decoder(self, ssrc):
+        decoder = self.decoder.get(ssrc)
+        if decoder is None:
+            decoder = self.decoder[ssrc] = DECODER_POOL.acquire()
+        return decoder
+
+    def stop(self):
+        # Unlike py-cord's, no gc.collect() (which pauses every guild's
+        # recording): decoders go back to the pool instead
+        while self.decoding:
+            time.sleep(0.005)
+        self._end_thread.set()
+        # Wait for finish() to release what the jitter buffers still hold,
+        # before the sink is cleaned up and the decoders are reused
+        if self.worker is not None:
+            if not self.worker.finish(self):
+                return  # Still busy with a decoder; let refcounting free them instead
+        elif self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=1)
+        if self.is_alive():
+            return
+        decoders, self.decoder = self.decoder, {}
+        for decoder in decoders.values():
+            DECODER_POOL.release(decoder)
+
+    def _release_parked(self):
+        # Frames RecordingVoiceClient parked for SSRCs that had no user yet
+        if getattr(self.client, 'parked', None):
+            self.client.release_parked()
+
+    def _poll_all(self):
+        now = time.perf_counter()
+        for ssrc, jitter in self.jitter.items():
+            released = jitter.poll(now)
+            if released:
+                self._release(ssrc, released)
+
+    def _release(self, ssrc, released):
+        for i, (seq, data) in enumerate(released):
+            if data is None:
+                self._conceal(ssrc, seq, released, i + 1)
+                continue
+            self.loss_run[ssrc] = 0
+            if data.decrypted_data is None or getattr(data, 'silence', False):
+                continue
+            try:
+                data.decoded_data = self.get_decoder(ssrc).decode(data.decrypted_data)
+            except opus.OpusError:
+                print("Error occurred while decoding opus frame.")
+                continue
+            self._pass_on(data)
+
+    def _conceal(self, ssrc, seq, released, start):
+        """Stand in for lost frame seq; released[start:] are the frames after it"""
+        run = self.loss_run[ssrc] = self.loss_run.get(ssrc, 0) + 1
+        last = self.last.get(ssrc)
+        if last is None or run > MAX_CONCEALED_FRAMES:
+            return
+        # Only look as far as a concealable gap could reach, by index rather than a copied slice
+        end = min(len(released), start + MAX_CONCEALED_FRAMES - run + 1)
+        following = next((released[j] for j in range(start, end) if released[j][1] is not None), None)
+        if following is None or following[1].decrypted_data is None or getattr(following[1], 'silence', False):
+            return
+        next_seq, next_data = following
+        decoder = self.get_decoder(ssrc)
+        try:
+            if seq_delta(next_seq, seq) == 1:
+                pcm = decoder.decode(next_data.decrypted_data, fec=True)
+                self.recovered[ssrc] += 1
+            else:
+                pcm = decoder.decode(None)
+                self.concealed[ssrc] += 1
+        except opus.OpusError:
+            return
+        frames = seq_delta(seq, last[0])
+        samples = len(pcm) // (2 * opus.Decoder.CHANNELS)
+        self._pass_on(ConcealedFrame(
+            ssrc, seq, (last[1] + frames * samples) % RTP_WRAP,
+            last[2] + frames * samples / opus.Decoder.SAMPLING_RATE, pcm))
+
+    def _pass_on(self, data):
+        self.last[data.ssrc] = (data.sequence, data.timestamp, data.receive_time)
+        self.client.recv_decoded_audio(data)
+
+    def stats(self):
+        """Per-SSRC received/reordered/late/lost packet counts and recovered/concealed frames"""
+        stats = {}
+        for ssrc, jitter in self.jitter.items():
+            stats[ssrc] = jitter.stats()
+            stats[ssrc]['recovered'] = self.recovered[ssrc]
+            stats[ssrc]['concealed'] = self.concealed[ssrc]
+        return stats
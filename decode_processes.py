@@ -0,0 +1,434 @@
+import atexit
+import collections
+import itertools
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+import traceback
+from multiprocessing import shared_memory
+
+from discord import opus
+from discord.sinks import RecordingException, Sink
+
+from decode_manager import RecordingDecodeManager
+from receive_path import ReceivePath
+from ssrc_map import ParkedFrames, SSRCMap
+from wave_sink import SINK_MAX_SIZE, CustomWaveSink, write_session
+
+# Worker processes that decode and write /join recordings; 0 keeps everything in the bot process
+DECODE_PROCESSES = int(os.getenv('DECODE_PROCESSES', '0'))
+# Frames one worker's ring holds (about 10 s of 8 speakers); a full ring drops new frames
+RING_SLOTS = 4096
+# Room for the record header plus the largest Opus packet (1275 bytes)
+SLOT_BYTES = 1536
+# recording id, ssrc, rtp timestamp, sequence, receive time, silence frame
+FRAME_HEADER = struct.Struct('<IIIHd?')
+# Frames kept for a recording whose start message hasn't been read yet
+MAX_EARLY_FRAMES = 500
+WORKER_POLL_SECONDS = 0.005
+METRICS_SECONDS = 1.0
+FINISH_TIMEOUT = 5.0
+SAVE_TIMEOUT = 300.0
+
+
+class ShmRing:
+    """
+    Single-producer, single-consumer ring of fixed-size slots in shared
+    memory, carrying frames from the bot to one decode process.
+
+    The first 16 bytes are the write and read counters (uint64s, each only
+    ever stored by one side), then `slots` slots of a 2-byte length and a
+    record. A slot is filled before the write counter moves past it and
+    read before the read counter does, so neither side needs a lock on the
+    other; the writer's lock only serialises receive threads in this
+    process (VOICE_REACTOR=0).
+    """
+
+    COUNTERS = 16
+
+    def __init__(self, name=None, slots=RING_SLOTS, slot_bytes=SLOT_BYTES):
+        size = self.COUNTERS + slots * slot_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self.counters = self.shm.buf[:self.COUNTERS].cast('Q')
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def put(self, header, payload):
+        """Copy one record into the next free slot; False (and counted) if the ring is full"""
+        length = len(header) + len(payload)
+        with self.lock:
+            written, read = self.counters[0], self.counters[1]
+            if written - read >= self.slots or length > self.slot_bytes - 2:
+                self.dropped += 1
+                return False
+            offset = self.COUNTERS + (written % self.slots) * self.slot_bytes
+            buf = self.shm.buf
+            struct.pack_into('<H', buf, offset, length)
+            buf[offset + 2:offset + 2 + len(header)] = header
+            buf[offset + 2 + len(header):offset + 2 + length] = payload
+            self.counters[0] = written + 1
+        return True
+
+    def take(self):
+        """Every record written so far, oldest first"""
+        written, read = self.counters[0], self.counters[1]
+        records = []
+        buf = self.shm.buf
+        while read < written:
+            offset = self.COUNTERS + (read % self.slots) * self.slot_bytes
+            length = struct.unpack_from('<H', buf, offset)[0]
+            records.append(bytes(buf[offset + 2:offset + 2 + length]))
+            read += 1
+        self.counters[1] = read
+        return records
+
+    def close(self, unlink=False):
+        self.counters.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class Frame:
+    """A decrypted packet as a decode process gets it: what RawData carries, without the crypto"""
+
+    def __init__(self, ssrc, sequence, timestamp, receive_time, decrypted_data, silence):
+        self.ssrc = ssrc
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.receive_time = receive_time
+        self.decrypted_data = decrypted_data
+        self.decoded_data = None
+        self.silence = silence
+
+
+class WorkerClient(ReceivePath):
+    """
+    The part of RecordingVoiceClient a recording needs once its frames are
+    in a decode process: the session clock, parked frames, the SSRC map
+    (as last sent by the bot) and a CustomWaveSink. Its decoder is pumped
+    by the process's loop instead of running a thread.
+    """
+
+    def __init__(self, sink, sync_start):
+        self.sink = sink
+        self.sync_start = sync_start
+        self.user_timestamps = {}
+        self.rtp_clock = {}
+        self.parked = ParkedFrames()
+        self.ssrcs = SSRCMap()
+        self.decoder = RecordingDecodeManager(self)
+        sink.init(self)
+
+    def ssrc_map(self):
+        return self.ssrcs
+
+    def metrics(self):
+        activity, speakers, memory = self.sink.live_stats()
+        return {
+            'receive': self.decoder.stats(),
+            'users': self.sink.recorded_users(),
+            'activity': activity,
+            'speakers': speakers,
+            'memory': memory,
+            'parked_dropped': self.parked.dropped,
+        }
+
+
+def _load_opus():
+    if opus.is_loaded():
+        return
+    try:
+        opus.load_opus('libopus.so.0')
+    except OSError:
+        opus._load_default()
+
+
+def run_worker(ring_name, slots, slot_bytes, control, results):
+    """
+    Main loop of a decode process: decode what the ring holds, apply
+    control messages from the bot, and send back replies and, every
+    METRICS_SECONDS, each recording's metrics. PCM never leaves the process.
+    """
+    _load_opus()
+    ring = ShmRing(ring_name, slots, slot_bytes)
+    clients = {}
+    early = collections.defaultdict(list)
+    next_metrics = time.perf_counter() + METRICS_SECONDS
+    while True:
+        received = _read_frames(ring, clients, early)
+        try:
+            message = control.get(block=not received, timeout=WORKER_POLL_SECONDS)
+        except queue.Empty:
+            message = None
+        while message is not None:
+            if message[0] == 'exit':
+                ring.close()
+                return
+            _handle(message, ring, clients, early, results)
+            try:
+                message = control.get_nowait()
+            except queue.Empty:
+                message = None
+
+        for client in clients.values():
+            try:
+                client.decoder.pump()
+            except Exception as e:
+                print(f"Decode error: {e}")
+
+        now = time.perf_counter()
+        if now >= next_metrics:
+            for recording_id, client in clients.items():
+                results.put(('metrics', recording_id, client.metrics()))
+            next_metrics = now + METRICS_SECONDS
+
+
+def _read_frames(ring, clients, early):
+    records = ring.take()
+    for record in records:
+        recording_id, ssrc, timestamp, sequence, receive_time, silence = FRAME_HEADER.unpack_from(record)
+        frame = Frame(ssrc, sequence, timestamp, receive_time, record[FRAME_HEADER.size:], silence)
+        client = clients.get(recording_id)
+        if client is not None:
+            client.decoder.decode_queue.append(frame)
+        elif len(early[recording_id]) < MAX_EARLY_FRAMES:
+            # The ring can get ahead of the start message, which goes through a pipe
+            early[recording_id].append(frame)
+    return bool(records)
+
+
+def _handle(message, ring, clients, early, results):
+    kind, recording_id = message[0], message[1]
+    try:
+        if kind == 'start':
+            sink_args, sync_start = message[2:]
+            client = clients[recording_id] = WorkerClient(CustomWaveSink(**sink_args), sync_start)
+            client.decoder.decode_queue.extend(early.pop(recording_id, ()))
+        elif kind == 'map':
+            clients[recording_id].ssrcs = SSRCMap({ssrc: {'user_id': user_id} for ssrc, user_id in message[2].items()})
+        elif kind == 'finish':
+            _read_frames(ring, clients, early)  # Whatever was sent before the finish message
+            client = clients[recording_id]
+            client.decoder.finish()
+            client.decoder.stop()
+            client.sink.cleanup()
+            results.put(('finished', recording_id, client.metrics()))
+        elif kind == 'save':
+            early.pop(recording_id, None)
+            client = clients.pop(recording_id)
+            results.put(('saved', recording_id, write_session(client.sink, *message[2:])))
+    except Exception:
+        # Tagged with the message that failed, so a late finish error isn't taken for the save's
+        results.put(('error', recording_id, (kind, traceback.format_exc())))
+
+
+class ProcessSink(Sink):
+    """
+    Stands in for a CustomWaveSink that lives in a decode process. Nothing
+    is written to it in the bot; live_stats() comes from the worker's
+    metrics and save() has the worker write the session's files.
+    """
+
+    def __init__(self, max_size=SINK_MAX_SIZE, users=(), vad=None):
+        super().__init__(filters={'time': 0, 'users': list(users), 'max_size': max_size})
+        self.sink_args = {'max_size': max_size, 'users': list(users), 'vad': vad}
+        self.manager = None
+
+    def write(self, data, user_id):
+        raise RuntimeError("A ProcessSink's audio is written by its decode process")
+
+    def cleanup(self):
+        # Runs on the receive thread (or the reactor's teardown thread), never on the loop
+        if self.manager is not None:
+            self.manager.wait_finished()
+        self.finished = True
+
+    def recorded_users(self):
+        return list(self.manager.metrics.get('users', ()))
+
+    def live_stats(self):
+        metrics = self.manager.metrics
+        return (metrics.get('activity', {'talk_time_s': {}}), metrics.get('speakers', {}),
+                metrics.get('memory', {}))
+
+    def save(self, session_id, names, directory):
+        """Blocks until the worker has written the files; same result as wave_sink.write_session"""
+        return self.manager.save(session_id, names, directory)
+
+
+class ProcessDecodeManager:
+    """
+    What RecordingVoiceClient holds as its decoder when a decode process
+    does the decoding: frames are copied into the process's ring as they
+    arrive, SSRC map changes follow them as control messages and stats()
+    is the worker's latest metrics.
+    """
+
+    worker = None  # Never on a voice_reactor.DecodeWorker
+
+    def __init__(self, process, recording_id, client):
+        self.process = process
+        self.recording_id = recording_id
+        self.client = client
+        self.map_version = None
+        self.metrics = {}
+        # Replies to 'finish' and to 'save' apart: a finish that timed out still answers later
+        self.replies = {'finish': queue.Queue(), 'save': queue.Queue()}
+
+    def start(self):
+        pass  # Nothing runs in this process
+
+    def decode(self, data):
+        if not data.decrypted_data:
+            return  # Failed to decrypt; nothing for the worker to decode
+        ssrc_map = self.client.ssrc_map()
+        if self.map_version != (id(ssrc_map), ssrc_map.version):
+            self._send_map(ssrc_map)
+        header = FRAME_HEADER.pack(self.recording_id, data.ssrc, data.timestamp, data.sequence,
+                                   data.receive_time, data.silence)
+        self.process.ring.put(header, data.decrypted_data)
+
+    def _send_map(self, ssrc_map):
+        self.map_version = (id(ssrc_map), ssrc_map.version)
+        # list() snapshots the map, which the gateway may change meanwhile
+        mapping = {ssrc: info['user_id'] for ssrc, info in list(ssrc_map.items())}
+        self.process.control.put(('map', self.recording_id, mapping))
+
+    def stop(self):
+        """Have the worker decode what is left and close its sink; doesn't wait (see wait_finished)"""
+        self._send_map(self.client.ssrc_map())
+        self.process.control.put(('finish', self.recording_id))
+
+    def wait_finished(self, timeout=FINISH_TIMEOUT):
+        try:
+            kind, payload = self.replies['finish'].get(timeout=timeout)
+        except queue.Empty:
+            print("⚠️ Decode process did not finish the recording in time")
+            return
+        if kind == 'error':
+            print(f"⚠️ Decode process failed to finish the recording: {payload}")
+
+    def save(self, session_id, names, directory):
+        self.process.control.put(('save', self.recording_id, session_id, names, directory))
+        try:
+            kind, payload = self.replies['save'].get(timeout=SAVE_TIMEOUT)
+        except queue.Empty:
+            raise RecordingException("Decode process did not save the recording in time")
+        if kind == 'error':
+            raise RecordingException(f"Decode process failed to save the recording: {payload}")
+        return payload
+
+    def stats(self):
+        return dict(self.metrics.get('receive', {}))
+
+
+class DecodeProcess:
+    """One worker process with the ring and control queue that feed it"""
+
+    def __init__(self, context, index, results):
+        self.ring = ShmRing()
+        self.control = context.Queue()
+        self.recordings = set()
+        self.process = context.Process(
+            target=run_worker, args=(self.ring.name, self.ring.slots, self.ring.slot_bytes, self.control, results),
+            daemon=True, name=f"DecodeProcess-{index}")
+
+
+class DecodeProcessPool:
+    """
+    A fixed set of decode processes, started on first use. Each recording
+    is pinned to the least busy live process for its whole life; replies
+    and metrics from all of them come back on one queue, read by a thread
+    that hands them to the recording's ProcessDecodeManager.
+    """
+
+    def __init__(self, processes=DECODE_PROCESSES):
+        # spawn, not fork: the bot has threads (and an event loop) running by now
+        self.context = multiprocessing.get_context('spawn')
+        self.size = max(1, processes)
+        self.processes = []
+        self.managers = {}
+        self.ids = itertools.count(1)
+        self.results = None
+        self.lock = threading.Lock()
+
+    def open(self, client, sink):
+        """The decode manager for a new recording into sink (a ProcessSink)"""
+        with self.lock:
+            if not self.processes:
+                self._start()
+            alive = [p for p in self.processes if p.process.is_alive()]
+            if not alive:
+                raise RecordingException("No decode process is running.")
+            process = min(alive, key=lambda p: len(p.recordings))
+            recording_id = next(self.ids)
+            manager = self.managers[recording_id] = ProcessDecodeManager(process, recording_id, client)
+            process.recordings.add(recording_id)
+        process.control.put(('start', recording_id, sink.sink_args, client.sync_start))
+        sink.manager = manager
+        return manager
+
+    def _start(self):
+        self.results = self.context.Queue()
+        self.processes = [DecodeProcess(self.context, i, self.results) for i in range(self.size)]
+        for process in self.processes:
+            process.process.start()
+        threading.Thread(target=self._collect, daemon=True, name="DecodeProcessResults").start()
+        atexit.register(self.shutdown)
+
+    def _collect(self):
+        while True:
+            kind, recording_id, payload = self.results.get()
+            manager = self.managers.get(recording_id)
+            if manager is None:
+                continue
+            if kind in ('metrics', 'finished'):
+                manager.metrics = payload
+            if kind == 'error':
+                step, payload = payload
+                if step not in manager.replies:
+                    print(f"⚠️ Decode process failed on {step}: {payload}")
+                    continue
+            else:
+                step = {'finished': 'finish', 'saved': 'save'}.get(kind)
+            if step is not None:
+                manager.replies[step].put((kind, payload))
+            if step == 'save':
+                self._close(recording_id)
+
+    def _close(self, recording_id):
+        with self.lock:
+            manager = self.managers.pop(recording_id, None)
+            if manager is not None:
+                manager.process.recordings.discard(recording_id)
+
+    def shutdown(self, timeout=2.0):
+        for process in self.processes:
+            process.control.put(('exit', None))
+        for process in self.processes:
+            process.process.join(timeout)
+            process.ring.close(unlink=True)
+        self.processes = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_decode_pool():
+    """The process-wide decode process pool, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = DecodeProcessPool()
+        return _pool
@@ -0,0 +1,107 @@
+import argparse
+import hashlib
+import os
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import session_catalog
+from track_reader import is_flac, open_track, soundfile
+
+# Frames encoded (and later verified) per read: about 1.4 s at 48 kHz, whatever the track length
+ARCHIVE_BLOCK_FRAMES = 1 << 16
+
+
+def archive_track(wav_path, flac_path=None, block_frames=ARCHIVE_BLOCK_FRAMES):
+    """
+    Losslessly encode one WAV track to FLAC in fixed-size blocks, then
+    decode it again and compare MD5s of the PCM. A FLAC that doesn't
+    round-trip is deleted and ValueError raised; the WAV is never touched.
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    if soundfile is None:
+        raise RuntimeError("FLAC archival needs soundfile (pip install soundfile)")
+    flac_path = flac_path or os.path.splitext(wav_path)[0] + '.flac'
+    source = hashlib.md5()
+    with wave.open(wav_path, 'rb') as w:
+        channels, rate, frames = w.getnchannels(), w.getframerate(), w.getnframes()
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{wav_path}: only 16-bit tracks are archived")
+        with soundfile.SoundFile(flac_path, 'w', samplerate=rate, channels=channels,
+                                 format='FLAC', subtype='PCM_16') as out:
+            while True:
+                pcm = w.readframes(block_frames)
+                if not pcm:
+                    break
+                source.update(pcm)
+                out.write(np.frombuffer(pcm, dtype=np.int16).reshape(-1, channels))
+
+    decoded = hashlib.md5()
+    decoded_frames = 0
+    with open_track(flac_path) as reader:
+        while True:
+            pcm = reader.readframes(block_frames)
+            if not pcm:
+                break
+            decoded.update(pcm)
+            decoded_frames += len(pcm) // (2 * channels)
+    if decoded.hexdigest() != source.hexdigest() or decoded_frames != frames:
+        os.remove(flac_path)
+        raise ValueError(f"{flac_path} does not decode to the same audio as {wav_path}")
+
+    return {'wav': wav_path, 'flac': flac_path, 'frames': frames, 'md5': source.hexdigest(),
+            'wav_bytes': os.path.getsize(wav_path), 'flac_bytes': os.path.getsize(flac_path)}
+
+
+def archive_sessions(session_ids=None, workers=None, keep_wav=False):
+    """
+    FLAC-encode every WAV track of the given sessions (default: every
+    catalogued session) across a process pool. Each verified track is
+    repointed to its FLAC in the catalog and its WAV deleted (unless
+    keep_wav); a session whose tracks are all FLAC is marked archived.
+    """
+    if soundfile is None:
+        print("❌ FLAC archival needs soundfile (pip install soundfile)")
+        return []
+    if session_ids is None:
+        session_ids = [row['session_id'] for row in session_catalog.list_sessions()]
+    tracks = {sid: session_catalog.session_tracks(sid) for sid in session_ids}
+    wavs = [t['path'] for rows in tracks.values() for t in rows
+            if not is_flac(t['path']) and os.path.exists(t['path'])]
+    if not wavs:
+        print("🤷 Nothing to archive")
+        return []
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(archive_track, path): path for path in wavs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {futures[future]}: {e}")
+                continue
+            session_catalog.move_track(result['wav'], result['flac'])
+            if not keep_wav:
+                os.remove(result['wav'])
+            results.append(result)
+            print(f"🗜️ {result['flac']}: {result['wav_bytes'] / 1024 / 1024:.1f} MB → "
+                  f"{result['flac_bytes'] / 1024 / 1024:.1f} MB, verified")
+
+    for session_id in session_ids:
+        rows = session_catalog.session_tracks(session_id)
+        if rows and all(is_flac(row['path']) for row in rows):
+            session_catalog.set_session_status(session_id, 'archived')
+    saved = sum(r['wav_bytes'] - r['flac_bytes'] for r in results)
+    print(f"✅ Archived {len(results)}/{len(wavs)} tracks, {saved / 1024 / 1024:.1f} MB saved")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Losslessly archive recorded tracks as FLAC")
+    parser.add_argument('sessions', nargs='*', help="session ids (default: all catalogued sessions)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--keep-wav', action='store_true', help="keep the WAV next to its FLAC")
+    args = parser.parse_args()
+    archive_sessions(args.sessions or None, args.workers, args.keep_wav)
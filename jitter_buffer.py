@@ -0,0 +1,104 @@
+SEQ_MOD = 1 << 16
+FRAME_MS = 20
+# Packets further ahead than this are a new stream (e.g. the client reconnected), not loss
+RESYNC_PACKETS = 1000
+
+
+def seq_delta(seq, ref):
+    """Signed distance from ref to seq on the 16-bit RTP sequence circle"""
+    delta = (seq - ref) % SEQ_MOD
+    return delta - SEQ_MOD if delta >= SEQ_MOD // 2 else delta
+
+
+class JitterBuffer:
+    """
+    Reorders one SSRC's packets by RTP sequence number.
+
+    In-order packets pass straight through. When a sequence number is
+    missing, later packets are held until it arrives, until the first held
+    packet has waited `depth_ms`, or until more than depth_ms worth of
+    packets are held; the missing one is then released as a loss
+    (seq, None). Packets for sequence numbers already released are late and
+    dropped. Every sequence number is stored and released at most once, so
+    the cost per packet is O(1).
+    """
+
+    def __init__(self, depth_ms=60):
+        self.depth = depth_ms / 1000
+        self.depth_packets = max(1, depth_ms // FRAME_MS)
+        self.next_seq = None
+        self.held = {}
+        self.gap_since = None
+        self.received = 0
+        self.reordered = 0
+        self.late = 0
+        self.lost = 0
+
+    def push(self, packet, now):
+        """Add a packet; returns the (seq, packet or None) now ready, in order"""
+        self.received += 1
+        seq = packet.sequence
+        if self.next_seq is None:
+            self.next_seq = seq
+        delta = seq_delta(seq, self.next_seq)
+        if delta < 0 or seq in self.held:
+            self.late += 1
+            return []
+        if delta > RESYNC_PACKETS:
+            released = self.flush()
+            self.next_seq = seq
+        else:
+            released = []
+
+        self.held[seq] = packet
+        if seq != self.next_seq:
+            self.reordered += 1
+        # Hold no more than the depth; older gaps are given up as lost
+        while seq_delta(seq, self.next_seq) >= self.depth_packets:
+            released.extend(self._advance())
+            released.extend(self._release_ready(now))
+        released.extend(self._release_ready(now))
+        return released
+
+    def poll(self, now):
+        """Give up on a missing packet once held ones waited the full depth"""
+        released = []
+        while self.held and self.gap_since is not None and now - self.gap_since >= self.depth:
+            released.extend(self._advance())
+            self.gap_since = now  # The next gap gets its own wait
+            released.extend(self._release_ready(now))
+        return released
+
+    def flush(self):
+        """Release everything held, with losses for the gaps (e.g. when recording stops)"""
+        released = []
+        while self.held:
+            released.extend(self._advance())
+            released.extend(self._release_ready(None))
+        return released
+
+    def _advance(self):
+        packet = self.held.pop(self.next_seq, None)
+        if packet is None:
+            self.lost += 1
+        seq, self.next_seq = self.next_seq, (self.next_seq + 1) % SEQ_MOD
+        return [(seq, packet)]
+
+    def _release_ready(self, now):
+        released = []
+        while self.next_seq in self.held:
+            released.extend(self._advance())
+        if not self.held:
+            self.gap_since = None
+        elif released or self.gap_since is None:
+            self.gap_since = now
+        return released
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'reordered': self.reordered,
+            'late': self.late,
+            'lost': self.lost,
+            'held': len(self.held),
+        }
@@ -0,0 +1,109 @@
+import threading
+from datetime import timedelta
+
+
+class SpeakerActivityTracker:
+    """
+    Incremental talk-time, overlap and interruption tracking for one session.
+
+    Speakers are "active" the same way CustomWaveSink builds timeline segments:
+    a segment keeps growing while packets arrive less than `gap` seconds apart.
+    Every packet only touches the speakers that are currently active, so the
+    cost per packet does not depend on how long the session has been running.
+    """
+
+    def __init__(self, gap=2.0):
+        self.gap = gap
+        self.origin = None
+        self.segment_start = {}   # speaker -> start of current segment (s)
+        self.last_seen = {}       # speaker -> end of current segment (s)
+        self.active = set()
+        self.talk_time = {}
+        self.interruptions_made = {}
+        self.interrupted_by_others = {}
+        self.open_overlaps = {}   # (sp1, sp2) -> [start, end]
+        self.overlaps = []
+        self.lock = threading.Lock()
+
+    def _seconds(self, now):
+        if self.origin is None:
+            self.origin = now
+        return (now - self.origin).total_seconds()
+
+    def _expire(self, t):
+        for speaker in [sp for sp in self.active if t - self.last_seen[sp] > self.gap]:
+            self.active.discard(speaker)
+
+    def update(self, speaker, now):
+        """Record a packet from `speaker` at datetime `now`"""
+        with self.lock:
+            t = self._seconds(now)
+            self._expire(t)
+
+            if speaker not in self.active:
+                # New segment; anyone still talking just got interrupted
+                others = [sp for sp in self.active if sp != speaker]
+                if others:
+                    self.interruptions_made[speaker] = self.interruptions_made.get(speaker, 0) + 1
+                    for other in others:
+                        self.interrupted_by_others[other] = self.interrupted_by_others.get(other, 0) + 1
+                self.segment_start[speaker] = t
+                self.last_seen[speaker] = t
+                self.active.add(speaker)
+                self.talk_time.setdefault(speaker, 0.0)
+                return
+
+            prev = self.last_seen[speaker]
+            self.talk_time[speaker] += t - prev
+            self.last_seen[speaker] = t
+
+            # The new stretch [prev, t] overlaps whatever the others have so far
+            for other in self.active:
+                if other == speaker:
+                    continue
+                start = max(prev, self.segment_start[other])
+                end = min(t, self.last_seen[other])
+                if start < end:
+                    self._add_overlap(speaker, other, start, end)
+
+    def _add_overlap(self, sp1, sp2, start, end):
+        key = tuple(sorted((sp1, sp2)))
+        current = self.open_overlaps.get(key)
+        if current is not None and start <= current[1]:
+            current[1] = max(current[1], end)
+            return
+        if current is not None:
+            self.overlaps.append((key, current[0], current[1]))
+        self.open_overlaps[key] = [start, end]
+
+    def overlap_details(self):
+        """Overlaps in the same shape overlap_data.py writes to overlap_details.json"""
+        with self.lock:
+            intervals = self.overlaps + [(key, s, e) for key, (s, e) in self.open_overlaps.items()]
+            origin = self.origin
+        entries = []
+        for (sp1, sp2), start, end in sorted(intervals, key=lambda x: x[1]):
+            start_ms, end_ms = int(start * 1000), int(end * 1000)
+            entries.append({
+                'start_iso': (origin + timedelta(milliseconds=start_ms)).isoformat(),
+                'end_iso': (origin + timedelta(milliseconds=end_ms)).isoformat(),
+                'start_ms': start_ms,
+                'end_ms': end_ms,
+                'duration_ms': end_ms - start_ms,
+                'speakers': [sp1, sp2],
+            })
+        return entries
+
+    def snapshot(self):
+        """Talk time, overlap totals and interruption counts so far"""
+        overlaps = self.overlap_details()
+        with self.lock:
+            speakers = sorted(self.talk_time)
+            return {
+                'talk_time_s': {sp: round(self.talk_time[sp], 2) for sp in speakers},
+                'interruptions_made': {sp: self.interruptions_made.get(sp, 0) for sp in speakers},
+                'interrupted': {sp: self.interrupted_by_others.get(sp, 0) for sp in speakers},
+                'active': sorted(self.active),
+                'overlap_count': len(overlaps),
+                'overlap_ms': sum(ov['duration_ms'] for ov in overlaps),
+            }
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import threading
+
+import numpy as np
+from aiohttp import web, WSMsgType
+
+from memory_budget import wav_header
+from voice_client import SAMPLING_RATE, CHANNELS
+
+FRAME_SAMPLES = SAMPLING_RATE // 50  # 20 ms
+# Frames are held back this long so speakers' packets for the same 20 ms land together
+MIX_DELAY_FRAMES = 3
+# Longest silence filled in when everyone stopped talking, beyond that the mix jumps ahead
+MAX_GAP_FRAMES = 50
+# 20 ms chunks a client may have queued (~2 s) before it is dropped as too slow
+CLIENT_QUEUE_FRAMES = 100
+LIVE_STREAM_HOST = '127.0.0.1'
+LIVE_STREAM_PORT = int(os.getenv('LIVE_STREAM_PORT', 8765))
+
+
+class LiveMixer:
+    """
+    Sums every speaker's decoded audio into 20 ms frames on the session
+    clock and broadcasts finished frames to listeners.
+
+    feed() runs on the voice client's decode thread and never blocks: frames
+    are handed to the event loop, where each client has a bounded queue. A
+    client whose queue is full is disconnected instead of slowing the
+    recorder down. Nothing is mixed while nobody is listening.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.clients = set()
+        self.frames = {}
+        self.next_frame = None
+        self.dropped_clients = 0
+        self.lock = threading.Lock()
+
+    def feed(self, data):
+        if not self.clients:
+            self.next_frame = None
+            return
+        pcm = np.frombuffer(data.decoded_data, dtype=np.int16).reshape(-1, CHANNELS)[data.pad_samples:]
+        start = data.session_sample
+        with self.lock:
+            if self.next_frame is None:
+                self.next_frame = start // FRAME_SAMPLES
+                self.frames.clear()
+            pos = start
+            while pos < start + len(pcm):
+                index, offset = divmod(pos, FRAME_SAMPLES)
+                count = min(FRAME_SAMPLES - offset, start + len(pcm) - pos)
+                if index >= self.next_frame:  # Otherwise already sent, too late to mix
+                    frame = self.frames.get(index)
+                    if frame is None:
+                        frame = self.frames[index] = np.zeros((FRAME_SAMPLES, CHANNELS), dtype=np.int32)
+                    frame[offset:offset + count] += pcm[pos - start:pos - start + count]
+                pos += count
+            ready = self._ready((start + len(pcm) - 1) // FRAME_SAMPLES - MIX_DELAY_FRAMES)
+        if ready:
+            self.loop.call_soon_threadsafe(self._broadcast, ready)
+
+    def _ready(self, last):
+        if last - self.next_frame > MAX_GAP_FRAMES:
+            skip_to = last - MAX_GAP_FRAMES
+            for index in [i for i in self.frames if i < skip_to]:
+                del self.frames[index]
+            self.next_frame = skip_to
+        chunks = []
+        while self.next_frame <= last:
+            frame = self.frames.pop(self.next_frame, None)
+            if frame is None:
+                chunks.append(bytes(FRAME_SAMPLES * CHANNELS * 2))
+            else:
+                chunks.append(np.clip(frame, -32768, 32767).astype(np.int16).tobytes())
+            self.next_frame += 1
+        return b''.join(chunks)
+
+    def _broadcast(self, chunk):
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(chunk)
+            except asyncio.QueueFull:
+                self.drop(queue)
+                self.dropped_clients += 1
+
+    def listen(self):
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_FRAMES)
+        self.clients.add(queue)
+        return queue
+
+    def drop(self, queue):
+        """Disconnect one listener; its handler stops at the None"""
+        self.clients.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def close(self):
+        for queue in list(self.clients):
+            self.drop(queue)
+
+
+class LiveStreamServer:
+    """
+    Localhost HTTP server for the live mix of each recording guild:
+
+        GET /live/<guild_id>          endless WAV (PCM s16le, 48 kHz stereo), chunked
+        GET /live/<guild_id>?raw=1    the same without the WAV header
+        GET /live/<guild_id>/ws       WebSocket, one binary message per mixed chunk
+    """
+
+    def __init__(self, host=LIVE_STREAM_HOST, port=LIVE_STREAM_PORT):
+        self.host = host
+        self.port = port
+        self.mixers = {}
+        self.runner = None
+
+    @property
+    def running(self):
+        return self.runner is not None
+
+    def url(self, guild_id):
+        return f"http://{self.host}:{self.port}/live/{guild_id}"
+
+    async def start(self):
+        if self.running or not self.port:
+            return
+        app = web.Application()
+        app.router.add_get('/live/{guild_id}', self._stream)
+        app.router.add_get('/live/{guild_id}/ws', self._websocket)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self):
+        for mixer in self.mixers.values():
+            mixer.close()
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def add_mixer(self, guild_id):
+        self.remove_mixer(guild_id)
+        mixer = self.mixers[guild_id] = LiveMixer(asyncio.get_running_loop())
+        return mixer
+
+    def remove_mixer(self, guild_id):
+        mixer = self.mixers.pop(guild_id, None)
+        if mixer is not None:
+            mixer.close()
+
+    def _mixer(self, request):
+        try:
+            return self.mixers.get(int(request.match_info['guild_id']))
+        except ValueError:
+            return None
+
+    async def _stream(self, request):
+        mixer = self._mixer(request)
+        if mixer is None:
+            raise web.HTTPNotFound(text="Not recording in that guild")
+        response = web.StreamResponse(headers={
+            'Content-Type': 'audio/L16; rate=48000; channels=2' if request.query.get('raw') else 'audio/wav',
+            'Cache-Control': 'no-cache',
+        })
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        if not request.query.get('raw'):
+            # Maximum sizes: players read until the connection closes
+            await response.write(wav_header(0xFFFFFFFF - 36, CHANNELS, SAMPLING_RATE, 2))
+        queue = mixer.listen()
+        try:
+            while (chunk := await queue.get()) is not None:
+                await response.write(chunk)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            mixer.clients.discard(queue)
+        return response
+
+    async def _websocket(self, request):
+        mixer = self._mixer(request)
+        if mixer is None:
+            raise web.HTTPNotFound(text="Not recording in that guild")
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        queue = mixer.listen()
+        reader = asyncio.create_task(self._drain(ws, mixer, queue))
+        try:
+            while (chunk := await queue.get()) is not None:
+                await ws.send_bytes(chunk)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            mixer.clients.discard(queue)
+            reader.cancel()
+            await ws.close()
+        return ws
+
+    @staticmethod
+    async def _drain(ws, mixer, queue):
+        # Notice the client closing even while no audio is being mixed
+        async for message in ws:
+            if message.type in (WSMsgType.CLOSE, WSMsgType.ERROR):
+                break
+        mixer.drop(queue)
@@ -0,0 +1,133 @@
+import math
+
+import numpy as np
+
+try:
+    from scipy.signal import lfilter
+except ImportError:  # Optional: without scipy loudness is measured unweighted
+    lfilter = None
+
+# EBU R128 programme loudness
+TARGET_LUFS = -23.0
+# Limits on the gain one speaker gets, so a near-silent track isn't pumped up into noise
+MAX_BOOST_DB = 20.0
+MAX_CUT_DB = 30.0
+# BS.1770 gating: 400 ms blocks every 100 ms, -70 LUFS absolute and -10 LU relative gates
+SUB_BLOCK_MS = 100
+BLOCK_SUB_BLOCKS = 4
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+# Block loudness is kept as a histogram of 0.1 LU bins, so memory doesn't grow with the session
+HISTOGRAM_TOP_LUFS = 5.0
+HISTOGRAM_STEP_LU = 0.1
+HISTOGRAM_BINS = int((HISTOGRAM_TOP_LUFS - ABSOLUTE_GATE_LUFS) / HISTOGRAM_STEP_LU)
+FULL_SCALE = 32768.0
+
+
+def k_weighting(sample_rate):
+    """The two BS.1770 pre-filter biquads (high shelf, high pass) as [(b, a), (b, a)]"""
+    # libebur128's analog prototypes, so any sample rate works
+    gain_db, f0, q = 3.999843853973347, 1681.974450955533, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+             [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    high_pass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+    return [shelf, high_pass]
+
+
+def lufs(mean_square):
+    return -0.691 + 10 * math.log10(mean_square) if mean_square > 0 else -math.inf
+
+
+class LoudnessMeter:
+    """
+    Integrated loudness of several aligned streams (speakers), fed block
+    by block as (samples, streams, channels) int16 arrays.
+
+    Each stream is K-weighted when scipy is available (filter state is
+    carried across blocks) and gated as in BS.1770 / EBU R128. Per-sample
+    work is vectorised over streams and channels; what is kept between
+    blocks is the filter state, the last three 100 ms sub-blocks and a
+    fixed-size histogram per stream.
+    """
+
+    def __init__(self, streams, channels, sample_rate, weighted=True):
+        self.streams = streams
+        self.sub_block = sample_rate * SUB_BLOCK_MS // 1000
+        self.filters = k_weighting(sample_rate) if weighted and lfilter is not None else []
+        self.states = [np.zeros((2, streams, channels)) for _ in self.filters]
+        self.pending = np.zeros((0, streams))  # Channel-summed squares of an unfinished sub-block
+        self.recent = np.zeros((0, streams))   # Mean squares of the last sub-blocks
+        self.histogram = np.zeros((streams, HISTOGRAM_BINS), dtype=np.int64)
+
+    @property
+    def weighted(self):
+        return bool(self.filters)
+
+    def add(self, block):
+        x = block.astype(np.float64) / FULL_SCALE
+        for i, (b, a) in enumerate(self.filters):
+            x, self.states[i] = lfilter(b, a, x, axis=0, zi=self.states[i])
+        squares = np.concatenate([self.pending, np.einsum('ijk,ijk->ij', x, x)])
+        whole = len(squares) - len(squares) % self.sub_block
+        self.pending = squares[whole:]
+        if whole:
+            self.add_sub_blocks(squares[:whole].reshape(-1, self.sub_block, self.streams).mean(axis=1))
+
+    def add_sub_blocks(self, mean_squares):
+        """Feed 100 ms mean squares (sub-blocks, streams) directly, e.g. from an envelope"""
+        subs = np.concatenate([self.recent, mean_squares])
+        if len(subs) >= BLOCK_SUB_BLOCKS:
+            sums = np.concatenate([np.zeros((1, self.streams)), np.cumsum(subs, axis=0)])
+            blocks = (sums[BLOCK_SUB_BLOCKS:] - sums[:-BLOCK_SUB_BLOCKS]) / BLOCK_SUB_BLOCKS
+            with np.errstate(divide='ignore'):
+                loudness = -0.691 + 10 * np.log10(blocks)
+            bins = np.floor((loudness - ABSOLUTE_GATE_LUFS) / HISTOGRAM_STEP_LU)
+            for stream in range(self.streams):
+                b = bins[:, stream]
+                b = b[np.isfinite(b) & (b >= 0)].astype(np.int64)
+                np.add.at(self.histogram[stream], np.minimum(b, HISTOGRAM_BINS - 1), 1)
+        self.recent = subs[-(BLOCK_SUB_BLOCKS - 1):]
+
+    def integrated(self):
+        """Gated integrated loudness per stream in LUFS; -inf for a stream that never got above the gate"""
+        centres = ABSOLUTE_GATE_LUFS + (np.arange(HISTOGRAM_BINS) + 0.5) * HISTOGRAM_STEP_LU
+        energies = 10 ** ((centres + 0.691) / 10)
+        results = []
+        for counts in self.histogram:
+            if not counts.any():
+                results.append(-math.inf)
+                continue
+            relative_gate = lufs(np.dot(counts, energies) / counts.sum()) + RELATIVE_GATE_LU
+            gated = np.where(centres >= relative_gate, counts, 0)
+            results.append(lufs(np.dot(gated, energies) / gated.sum()) if gated.any() else -math.inf)
+        return results
+
+
+def envelope_loudness(envelope, channels=2, block_ms=10):
+    """
+    Integrated loudness of a track from its loudness_envelope sidecar,
+    without reading the audio. Unweighted (the envelope is plain RMS), so
+    it reads a little different from a K-weighted measurement of speech.
+    """
+    per_sub = SUB_BLOCK_MS // block_ms
+    rms = np.asarray(envelope[:, 0], dtype=np.float64) / FULL_SCALE
+    rms = rms[:len(rms) - len(rms) % per_sub]
+    # The envelope's RMS is over interleaved samples; BS.1770 sums the channels
+    mean_squares = (rms ** 2).reshape(-1, per_sub).mean(axis=1) * channels
+    meter = LoudnessMeter(1, channels, 48000, weighted=False)
+    meter.add_sub_blocks(mean_squares.reshape(-1, 1))
+    return meter.integrated()[0]
+
+
+def normalization_gain_db(loudness, target=TARGET_LUFS):
+    """Gain in dB bringing a stream measured at `loudness` LUFS to target; 0 if it was silent"""
+    if not math.isfinite(loudness):
+        return 0.0
+    return min(MAX_BOOST_DB, max(-MAX_CUT_DB, target - loudness))
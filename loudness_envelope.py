@@ -0,0 +1,144 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+# One (rms, peak) int16 pair per 10 ms of track: 400 bytes a second against 192 kB of PCM
+ENVELOPE_MS = 10
+ENVELOPE_SUFFIX = '.envelope.npy'
+SAMPLING_RATE = 48000
+CHANNELS = 2
+FULL_SCALE = 32768
+
+
+def envelope_path(track_path):
+    """Where the envelope of a track is kept: next to it, <track>.envelope.npy"""
+    return os.path.splitext(track_path)[0] + ENVELOPE_SUFFIX
+
+
+class EnvelopeBuilder:
+    """
+    Per-10 ms RMS and peak of one track, built as its PCM is written.
+
+    PCM comes in as interleaved int16 chunks of any length; what doesn't
+    fill a whole block is carried over to the next chunk. RMS is taken
+    over all channels' samples together, like pydub's and audioop's.
+    """
+
+    def __init__(self, sample_rate=SAMPLING_RATE, channels=CHANNELS, block_ms=ENVELOPE_MS):
+        self.block = sample_rate * block_ms // 1000 * channels
+        self.values = bytearray()
+        self.carry = np.zeros(0, dtype=np.int16)
+
+    def add(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        if len(self.carry):
+            samples = np.concatenate([self.carry, samples])
+        whole = len(samples) - len(samples) % self.block
+        if whole:
+            self._blocks(samples[:whole].reshape(-1, self.block))
+        self.carry = samples[whole:].copy()
+
+    def finish(self):
+        """The envelope as an (blocks, 2) int16 array, including a last partial block"""
+        if len(self.carry):
+            self._blocks(self.carry.reshape(1, -1))
+            self.carry = np.zeros(0, dtype=np.int16)
+        return np.frombuffer(bytes(self.values), dtype='<i2').reshape(-1, 2)
+
+    def _blocks(self, blocks):
+        wide = blocks.astype(np.int64)
+        rms = np.sqrt(np.einsum('ij,ij->i', wide, wide) / blocks.shape[1])
+        peak = np.abs(wide).max(axis=1)
+        pairs = np.stack([np.minimum(np.rint(rms), 32767), np.minimum(peak, 32767)], axis=1)
+        self.values += pairs.astype('<i2').tobytes()
+
+
+def write_envelope(envelope, path):
+    np.save(path, np.ascontiguousarray(envelope, dtype='<i2'))
+    return path
+
+
+def load_envelope(track_path):
+    """The (blocks, 2) rms/peak array recorded with a track, or None when it has none"""
+    path = envelope_path(track_path)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def to_dbfs(value):
+    return 20 * math.log10(value / FULL_SCALE) if value > 0 else -math.inf
+
+
+def level_stats(envelope, silence_thresh=-40):
+    """Duration, overall RMS, peak and the share of blocks quieter than silence_thresh dBFS"""
+    rms = np.asarray(envelope[:, 0], dtype=np.float64)
+    peak = int(envelope[:, 1].max()) if len(envelope) else 0
+    mean_square = float(np.dot(rms, rms) / len(rms)) if len(rms) else 0.0
+    threshold = FULL_SCALE * 10 ** (silence_thresh / 20)
+    return {
+        'duration_ms': len(envelope) * ENVELOPE_MS,
+        'rms_dbfs': to_dbfs(math.sqrt(mean_square)),
+        'peak': peak,
+        'peak_dbfs': to_dbfs(peak),
+        'silent_fraction': float(np.count_nonzero(rms <= threshold) / len(rms)) if len(rms) else 1.0,
+    }
+
+
+def detect_silence(envelope, min_silence_len=1000, silence_thresh=-16):
+    """
+    pydub.silence.detect_silence from the envelope: [start_ms, end_ms]
+    ranges of at least min_silence_len ms whose RMS stays at or below
+    silence_thresh dBFS, on a 10 ms grid instead of pydub's 1 ms one.
+    """
+    window = max(1, min_silence_len // ENVELOPE_MS)
+    if len(envelope) < window:
+        return []
+    squares = np.asarray(envelope[:, 0], dtype=np.float64) ** 2
+    sums = np.concatenate([[0.0], np.cumsum(squares)])
+    window_rms = np.sqrt((sums[window:] - sums[:-window]) / window)
+    threshold = FULL_SCALE * 10 ** (silence_thresh / 20)
+    starts = np.flatnonzero(window_rms <= threshold)
+    if not len(starts):
+        return []
+    # Runs of consecutive silent windows become one range
+    breaks = np.flatnonzero(np.diff(starts) != 1)
+    run_starts = np.concatenate([[starts[0]], starts[breaks + 1]])
+    run_ends = np.concatenate([starts[breaks], [starts[-1]]])
+    return [[int(s) * ENVELOPE_MS, (int(e) + window) * ENVELOPE_MS] for s, e in zip(run_starts, run_ends)]
+
+
+def overview(envelope, width=80):
+    """(rms, peak) per column for drawing a waveform `width` columns wide"""
+    columns = []
+    if not len(envelope):
+        return columns
+    for chunk in np.array_split(np.asarray(envelope), min(width, len(envelope))):
+        rms = chunk[:, 0].astype(np.float64)
+        columns.append((math.sqrt(float(np.dot(rms, rms)) / len(rms)), int(chunk[:, 1].max())))
+    return columns
+
+
+def print_overview(track_path, width=80, height=8):
+    envelope = load_envelope(track_path)
+    if envelope is None:
+        print(f"❌ No envelope for {track_path}")
+        return
+    stats = level_stats(envelope)
+    print(f"📈 {track_path}: {stats['duration_ms'] / 1000:.1f}s, RMS {stats['rms_dbfs']:.1f} dBFS, "
+          f"peak {stats['peak_dbfs']:.1f} dBFS, {stats['silent_fraction'] * 100:.0f}% below -40 dBFS")
+    columns = overview(envelope, width)
+    # Rows from the top, on a 60 dB scale; '#' for RMS, '.' for the peak above it
+    for row in range(height, 0, -1):
+        level = -60 * (1 - row / height)
+        print(''.join('#' if to_dbfs(rms) >= level else '.' if to_dbfs(peak) >= level else ' '
+                      for rms, peak in columns))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python loudness_envelope.py <track.wav> [width]")
+        sys.exit(1)
+    print_overview(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 80)
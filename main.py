@@ -1,183 +1,301 @@
+import time
+STARTED_AT = time.perf_counter()
+
 import os
-from os import environ as env
 from dotenv import load_dotenv
 import discord
 import traceback
-from datetime import datetime, timedelta
-from collections import defaultdict
-import json
-import wave
-import contextlib
-import pyttsx3
-from pydub import AudioSegment
+from datetime import datetime
 import asyncio
-import os
-from gtts import gTTS
-import io
-
-
-load_dotenv()
-TOKEN = os.getenv('DISCORD_TOKEN_1')
-RECORDING_DIR = 'recordings'
-LOG_FILE = 'recording_debug.log'
+from bot_logging import setup_logging
+from voice_client import RecordingVoiceClient, SAMPLING_RATE
+from memory_budget import PROCESS_BUDGET
 
-# Improved Opus loading with fallback
-try:
-    discord.opus.load_opus('libopus.so.0')  # Common Linux path
-except OSError:
-    try:
-        discord.opus.load_opus('opus')  # Try default name
-    except:
-        print("⚠️ Opus not loaded - voice may not work")
+# TTS (pyttsx3, gtts), audio post-processing (pydub) and the recording sinks,
+# catalog and live stream server (numpy, multiprocessing, sqlite3) are imported
+# inside the commands that use them, so a restart doesn't pay for them or for
+# pydub's ffmpeg probe.
 
-print("Opus loaded:", discord.opus.is_loaded())
 
-intents = discord.Intents.default()
-intents.voice_states = True
-intents.guilds = True
-intents.messages = True
-intents.message_content = True
+RECORDING_DIR = 'recordings'
+CLIP_DIR = os.path.join(RECORDING_DIR, 'clips')
+# /clip window kept alongside a full /join recording; off unless set (about 11.5 MB
+# per speaker plus 23 MB for the mix per minute)
+JOIN_REPLAY_SECONDS = int(os.getenv('JOIN_REPLAY_SECONDS', '0'))
+# Write the N-channel WAV after every /stop; off unless set, since it rereads every
+# track (python multitrack_export.py <session_id> makes one on demand)
+EXPORT_MULTITRACK = os.getenv('EXPORT_MULTITRACK', '0') != '0'
+LOG_FILE = 'recording_debug.jsonl'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_ROTATE_SECONDS = 24 * 60 * 60
 
-bot = discord.Bot(intents=intents)
+# Set up by main(), not at import: decode processes are spawned and re-import
+# this module as __mp_main__, and must not open the log or build a Bot
+bot = None
+logger = None
+live_server = None
 connections = {}
 
-def log(message):
-    timestamp = datetime.now().isoformat()
-    print(f"[{timestamp}] {message}")
-    with open(LOG_FILE, 'a') as f:
-        f.write(f"[{timestamp}] {message}\n")
+def load_opus():
+    """Improved Opus loading with fallback, done once before voice is needed"""
+    if discord.opus.is_loaded():
+        return True
+    try:
+        discord.opus.load_opus('libopus.so.0')  # Common Linux path
+    except OSError:
+        try:
+            discord.opus.load_opus('opus')  # Try default name
+        except:
+            print("⚠️ Opus not loaded - voice may not work")
+    return discord.opus.is_loaded()
+
+def log(message, **fields):
+    """Queue a log record; pass guild_id/session_id/user_id to tag it"""
+    logger.info(message, extra=fields)
 
-@bot.event
 async def on_ready():
-    log("Bot ready")
+    print("Opus loaded:", load_opus())
+    log(f"Bot ready in {time.perf_counter() - STARTED_AT:.2f}s")
     print(f"✅ Logged in as {bot.user}")
+    global live_server
+    from live_stream import LiveStreamServer
+    live_server = live_server or LiveStreamServer()
+    try:
+        await live_server.start()
+    except OSError as e:
+        log(f"Live stream server not started: {e}")
+    if os.getenv('STARTUP_CHECK'):
+        # startup_check.py only needs the time to on_ready
+        await bot.close()
 
-class CustomWaveSink(discord.sinks.WaveSink):
-    def __init__(self):
-        super().__init__()
-        self.time_segments = defaultdict(list)
-        self.last_seen = {}
-        self.user_id_map = {}
-        self.speaker_counter = 1
-        self.first_data_received = {}  # Track first data per user
-
-    def write(self, data, user_id):
-        """Fixed parameter order: (data, user_id)"""
-        if user_id not in self.user_id_map:
-            speaker_label = f"speaker_{len(self.user_id_map) + 1}"
-            self.user_id_map[user_id] = speaker_label
-            self.first_data_received[user_id] = datetime.now()
-
-        speaker = self.user_id_map[user_id]
-        now = datetime.now()
-
-        # Initialize if first segment
-        if user_id not in self.last_seen:
-            self.time_segments[speaker].append({
-                'start': self.first_data_received[user_id],
-                'end': now
-            })
-            self.last_seen[user_id] = now
-            super().write(data, user_id)
-            return
-
-        last = self.last_seen[user_id]
-        gap = (now - last).total_seconds()
-
-        # Extend segment if within 2s gap, else new segment
-        if gap <= 2.0:
-            self.time_segments[speaker][-1]['end'] = now
-        else:
-            # Insert silence segment
-            self.time_segments[speaker].append({
-                'start': last + timedelta(seconds=1),
-                'end': now - timedelta(seconds=1),
-                'silent': True
-            })
-            # New speech segment
-            self.time_segments[speaker].append({
-                'start': now,
-                'end': now
-            })
-
-        self.last_seen[user_id] = now
-        super().write(data, user_id)
-
-    def get_timeline_data(self):
-        return dict(self.time_segments)
-
-@bot.command()
-async def join(ctx):
+async def join(ctx, only: discord.Member = None):
     # Prefer ctx.author.voice for reliability
     voice = getattr(ctx.author, 'voice', None)
-    log(f"[DEBUG] ctx.author: {ctx.author}, ctx.author.voice: {voice}")
+    log(f"[DEBUG] ctx.author: {ctx.author}, ctx.author.voice: {voice}", guild_id=ctx.guild.id)
     if not voice:
         await ctx.respond("⚠️ Join a voice channel first")
         return
     try:
-        vc = await voice.channel.connect()
+        load_opus()
+        vc = await voice.channel.connect(cls=RecordingVoiceClient)
         connections[ctx.guild.id] = vc
         
         session_id = f"{ctx.guild.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
+        # The WAV writer gets every frame directly; the /clip ring buffer (if
+        # enabled) is a branch with its own queue, so it can never hold up the disk writer
+        from decode_processes import DECODE_PROCESSES, ProcessSink
+        from vad import VAD_MODE
+        from wave_sink import CustomWaveSink
+        users = [only.id] if only else ()
+        if DECODE_PROCESSES:
+            # Decoded and written in a decode process; no PCM here for /clip or the live mix
+            sink = ProcessSink(users=users, vad=VAD_MODE)
+        elif not JOIN_REPLAY_SECONDS:
+            sink = CustomWaveSink(users=users, vad=VAD_MODE)
+        else:
+            from ring_buffer import RingBufferSink
+            from tee_sink import Branch, TeeSink
+            replay = RingBufferSink(JOIN_REPLAY_SECONDS, users=users)
+            replay.session_id = session_id
+            sink = TeeSink(CustomWaveSink(users=users, vad=VAD_MODE),
+                           [Branch(replay, overflow='drop_oldest')])
         vc.start_recording(
-            CustomWaveSink(),
+            sink,
             lambda sink, channel: save_to_file(sink, channel, session_id),
             ctx.channel
         )
-        await ctx.respond("🔴 Recording started")
+        await ctx.respond("🔴 Recording started" + ("" if DECODE_PROCESSES else start_live_mix(vc, ctx.guild.id)))
     except Exception as e:
-        log(f"Join error: {traceback.format_exc()}")
+        log(f"Join error: {traceback.format_exc()}", guild_id=ctx.guild.id)
         await ctx.respond(f"❌ Error: {str(e)}")
 
+async def replay(ctx, seconds: int = None):
+    """Keep only the last few minutes in memory; /clip saves them"""
+    from ring_buffer import REPLAY_SECONDS, RingBufferSink
+    seconds = seconds or REPLAY_SECONDS
+    voice = getattr(ctx.author, 'voice', None)
+    if not voice:
+        await ctx.respond("⚠️ Join a voice channel first")
+        return
+    if ctx.guild.id in connections:
+        await ctx.respond("⚠️ Already recording")
+        return
+    try:
+        load_opus()
+        vc = await voice.channel.connect(cls=RecordingVoiceClient)
+        connections[ctx.guild.id] = vc
+
+        session_id = f"{ctx.guild.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        sink = RingBufferSink(seconds)
+        sink.session_id = session_id
+        vc.start_recording(sink, lambda sink, channel: save_clip(sink, channel, session_id), ctx.channel)
+        await ctx.respond(f"⏺️ Instant replay on: keeping the last {seconds}s" + start_live_mix(vc, ctx.guild.id))
+    except Exception as e:
+        log(f"Replay error: {traceback.format_exc()}", guild_id=ctx.guild.id)
+        await ctx.respond(f"❌ Error: {str(e)}")
+
+def start_live_mix(vc, guild_id):
+    """Serve the recording's live mix on localhost; returns a note for the reply"""
+    if live_server is None or not live_server.running:
+        return ""
+    vc.mixer = live_server.add_mixer(guild_id)
+    return f"\n🎧 Live mix: {live_server.url(guild_id)}"
+
+def recording_sink(vc, cls):
+    """The running sink of type cls, looking inside a TeeSink"""
+    from tee_sink import TeeSink
+    sink = getattr(vc, 'sink', None)
+    if not vc or not vc.recording:
+        return None
+    if isinstance(sink, TeeSink):
+        return sink.find(cls)
+    return sink if isinstance(sink, cls) else None
+
+async def clip(ctx):
+    from ring_buffer import RingBufferSink
+    sink = recording_sink(connections.get(ctx.guild.id), RingBufferSink)
+    if sink is None:
+        await ctx.respond("⚠️ No replay buffer, start with /replay (or set JOIN_REPLAY_SECONDS for /join)")
+        return
+    await ctx.respond(f"✂️ Saving the last {sink.window_seconds}s...")
+    await save_clip(sink, ctx.channel, sink.session_id)
+
+async def save_clip(sink, channel, session_id):
+    """Write the ring buffer's current window without stopping the recording"""
+    from ring_buffer import write_clip
+    os.makedirs(CLIP_DIR, exist_ok=True)
+    tracks, mix = await asyncio.to_thread(sink.snapshot)
+    if not tracks:
+        await channel.send("🤫 Nothing recorded yet")
+        return
+    stamp = datetime.now().strftime('%H%M%S')
+    for user_id, pcm in tracks.items():
+        member = channel.guild.get_member(user_id)
+        safe_name = safe_display_name(member.display_name if member else str(user_id))
+        path = f"{CLIP_DIR}/{session_id}_clip{stamp}_{safe_name}_{user_id}.wav"
+        await asyncio.to_thread(write_clip, pcm, path)
+    if mix is not None:
+        await asyncio.to_thread(write_clip, mix, f"{CLIP_DIR}/{session_id}_clip{stamp}_mix.wav")
+    seconds = len(next(iter(tracks.values()))) / SAMPLING_RATE
+    await channel.send(f"🎬 Clip saved: {len(tracks)} speakers, {seconds:.1f}s (`{session_id}_clip{stamp}`)")
+
+def safe_display_name(name):
+    return "".join(c for c in name if c.isalnum() or c in ' _-').rstrip()
+
 async def save_to_file(sink, channel, session_id):
-    os.makedirs(RECORDING_DIR, exist_ok=True)
-    
-    # 1. Save audio files
-    for user_id, audio in sink.audio_data.items():
+    import session_catalog
+    from decode_processes import ProcessSink
+    from wave_sink import write_session
+    sink = getattr(sink, 'primary', sink)  # The WAV writer behind a TeeSink
+
+    names = {}
+    for user_id in sink.recorded_users():
         try:
             user = await channel.guild.fetch_member(user_id)
-            safe_name = "".join(c for c in user.display_name if c.isalnum() or c in ' _-').rstrip()
-            filename = f"{RECORDING_DIR}/{session_id}_{safe_name}_{user_id}.wav"
-            
-            with open(filename, 'wb') as f:
-                f.write(audio.file.getvalue())
-            await channel.send(f"💾 Saved {safe_name}'s audio")
-        except Exception as e:
-            log(f"Save error for {user_id}: {traceback.format_exc()}")
-    
-    # 2. Save timeline with silence segments
-    timeline = {
-        user_id: [
-            {
-                'start': seg['start'].isoformat(),
-                'end': seg['end'].isoformat(),
-                'silent': seg.get('silent', False)
-            } 
-            for seg in segments
-        ]
-        for user_id, segments in sink.get_timeline_data().items()
-    }
-    
-    timeline_path = f"{RECORDING_DIR}/{session_id}_timeline.json"
-    with open(timeline_path, 'w') as f:
-        json.dump(timeline, f, indent=2)
-    
+            names[user_id] = safe_display_name(user.display_name)
+        except Exception:
+            log(f"Save error for {user_id}: {traceback.format_exc()}",
+                guild_id=channel.guild.id, session_id=session_id, user_id=user_id)
+
+    # Tracks, timeline and overlaps; written by the decode process that holds a ProcessSink's audio
+    if isinstance(sink, ProcessSink):
+        saved = await asyncio.to_thread(sink.save, session_id, names, RECORDING_DIR)
+    else:
+        saved = await asyncio.to_thread(write_session, sink, session_id, names, RECORDING_DIR)
+    for user_id, error in saved['errors'].items():
+        log(f"Save error for {user_id}: {error}",
+            guild_id=channel.guild.id, session_id=session_id, user_id=user_id)
+    for track in saved['tracks']:
+        await channel.send(f"💾 Saved {track['name']}'s audio")
+    log(f"Recording memory: {saved['memory']}", guild_id=channel.guild.id, session_id=session_id)
+    if saved['vad']:
+        log(f"VAD frames: {saved['vad']}", guild_id=channel.guild.id, session_id=session_id)
+
+    tracks, timeline_path = saved['tracks'], saved['timeline']
     await channel.send(f"⏱️ Timeline saved: `{timeline_path}`")
 
-@bot.command()
+    # Catalog the session so tools can find its tracks without scanning the directory
+    started_at = datetime.strptime(session_id.split('_', 1)[1], '%Y%m%d_%H%M%S')
+    await asyncio.to_thread(session_catalog.record_session, session_id, channel.guild.id,
+                            started_at, timeline_path, tracks)
+
+    # One N-channel WAV with a channel per speaker, streamed off the event loop
+    if not EXPORT_MULTITRACK:
+        return
+    try:
+        from multitrack_export import export_multitrack
+        multitrack_path = await asyncio.to_thread(export_multitrack, session_id)
+        if multitrack_path:
+            await channel.send(f"🎚️ Multitrack saved: `{multitrack_path}`")
+    except Exception:
+        log(f"Multitrack export error: {traceback.format_exc()}",
+            guild_id=channel.guild.id, session_id=session_id)
+
 async def stop(ctx):
     if ctx.guild.id not in connections:
         await ctx.respond("⚠️ Not recording")
         return
 
     vc = connections[ctx.guild.id]
+    if live_server is not None:
+        live_server.remove_mixer(ctx.guild.id)
     vc.stop_recording()
-    await vc.disconnect()
     del connections[ctx.guild.id]
     await ctx.respond("⏹️ Recording stopped")
+    try:
+        # The decoder finishes off the loop; let it drain the socket before it is closed
+        await vc.finishing
+    finally:
+        await vc.disconnect()
+
+async def live_stats(ctx):
+    from decode_processes import ProcessSink
+    from wave_sink import CustomWaveSink
+    vc = connections.get(ctx.guild.id)
+    sink = recording_sink(vc, (CustomWaveSink, ProcessSink))
+    if sink is None:
+        await ctx.respond("⚠️ Not recording")
+        return
+
+    stats, speakers, memory = sink.live_stats()
+    if not stats['talk_time_s']:
+        await ctx.respond("🤫 Nobody has spoken yet")
+        return
+
+    names = {}
+    for user_id, speaker in speakers.items():
+        member = ctx.guild.get_member(user_id)
+        names[speaker] = member.display_name if member else speaker
+
+    lines = ["📊 **Live stats**"]
+    for speaker, seconds in stats['talk_time_s'].items():
+        talking = " 🎙️" if speaker in stats['active'] else ""
+        lines.append(
+            f"{names.get(speaker, speaker)}: {seconds:.1f}s talk time, "
+            f"{stats['interruptions_made'][speaker]} interruptions, "
+            f"interrupted {stats['interrupted'][speaker]}x{talking}"
+        )
+    lines.append(f"Overlaps: {stats['overlap_count']} ({stats['overlap_ms'] / 1000:.1f}s)")
+    packets = vc.receive_stats().values()
+    lines.append(
+        f"Network: {sum(p['lost'] for p in packets)} lost, {sum(p['late'] for p in packets)} late, "
+        f"{sum(p['reordered'] for p in packets)} reordered of {sum(p['received'] for p in packets)} packets; "
+        f"{sum(p['recovered'] for p in packets)} recovered by FEC, {sum(p['concealed'] for p in packets)} concealed"
+    )
+    process = PROCESS_BUDGET.metrics()
+    lines.append(
+        f"Memory: {memory['in_memory_bytes'] / 1024 / 1024:.1f} MB buffered, "
+        f"{memory['spilled_buffers']}/{memory['buffers']} tracks on disk "
+        f"(all guilds: {process['in_memory_bytes'] / 1024 / 1024:.1f} MB, {process['spills']} spills)"
+    )
+    await ctx.respond("\n".join(lines))
 
 def text_to_wav(text, filename='tts_output.wav'):
+    import pyttsx3
+    from pydub import AudioSegment
+
     engine = pyttsx3.init()
     engine.save_to_file(text, filename)
     engine.runAndWait()
@@ -185,7 +303,6 @@ def text_to_wav(text, filename='tts_output.wav'):
     sound = AudioSegment.from_file(filename)
     sound.export(filename, format="wav")
 
-@bot.command()
 async def tts(ctx, *, message):
     if not (ctx.author.voice and ctx.author.voice.channel):
         await ctx.send("You must be in a voice channel.")
@@ -196,6 +313,7 @@ async def tts(ctx, *, message):
         vc = await ctx.author.voice.channel.connect()
     
     # Generate TTS
+    from gtts import gTTS
     tts = gTTS(text=message, lang='en')
     tts.save("temp_tts.mp3")
     
@@ -206,4 +324,26 @@ async def tts(ctx, *, message):
         await asyncio.sleep(1)
     
     os.remove("temp_tts.mp3")
-bot.run(TOKEN)
+
+def create_bot():
+    intents = discord.Intents.default()
+    intents.voice_states = True
+    intents.guilds = True
+    intents.messages = True
+    intents.message_content = True
+
+    new_bot = discord.Bot(intents=intents)
+    new_bot.event(on_ready)
+    for command in (join, replay, clip, stop, live_stats, tts):
+        new_bot.command()(command)
+    return new_bot
+
+def main():
+    global bot, logger
+    load_dotenv()
+    logger = setup_logging(LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_ROTATE_SECONDS)
+    bot = create_bot()
+    bot.run(os.getenv('DISCORD_TOKEN_1'))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import json
+import os
+import struct
+import sys
+
+# Results keyed by (path, mtime_ns, size); persisted so repeat runs skip the files entirely
+PROBE_CACHE_PATH = os.path.join('recordings', '.probe_cache.json')
+_cache = {}
+_cache_loaded = False
+
+MP3_BITRATES = {
+    # (MPEG-1, layer III) and (MPEG-2/2.5, layer III) in kbps
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+MP3_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+
+
+def probe(path, cache_path=PROBE_CACHE_PATH):
+    """
+    Duration, sample rate, channels and sample width from the file headers.
+
+    Handles the formats we produce (WAV, FLAC, Ogg Opus/Vorbis, MP3) in pure
+    Python; anything else, or a header that can't be parsed, falls back to
+    ffprobe through pydub's mediainfo.
+    """
+    _load_cache(cache_path)
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    if key in _cache:
+        return _cache[key]
+
+    with open(path, 'rb') as f:
+        head = f.read(12)
+        f.seek(0)
+        try:
+            if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+                info = probe_wav(f, stat.st_size)
+            elif head[:4] == b'fLaC':
+                info = probe_flac(f, stat.st_size)
+            elif head[:4] == b'OggS':
+                info = probe_ogg(f, stat.st_size)
+            elif head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+                info = probe_mp3(f, stat.st_size)
+            else:
+                info = None
+        except (struct.error, ValueError, IndexError):
+            info = None
+
+    if info is None:
+        info = probe_ffprobe(path)
+    _cache[key] = info
+    return info
+
+
+def probe_wav(f, file_size):
+    f.seek(12)
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            return None
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            fmt = struct.unpack('<HHIIHH', f.read(16))
+            f.seek(size - 16 + (size & 1), 1)
+        elif chunk_id == b'data':
+            if fmt is None:
+                return None
+            audio_format, channels, rate, _, block_align, bits = fmt
+            data_start = f.tell()
+            # WaveSink used to leave 0 here; trust the file size instead
+            if size == 0 or size == 0xFFFFFFFF or data_start + size > file_size:
+                size = file_size - data_start
+            frames = size // block_align if block_align else 0
+            return {
+                'format': 'wav',
+                'codec': 'pcm' if audio_format in (1, 0xFFFE) else f'wav-{audio_format}',
+                'duration': frames / rate if rate else 0.0,
+                'sample_rate': rate,
+                'channels': channels,
+                'sample_width': bits // 8,
+                'frames': frames,
+            }
+        else:
+            f.seek(size + (size & 1), 1)
+
+
+def probe_flac(f, file_size):
+    # STREAMINFO is always the first metadata block
+    f.seek(4)
+    block_type, length = f.read(1)[0] & 0x7F, int.from_bytes(f.read(3), 'big')
+    if block_type != 0 or length < 34:
+        return None
+    info = f.read(34)
+    # 20 bits rate, 3 bits channels - 1, 5 bits bits per sample - 1, 36 bits total samples
+    packed = int.from_bytes(info[10:18], 'big')
+    rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    frames = packed & 0xFFFFFFFFF
+    return {
+        'format': 'flac',
+        'codec': 'flac',
+        'duration': frames / rate if rate else 0.0,
+        'sample_rate': rate,
+        'channels': channels,
+        'sample_width': (bits + 7) // 8,
+        'frames': frames,
+    }
+
+
+def probe_ogg(f, file_size):
+    page = f.read(512)
+    segments = page[26]
+    packet = page[27 + segments:]
+    if packet.startswith(b'OpusHead'):
+        channels = packet[9]
+        pre_skip = struct.unpack_from('<H', packet, 10)[0]
+        codec, rate, granule_rate = 'opus', 48000, 48000
+    elif packet.startswith(b'\x01vorbis'):
+        channels = packet[11]
+        rate = struct.unpack_from('<I', packet, 12)[0]
+        pre_skip, codec, granule_rate = 0, 'vorbis', rate
+    else:
+        return None
+
+    # The last page's granule position is the total sample count
+    f.seek(max(0, file_size - 65536))
+    tail = f.read()
+    last = tail.rfind(b'OggS')
+    if last < 0:
+        return None
+    granule = struct.unpack_from('<q', tail, last + 6)[0]
+    return {
+        'format': 'ogg',
+        'codec': codec,
+        'duration': max(0, granule - pre_skip) / granule_rate,
+        'sample_rate': rate,
+        'channels': channels,
+        'sample_width': None,
+    }
+
+
+def probe_mp3(f, file_size):
+    offset = 0
+    head = f.read(10)
+    if head[:3] == b'ID3':
+        # Syncsafe tag size
+        offset = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    f.seek(offset)
+    data = f.read(4096)
+    for i in range(len(data) - 4):
+        if data[i] == 0xFF and data[i + 1] & 0xE0 == 0xE0:
+            header = struct.unpack('>I', data[i:i + 4])[0]
+            version_bits = (header >> 19) & 3
+            layer_bits = (header >> 17) & 3
+            bitrate_index = (header >> 12) & 15
+            rate_index = (header >> 10) & 3
+            if version_bits == 1 or layer_bits != 1 or rate_index == 3 or bitrate_index in (0, 15):
+                continue  # Not a layer III frame header
+            version = {3: 1, 2: 2, 0: 2.5}[version_bits]
+            rate = MP3_RATES[version][rate_index]
+            bitrate = MP3_BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+            channels = 1 if (header >> 6) & 3 == 3 else 2
+            samples_per_frame = 1152 if version == 1 else 576
+            break
+    else:
+        return None
+
+    # Xing/Info header gives the frame count of VBR files
+    frame = data[i:]
+    side_info = (32 if channels == 2 else 17) if version == 1 else (17 if channels == 2 else 9)
+    tag_at = 4 + side_info
+    if frame[tag_at:tag_at + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack_from('>I', frame, tag_at + 4)[0]
+        if flags & 1:
+            frames = struct.unpack_from('>I', frame, tag_at + 8)[0]
+            duration = frames * samples_per_frame / rate
+            return _mp3_info(duration, rate, channels, bitrate)
+    duration = (file_size - offset - i) * 8 / bitrate
+    return _mp3_info(duration, rate, channels, bitrate)
+
+
+def _mp3_info(duration, rate, channels, bitrate):
+    return {
+        'format': 'mp3',
+        'codec': 'mp3',
+        'duration': duration,
+        'sample_rate': rate,
+        'channels': channels,
+        'sample_width': None,
+        'bit_rate': bitrate,
+    }
+
+
+def probe_ffprobe(path):
+    """Fallback for anything the header parsers don't understand"""
+    from pydub.utils import mediainfo
+
+    try:
+        info = mediainfo(path)
+    except Exception as e:
+        print(f"MediaInfo error: {e}")
+        return None
+    bits = info.get('bits_per_sample') or info.get('bits_per_raw_sample')
+    return {
+        'format': info.get('format_name'),
+        'codec': info.get('codec_name'),
+        'duration': float(info.get('duration', 0) or 0),
+        'sample_rate': int(info.get('sample_rate', 0) or 0),
+        'channels': int(info.get('channels', 0) or 0),
+        'sample_width': int(bits) // 8 if bits and str(bits).isdigit() and int(bits) else None,
+    }
+
+
+def _load_cache(cache_path):
+    global _cache_loaded
+    if _cache_loaded:
+        return
+    _cache_loaded = True
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                _cache.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+
+def save_cache(cache_path=PROBE_CACHE_PATH):
+    if not cache_path:
+        return
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump(_cache, f)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        print(f"{path}: {probe(path)}")
+    save_cache()
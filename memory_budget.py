@@ -0,0 +1,248 @@
+import io
+import logging
+import os
+import struct
+import tempfile
+import threading
+import weakref
+
+# Bytes of recorded PCM the whole process may hold in memory before it starts
+# spilling the largest buffers to disk, and the level it spills back down to.
+PROCESS_WATERMARK = int(os.getenv('RECORDING_MEMORY_LIMIT', 512 * 1024 * 1024))
+PROCESS_LOW_WATERMARK = PROCESS_WATERMARK * 3 // 4
+# A single speaker's buffer spills on its own once it reaches this size
+BUFFER_SPILL_THRESHOLD = int(os.getenv('RECORDING_BUFFER_LIMIT', 64 * 1024 * 1024))
+SPILL_DIR = os.getenv('RECORDING_SPILL_DIR') or None
+
+WAV_HEADER_BYTES = 44
+
+logger = logging.getLogger('recorder')
+
+
+def wav_header(data_bytes, channels, sample_rate, sample_width):
+    """Canonical 44-byte PCM WAV header"""
+    block_align = channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_bytes, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * block_align, block_align, sample_width * 8,
+        b'data', data_bytes,
+    )
+
+
+class SpillBuffer:
+    """
+    File-like buffer that starts as a BytesIO and moves itself to an
+    anonymous temp file when told to spill. Reads, writes and seeks work
+    the same before and after, so sinks don't need to know.
+    """
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.file = io.BytesIO()
+        self.size = 0
+        self.spilled = False
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        with self.lock:
+            written = self.file.write(data)
+            end = self.file.tell()
+            grown = max(0, end - self.size)
+            self.size = max(self.size, end)
+            spilled = self.spilled
+        if grown and not spilled:
+            self.owner.grew(self, grown)
+        return written
+
+    def spill(self):
+        """Move the contents to disk; returns the bytes freed from memory"""
+        with self.lock:
+            if self.spilled or self.file.closed:
+                return 0
+            tmp = tempfile.TemporaryFile(dir=SPILL_DIR, prefix='recording-')
+            view = self.file.getbuffer()
+            tmp.write(view)
+            view.release()
+            tmp.seek(self.file.tell())
+            self.file.close()
+            self.file = tmp
+            self.spilled = True
+            return self.size
+
+    def in_memory_bytes(self):
+        return 0 if self.spilled else self.size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        with self.lock:
+            return self.file.seek(offset, whence)
+
+    def tell(self):
+        with self.lock:
+            return self.file.tell()
+
+    def read(self, size=-1):
+        with self.lock:
+            return self.file.read(size)
+
+    def getvalue(self):
+        with self.lock:
+            position = self.file.tell()
+            self.file.seek(0)
+            data = self.file.read()
+            self.file.seek(position)
+            return data
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+
+class SinkMemory:
+    """
+    In-memory budget of one sink (its Filters max_size, 0 = unlimited),
+    reporting into the process-wide budget.
+    """
+
+    def __init__(self, limit=0, budget=None):
+        self.limit = limit
+        self.budget = budget or PROCESS_BUDGET
+        self.buffers = []
+        self.in_memory = 0
+        self.spills = 0
+        self.spilled_bytes = 0
+        self.lock = threading.Lock()
+        self.budget.register(self)
+
+    def new_buffer(self):
+        buffer = SpillBuffer(self)
+        with self.lock:
+            self.buffers.append(buffer)
+        return buffer
+
+    def grew(self, buffer, grown):
+        with self.lock:
+            self.in_memory += grown
+            over_limit = self.limit and self.in_memory > self.limit
+        if buffer.in_memory_bytes() >= BUFFER_SPILL_THRESHOLD:
+            self.spill(buffer, 'buffer threshold')
+        elif over_limit:
+            self.spill(self.largest(), 'sink max_size')
+        self.budget.grew(grown)
+
+    def largest(self):
+        with self.lock:
+            return max(self.buffers, key=SpillBuffer.in_memory_bytes, default=None)
+
+    def spill(self, buffer, reason):
+        if buffer is None:
+            return 0
+        freed = buffer.spill()
+        if freed:
+            with self.lock:
+                self.in_memory -= freed
+                self.spills += 1
+                self.spilled_bytes += freed
+            self.budget.freed(freed)
+            logger.info(f"Spilled {freed / 1024 / 1024:.1f} MB recording buffer to disk ({reason})")
+        return freed
+
+    def release(self):
+        """Forget the buffers once the recording has been saved"""
+        with self.lock:
+            freed, self.in_memory = self.in_memory, 0
+            buffers, self.buffers = self.buffers, []
+        for buffer in buffers:
+            buffer.close()
+        self.budget.freed(freed)
+        self.budget.unregister(self)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'in_memory_bytes': self.in_memory,
+                'limit_bytes': self.limit,
+                'buffers': len(self.buffers),
+                'spilled_buffers': sum(1 for b in self.buffers if b.spilled),
+                'spills': self.spills,
+                'spilled_bytes': self.spilled_bytes,
+            }
+
+
+class MemoryBudget:
+    """Process-wide in-memory recording bytes across every active sink"""
+
+    def __init__(self, watermark=PROCESS_WATERMARK, low_watermark=PROCESS_LOW_WATERMARK):
+        self.watermark = watermark
+        self.low_watermark = low_watermark
+        self.in_memory = 0
+        self.reserved = 0  # Fixed allocations (replay rings) that can't be spilled, included in in_memory
+        self.peak = 0
+        self.watermark_hits = 0
+        self.sinks = weakref.WeakSet()
+        self.lock = threading.Lock()
+
+    def register(self, sink_memory):
+        with self.lock:
+            self.sinks.add(sink_memory)
+
+    def unregister(self, sink_memory):
+        with self.lock:
+            self.sinks.discard(sink_memory)
+
+    def grew(self, grown):
+        with self.lock:
+            self.in_memory += grown
+            self.peak = max(self.peak, self.in_memory)
+            if self.in_memory <= self.watermark:
+                return
+            self.watermark_hits += 1
+            sinks = list(self.sinks)
+        # Over the watermark: spill the biggest buffers in any guild until we're back under
+        candidates = sorted((b for s in sinks for b in list(s.buffers) if not b.spilled),
+                            key=SpillBuffer.in_memory_bytes, reverse=True)
+        for buffer in candidates:
+            if self.in_memory <= self.low_watermark:
+                break
+            buffer.owner.spill(buffer, 'process watermark')
+
+    def freed(self, freed):
+        with self.lock:
+            self.in_memory -= freed
+
+    def reserve(self, nbytes):
+        """Count a fixed allocation; spills other sinks' buffers if it takes us over the watermark"""
+        with self.lock:
+            self.reserved += nbytes
+        self.grew(nbytes)
+
+    def unreserve(self, nbytes):
+        with self.lock:
+            self.reserved -= nbytes
+            self.in_memory -= nbytes
+
+    def metrics(self):
+        with self.lock:
+            sinks = list(self.sinks)
+            metrics = {
+                'in_memory_bytes': self.in_memory,
+                'reserved_bytes': self.reserved,
+                'peak_bytes': self.peak,
+                'watermark_bytes': self.watermark,
+                'watermark_hits': self.watermark_hits,
+                'active_sinks': len(sinks),
+            }
+        metrics['spills'] = sum(s.spills for s in sinks)
+        metrics['spilled_bytes'] = sum(s.spilled_bytes for s in sinks)
+        return metrics
+
+
+PROCESS_BUDGET = MemoryBudget()
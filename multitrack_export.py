@@ -0,0 +1,123 @@
+import json
+import sys
+import wave
+
+import numpy as np
+
+import session_catalog
+from track_reader import open_track
+
+BLOCK_SAMPLES = 48000  # 1 s per block at 48 kHz
+
+
+class AlignedSession:
+    """
+    A recorded session laid out on its session clock.
+
+    Uses the sample positions CustomWaveSink stores in the timeline
+    (sample_offset/session_sample) and the session catalog's mapping of
+    timeline speakers to their track files. `blocks()` streams the session in
+    fixed-size blocks, reading only the parts of each track that are placed
+    in that block, so memory does not depend on the session length.
+    """
+
+    def __init__(self, session_id):
+        session = session_catalog.get_session(session_id)
+        if session is None:
+            raise ValueError(f"Session {session_id} is not in the catalog")
+        with open(session['timeline_path'], 'r') as f:
+            timeline = json.load(f)
+        track_files = {row['speaker']: row['path'] for row in session_catalog.session_tracks(session_id)}
+
+        self.session_id = session_id
+        self.timeline_path = session['timeline_path']
+        self.speakers = [sp for sp in timeline if sp in track_files]
+        self.files = {sp: track_files[sp] for sp in self.speakers}
+        self.placements = {}
+        for sp in self.speakers:
+            self.placements[sp] = sorted(
+                (seg['session_sample'], seg['sample_offset'], seg['end_sample_offset'] - seg['sample_offset'])
+                for seg in timeline[sp]
+                if not seg.get('silent') and 'session_sample' in seg
+            )
+        ends = [session + length for rows in self.placements.values() for session, _, length in rows]
+        self.total_samples = max(ends) if ends else 0
+
+        self.channels, self.sample_rate = 2, 48000
+        if self.speakers:
+            with open_track(self.files[self.speakers[0]]) as w:
+                self.channels, self.sample_rate = w.getnchannels(), w.getframerate()
+
+    def blocks(self, block_samples=BLOCK_SAMPLES):
+        """Yield (block start, int16 array of shape (samples, speakers, channels))"""
+        readers = {sp: open_track(self.files[sp]) for sp in self.speakers}
+        cursor = {sp: 0 for sp in self.speakers}
+        try:
+            for start in range(0, self.total_samples, block_samples):
+                end = min(start + block_samples, self.total_samples)
+                block = np.zeros((end - start, len(self.speakers), self.channels), dtype=np.int16)
+                for col, sp in enumerate(self.speakers):
+                    self._fill(block[:, col], readers[sp], sp, cursor, start, end)
+                yield start, block
+        finally:
+            for reader in readers.values():
+                reader.close()
+
+    def _fill(self, out, reader, speaker, cursor, start, end):
+        placements = self.placements[speaker]
+        # Placements of one speaker don't overlap, so a forward-only cursor finds them
+        i = cursor[speaker]
+        while i < len(placements) and placements[i][0] + placements[i][2] <= start:
+            i += 1
+        cursor[speaker] = i
+        nframes = reader.getnframes()
+        while i < len(placements) and placements[i][0] < end:
+            session, offset, length = placements[i]
+            lo, hi = max(session, start), min(session + length, end)
+            pos = offset + lo - session
+            if pos < nframes:
+                reader.setpos(pos)
+                pcm = np.frombuffer(reader.readframes(hi - lo), dtype=np.int16)
+                pcm = pcm.reshape(-1, self.channels)
+                out[lo - start:lo - start + len(pcm)] = pcm
+            i += 1
+
+
+def export_multitrack(session_id, output_path=None, block_samples=BLOCK_SAMPLES):
+    """
+    Write one N-channel WAV with a mono channel per speaker, in one pass.
+
+    Channel order is saved next to it as <session>_multitrack.json.
+    """
+    session = AlignedSession(session_id)
+    if output_path is None:
+        output_path = session.timeline_path.replace('_timeline.json', '_multitrack.wav')
+    if not session.speakers:
+        print(f"❌ No speaker tracks with sample positions in {session.timeline_path}")
+        return None
+
+    with wave.open(output_path, 'wb') as out:
+        out.setnchannels(len(session.speakers))
+        out.setsampwidth(2)
+        out.setframerate(session.sample_rate)
+        for _, block in session.blocks(block_samples):
+            mono = block.astype(np.int32).sum(axis=2) // session.channels
+            out.writeframesraw(mono.astype(np.int16).tobytes())
+
+    with open(output_path.replace('.wav', '.json'), 'w') as f:
+        json.dump({'file': output_path, 'channels': session.speakers}, f, indent=2)
+
+    print(f"✅ Multitrack saved: {output_path} "
+          f"({len(session.speakers)} channels, {session.total_samples / session.sample_rate:.2f}s)")
+    return output_path
+
+
+if __name__ == "__main__":
+    session_id = sys.argv[1] if len(sys.argv) > 1 else None
+    if session_id is None:
+        latest = session_catalog.get_session()
+        if latest is None:
+            print("❌ No sessions in the catalog")
+            sys.exit(1)
+        session_id = latest['session_id']
+    export_multitrack(session_id, sys.argv[2] if len(sys.argv) > 2 else None)
@@ -1,7 +1,11 @@
 import os
+import sys
 import json
 from datetime import datetime, timedelta
-from pydub.utils import which, mediainfo
+from pydub.utils import which
+from media_probe import probe, save_cache
+from timeline_index import TimelineIndex
+import session_catalog
 
 # Set FFmpeg path
 ffmpeg_path = which("ffmpeg")
@@ -10,79 +14,85 @@ if ffmpeg_path:
 else:
     print("Warning: FFmpeg not found")
 
-log = []
-speakers = {}
-timeline = {}
-overlaps = []
-
-# Process files
-for filename in os.listdir('recordings'):
-    filepath = os.path.join('recordings', filename)
-    print(f"\nProcessing file: {filepath}")
-    
-    if filename.endswith('.wav'):
+def load_session(session):
+    """Track paths per speaker and the timeline of one catalogued session"""
+    speakers = {}
+    timeline = {}
+    for track in session_catalog.session_tracks(session['session_id']):
+        filepath = track['path']
+        print(f"\nProcessing file: {filepath}")
         try:
             if not os.path.exists(filepath):
                 print(f"File does not exist: {filepath}")
                 continue
-            file_size = os.path.getsize(filepath)
-            print(f"File size: {file_size} bytes")
-            if file_size == 0:
+            print(f"Samples: {track['sample_count']} ({track['duration']}s)")
+            if not track['sample_count']:
                 print("File is empty")
                 continue
             try:
-                info = mediainfo(filepath)
+                info = probe(filepath)
                 print(f"MediaInfo: {info}")
             except Exception as e:
                 print(f"MediaInfo error: {e}")
-            speaker_num = filename.split('_')[0]
-            speaker_id = f"speaker_{speaker_num}"
+            speaker_id = track['speaker']
             speakers[speaker_id] = filepath  # Only store path, not audio
             print(f"Loaded {speaker_id}")
         except Exception as e:
-            print(f'Error processing {filename}: {e}')
+            print(f'Error processing {filepath}: {e}')
             import traceback
             traceback.print_exc()
-    elif filename.endswith('.json'):
+
+    save_cache()
+
+    if session['timeline_path']:
         try:
-            with open(filepath, 'r') as f:
+            with open(session['timeline_path'], 'r') as f:
                 timeline = json.load(f)
             print(f"Timeline loaded with {len(timeline)} entries")
         except Exception as e:
-            print(f'Error processing {filename}: {e}')
-
-# 2. Convert ISO timestamps to milliseconds
-all_starts = []
-print("Speakers loaded:", list(speakers.keys()))
-print("Timeline speakers:", list(timeline.keys()))
-
-for sp, segments in timeline.items():
-    if sp not in speakers:
-        print(f"Skipping {sp} as no audio found")
-        continue
-    print(f"Speaker {sp} present in speakers.")
-    for seg in segments:
-        seg['start_dt'] = datetime.fromisoformat(seg['start'])
-        seg['end_dt'] = datetime.fromisoformat(seg['end'])
-        all_starts.append(seg['start_dt'])
-
-time_zero = min(all_starts) if all_starts else datetime.now()
-
-for sp, segments in timeline.items():
-    for seg in segments:
-        seg['start_ms'] = int((seg['start_dt'] - time_zero).total_seconds() * 1000)
-        seg['end_ms'] = int((seg['end_dt'] - time_zero).total_seconds() * 1000)
-
-# 3. Detect overlaps with detailed logging
+            print(f"Error processing {session['timeline_path']}: {e}")
+    return speakers, timeline
+
 def to_iso(dt):
     return dt.isoformat() if hasattr(dt, 'isoformat') else dt
-speaker_list = list(timeline.keys())
-for i in range(len(speaker_list)):
-    for j in range(i + 1, len(speaker_list)):
-        sp1, sp2 = speaker_list[i], speaker_list[j]
-        for seg1 in timeline[sp1]:
-            for seg2 in timeline[sp2]:
-                if not seg1['silent'] and not seg2['silent']:
+
+def detect_overlaps(speakers, timeline):
+    """Returns (overlaps, log lines) for the speakers that have audio"""
+    log = []
+    overlaps = []
+
+    # 2. Convert ISO timestamps to milliseconds
+    all_starts = []
+    print("Speakers loaded:", list(speakers.keys()))
+    print("Timeline speakers:", list(timeline.keys()))
+
+    for sp, segments in timeline.items():
+        if sp not in speakers:
+            print(f"Skipping {sp} as no audio found")
+            continue
+        print(f"Speaker {sp} present in speakers.")
+        for seg in segments:
+            seg['start_dt'] = datetime.fromisoformat(seg['start'])
+            seg['end_dt'] = datetime.fromisoformat(seg['end'])
+            all_starts.append(seg['start_dt'])
+
+    time_zero = min(all_starts) if all_starts else datetime.now()
+    timeline = {sp: segments for sp, segments in timeline.items() if sp in speakers}
+
+    for sp, segments in timeline.items():
+        for seg in segments:
+            seg['start_ms'] = int((seg['start_dt'] - time_zero).total_seconds() * 1000)
+            seg['end_ms'] = int((seg['end_dt'] - time_zero).total_seconds() * 1000)
+
+    # 3. Detect overlaps with detailed logging
+    index = TimelineIndex(timeline)
+    speaker_list = list(timeline.keys())
+    for i in range(len(speaker_list)):
+        for j in range(i + 1, len(speaker_list)):
+            sp1, sp2 = speaker_list[i], speaker_list[j]
+            for seg1_start, seg1_end, seg1 in index.iter_speaker(sp1):
+                # Only sp2's segments that intersect seg1, instead of all of them
+                for _, _, _, seg2 in index.between(seg1_start, seg1_end, speakers=[sp2]):
                     start = max(seg1['start_ms'], seg2['start_ms'])
                     end = min(seg1['end_ms'], seg2['end_ms'])
                     if start < end:
@@ -110,35 +120,48 @@ for i in range(len(speaker_list)):
                         }
                         overlaps.append(overlap_entry)
                         log.append(f"Overlap detected: {sp1} and {sp2} from {overlap_entry['start_iso']} to {overlap_entry['end_iso']}")
+    return overlaps, log
+
+def save_overlap_details(overlaps, log, details_path="overlap_details.json", log_path="processing_log.txt"):
+    # 7. Save detailed log
+    with open(log_path, "w") as f:
+        f.write("\n".join(log))
+
+    # 8. Save overlap details with serialized datetime
+    overlap_details_serializable = []
+    for ov in overlaps:
+        ov_copy = ov.copy()
+        ov_copy['segment1'] = ov['segment1'].copy()
+        ov_copy['segment2'] = ov['segment2'].copy()
+        for key in ['start_dt', 'end_dt']:
+            if key in ov_copy['segment1']:
+                ov_copy['segment1'][key] = ov_copy['segment1'][key].isoformat()
+            if key in ov_copy['segment2']:
+                ov_copy['segment2'][key] = ov_copy['segment2'][key].isoformat()
+        overlap_details_serializable.append(ov_copy)
+
+    with open(details_path, "w") as f:
+        json.dump({
+            'overlaps': overlap_details_serializable,
+            'late_segments': []  # No late segments since audio processing is removed
+        }, f, indent=2)
+
+def main(session_id=None, details_path="overlap_details.json", log_path="processing_log.txt"):
+    # Process files of one session (latest unless given)
+    session = session_catalog.get_session(session_id)
+    if session is None:
+        print("No session in catalog (python session_catalog.py import recordings)")
+        return None
+    print(f"Session: {session['session_id']}")
+
+    speakers, timeline = load_session(session)
+    overlaps, log = detect_overlaps(speakers, timeline)
+    save_overlap_details(overlaps, log, details_path, log_path)
+
+    print("Processing complete. (Audio processing removed)")
+    print(f"Detected {len(overlaps)} overlaps")
+    return overlaps
 
-# 4. (Audio processing removed)
-
-# 5. (Audio appending removed)
-
-# 6. (Audio export removed)
-
-# 7. Save detailed log
-with open("processing_log.txt", "w") as f:
-    f.write("\n".join(log))
-
-# 8. Save overlap details with serialized datetime
-overlap_details_serializable = []
-for ov in overlaps:
-    ov_copy = ov.copy()
-    ov_copy['segment1'] = ov['segment1'].copy()
-    ov_copy['segment2'] = ov['segment2'].copy()
-    for key in ['start_dt', 'end_dt']:
-        if key in ov_copy['segment1']:
-            ov_copy['segment1'][key] = ov_copy['segment1'][key].isoformat()
-        if key in ov_copy['segment2']:
-            ov_copy['segment2'][key] = ov_copy['segment2'][key].isoformat()
-    overlap_details_serializable.append(ov_copy)
-
-with open("overlap_details.json", "w") as f:
-    json.dump({
-        'overlaps': overlap_details_serializable,
-        'late_segments': []  # No late segments since audio processing is removed
-    }, f, indent=2)
-
-print("Processing complete. (Audio processing removed)")
-print(f"Detected {len(overlaps)} overlaps")
+if __name__ == "__main__":
+    if main(sys.argv[1] if len(sys.argv) > 1 else None) is None:
+        sys.exit(1)
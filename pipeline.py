@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import os
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import session_catalog
+
+
+# Stage functions run in worker processes, so they import their tools lazily
+# and take only plain arguments.
+
+def run_clean(track_path, output_file):
+    from audio_cleaning import Audiosegment
+    Audiosegment(track_path).process_audio(output_file=output_file)
+
+
+def run_overlaps(session_id, details_path, log_path):
+    import overlap_data
+    if overlap_data.main(session_id, details_path, log_path) is None:
+        raise RuntimeError(f"Overlap detection failed for {session_id}")
+
+
+def run_mix(session_id, output_path):
+    import audio_combination
+    if audio_combination.main(session_id, output_path) is None:
+        raise RuntimeError(f"Mixdown failed for {session_id}")
+
+
+def run_transcribe(mix_path, session_id):
+    import asyncio
+    from transcribe import save_transcript
+    if asyncio.run(save_transcript(mix_path, session_id)) is None:
+        raise RuntimeError(f"Transcription failed for {session_id}")
+
+
+class Stage:
+    """
+    One post-processing step.
+
+    scope is 'track' (one task per speaker track) or 'session'. inputs and
+    outputs map (session, track) to file paths; a task is skipped when its
+    outputs exist and the content hash of its inputs matches the last
+    successful run. Bump version when the stage's code changes its output.
+    """
+
+    def __init__(self, name, func, scope, inputs, outputs, args, after=(), version=1):
+        self.name = name
+        self.func = func
+        self.scope = scope
+        self.inputs = inputs
+        self.outputs = outputs
+        self.args = args
+        self.after = after
+        self.version = version
+
+
+def _base(session):
+    return session['timeline_path'][:-len('_timeline.json')]
+
+
+def _clean_folder(track):
+    folder, filename = os.path.split(track['path'])
+    return os.path.join(folder, f'time_stamps-{filename}')
+
+
+def _clean_output(track):
+    return os.path.join(_clean_folder(track), 'silent_parts.txt0')
+
+
+STAGES = [
+    Stage('clean', run_clean, 'track',
+          inputs=lambda s, t: [t['path']],
+          outputs=lambda s, t: [_clean_output(t)],
+          args=lambda s, t: (t['path'], _clean_output(t))),
+    Stage('overlaps', run_overlaps, 'session',
+          inputs=lambda s, t: [s['timeline_path']],
+          outputs=lambda s, t: [f"{_base(s)}_overlaps.json", f"{_base(s)}_overlaps_log.txt"],
+          args=lambda s, t: (s['session_id'], f"{_base(s)}_overlaps.json", f"{_base(s)}_overlaps_log.txt")),
+    Stage('mix', run_mix, 'session',
+          inputs=lambda s, t: [s['timeline_path']] + [track['path'] for track in t],
+          outputs=lambda s, t: [f"{_base(s)}_mix.wav"],
+          args=lambda s, t: (s['session_id'], f"{_base(s)}_mix.wav"), version=2),
+    Stage('transcribe', run_transcribe, 'session', after=('mix',),
+          inputs=lambda s, t: [f"{_base(s)}_mix.wav"],
+          outputs=lambda s, t: [os.path.join('transcripts', f"{s['session_id']}_transcript.txt")],
+          args=lambda s, t: (f"{_base(s)}_mix.wav", s['session_id'])),
+]
+
+
+class Task:
+    def __init__(self, stage, session, track=None, tracks=()):
+        self.stage = stage
+        self.session = session
+        self.track = track
+        self.target = track if stage.scope == 'track' else list(tracks)
+        suffix = f":{track['speaker']}" if track is not None else ''
+        self.key = f"{stage.name}:{session['session_id']}{suffix}"
+        self.deps = []
+
+    def job(self):
+        """Plain-value arguments for run_task, so the worker does the hashing"""
+        return (self.stage.func, self.stage.args(self.session, self.target),
+                f"{self.stage.name}:{self.stage.version}", self.stage.inputs(self.session, self.target),
+                self.stage.outputs(self.session, self.target), session_catalog.stage_input_hash(self.key))
+
+
+def input_hash(tag, paths):
+    digest = hashlib.sha1(tag.encode())
+    for path in paths:
+        digest.update(path.encode())
+        digest.update(session_catalog.file_hash(path).encode())
+    return digest.hexdigest()
+
+
+def run_task(func, args, tag, inputs, outputs, last_hash):
+    """
+    Worker side of a task: hash its inputs (file_hash only re-reads files
+    whose size or mtime changed) and skip it when its outputs exist and
+    the hash matches the last successful run. Returns (input hash, ran).
+    """
+    current = input_hash(tag, inputs)
+    if current == last_hash and all(os.path.exists(path) for path in outputs):
+        return current, False
+    func(*args)
+    return current, True
+
+
+def build_tasks(sessions, stages=STAGES):
+    tasks = []
+    for session in sessions:
+        if not session['timeline_path']:
+            continue
+        tracks = session_catalog.session_tracks(session['session_id'])
+        session_tasks = []
+        for stage in stages:
+            if stage.scope == 'track':
+                stage_tasks = [Task(stage, session, track=track) for track in tracks]
+            else:
+                stage_tasks = [Task(stage, session, tracks=tracks)]
+            # Wait for every task (all speakers) of the stages listed in `after`
+            deps = [t.key for t in session_tasks if t.stage.name in stage.after]
+            for task in stage_tasks:
+                task.deps = deps
+            session_tasks.extend(stage_tasks)
+        tasks.extend(session_tasks)
+    return tasks
+
+
+def run_pipeline(session_ids=None, workers=None, stages=STAGES):
+    """
+    Run every stage for the given sessions (default: all catalogued ones)
+    across a process pool.
+
+    Independent sessions, speakers and stages run in parallel; a stage
+    waits only for the stages listed in its `after`. Inputs are hashed in
+    the workers, and a finished task only releases its own dependents.
+    Each finished task is committed to the catalog right away, so an
+    interrupted run picks up where it stopped.
+    """
+    if session_ids:
+        sessions = [s for s in (session_catalog.get_session(sid) for sid in session_ids) if s]
+    else:
+        sessions = session_catalog.list_sessions()
+    tasks = {task.key: task for task in build_tasks(sessions, stages)}
+    waiting = {key: len(task.deps) for key, task in tasks.items()}
+    dependents = {key: [] for key in tasks}
+    for task in tasks.values():
+        for dep in task.deps:
+            dependents[dep].append(task.key)
+    ready = [key for key, count in waiting.items() if not count]
+    done, failed = set(), set()
+    skipped = ran = 0
+    print(f"🧩 {len(tasks)} tasks over {len(sessions)} sessions")
+
+    def fail(key):
+        failed.add(key)
+        for dependent in dependents[key]:
+            if dependent not in failed:
+                print(f"⏭️  {dependent}: dependency failed")
+                fail(dependent)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while ready or running:
+            for key in ready:
+                running[pool.submit(run_task, *tasks[key].job())] = tasks[key]
+            ready = []
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                try:
+                    task_hash, task_ran = future.result()
+                except OSError as e:
+                    print(f"❌ {task.key}: {e}")
+                    fail(task.key)
+                    continue
+                except Exception:
+                    print(f"❌ {task.key} failed:\n{traceback.format_exc()}")
+                    fail(task.key)
+                    continue
+                if task_ran:
+                    session_catalog.record_stage_run(task.key, task_hash)
+                    if task.stage.name == 'clean':
+                        session_catalog.update_track(task.track['path'], status='cleaned')
+                    ran += 1
+                    print(f"✅ {task.key}")
+                else:
+                    skipped += 1
+                done.add(task.key)
+                # Only the tasks waiting on this one can have become ready
+                for dependent in dependents[task.key]:
+                    waiting[dependent] -= 1
+                    if not waiting[dependent] and dependent not in failed:
+                        ready.append(dependent)
+
+    failed_sessions = {key.split(':')[1] for key in failed}
+    for session in sessions:
+        if session['session_id'] not in failed_sessions:
+            session_catalog.set_session_status(session['session_id'], 'processed')
+
+    print(f"📋 Ran {ran}, skipped {skipped} up-to-date, {len(failed)} failed")
+    return not failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Post-process recorded sessions")
+    parser.add_argument('sessions', nargs='*', help="session ids (default: all)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    raise SystemExit(0 if run_pipeline(args.sessions, args.workers) else 1)
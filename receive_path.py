@@ -0,0 +1,89 @@
+import struct
+
+from discord import opus
+
+SAMPLING_RATE = opus.Decoder.SAMPLING_RATE
+CHANNELS = opus.Decoder.CHANNELS
+RTP_WRAP = 1 << 32
+
+
+class ReceivePath:
+    """
+    What happens to a packet after it is decoded: silence padding, its
+    position on the session clock, the live mixer, parking frames of
+    unmapped SSRCs and the write to the sink.
+
+    Shared by RecordingVoiceClient and the headless client of a decode
+    worker process. Needs `sink`, `sync_start`, `user_timestamps`,
+    `rtp_clock`, `parked` and an `ssrc_map()` returning an SSRCMap.
+    """
+
+    mixer = None
+
+    def release_parked(self):
+        """Write out parked frames whose SSRC has been mapped; called on the decode thread"""
+        for user_id, frames in self.parked.take(self.ssrc_map()):
+            for data in frames:
+                self._write(data, user_id)
+
+    def session_sample(self, data):
+        clock = self.rtp_clock.get(data.ssrc)
+        if clock is None:
+            offset = round((data.receive_time - self.first_packet_timestamp) * SAMPLING_RATE)
+            self.rtp_clock[data.ssrc] = [offset - data.timestamp, data.timestamp]
+            return offset
+
+        # Signed distance from the newest timestamp, so wraparound and late packets both work
+        delta = (data.timestamp - clock[1]) % RTP_WRAP
+        if delta >= RTP_WRAP // 2:
+            delta -= RTP_WRAP
+        unwrapped = clock[1] + delta
+        if delta > 0:
+            clock[1] = unwrapped
+        return clock[0] + unwrapped
+
+    def recv_decoded_audio(self, data):
+        # Add silence when they were not being recorded.
+        if data.ssrc not in self.user_timestamps:  # First packet from user
+            if not self.user_timestamps or not self.sync_start:  # First packet from anyone
+                # Unlike py-cord, only the session's very first packet sets the
+                # origin so it can serve as the session clock
+                if not self.user_timestamps:
+                    self.first_packet_timestamp = data.receive_time
+                silence = 0
+            else:  # Previously received a packet from someone else
+                silence = ((data.receive_time - self.first_packet_timestamp) * SAMPLING_RATE) - 960
+        else:  # Previously received a packet from user
+            dRT = (data.receive_time - self.user_timestamps[data.ssrc][1]) * SAMPLING_RATE
+            dT = data.timestamp - self.user_timestamps[data.ssrc][0]
+            diff = abs(100 - dT * 100 / dRT)
+            if diff > 60 and dT != 960:  # More than 60% off, trust the receive time
+                silence = dRT - 960
+            else:
+                silence = dT - 960
+
+        self.user_timestamps.update({data.ssrc: (data.timestamp, data.receive_time)})
+
+        data.session_sample = self.session_sample(data)
+        data.pad_samples = max(0, int(silence))
+        data.decoded_data = (
+            struct.pack("<h", 0) * data.pad_samples * CHANNELS + data.decoded_data
+        )
+
+        if self.mixer is not None:
+            self.mixer.feed(data)
+
+        if self.parked:
+            self.release_parked()
+        user_id = self.ssrc_map().user_id(data.ssrc)
+        if user_id is None:
+            self.parked.park(data)
+        else:
+            self._write(data, user_id)
+
+    def _write(self, data, user_id):
+        write_packet = getattr(self.sink, 'write_packet', None)
+        if write_packet is not None:
+            write_packet(data, user_id)
+        else:
+            self.sink.write(data.decoded_data, user_id)
@@ -0,0 +1,141 @@
+import threading
+import wave
+import weakref
+
+import discord
+import numpy as np
+
+from memory_budget import PROCESS_BUDGET
+from voice_client import SAMPLING_RATE, CHANNELS
+
+REPLAY_SECONDS = 300
+
+
+class SpeakerRing:
+    """The last `capacity` samples of one stream, indexed by session sample"""
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.samples = np.zeros((capacity, CHANNELS), dtype=dtype)
+        self.capacity = capacity
+        self.head = 0  # Session sample just past the newest audio written
+
+    def advance(self, end):
+        """Zero what is left over from the previous lap between head and end"""
+        if end <= self.head:
+            return
+        for lo, hi, _, _ in self._slots(max(self.head, end - self.capacity), end):
+            self.samples[lo:hi] = 0
+        self.head = end
+
+    def put(self, start, frame, add=False):
+        self.advance(start + len(frame))
+        late = self.head - self.capacity - start
+        if late > 0:
+            # Whatever is older than the window would overwrite newer audio
+            frame, start = frame[late:], start + late
+        for lo, hi, a, b in self._slots(start, start + len(frame)):
+            if add:
+                self.samples[lo:hi] += frame[a:b]
+            else:
+                self.samples[lo:hi] = frame[a:b]
+
+    def window(self, end):
+        """Contiguous copy of the `capacity` samples before session sample end"""
+        self.advance(end)
+        out = np.zeros_like(self.samples)
+        for lo, hi, a, b in self._slots(end - self.capacity, end):
+            out[a:b] = self.samples[lo:hi]
+        return out
+
+    def _slots(self, start, end):
+        """
+        The (at most two) ring slices lo:hi covering session samples
+        [start, end), each with the matching a:b relative to start
+        """
+        offset = max(start, 0) - start
+        length = end - start - offset
+        if length <= 0:
+            return []
+        lo = (start + offset) % self.capacity
+        first = min(length, self.capacity - lo)
+        slots = [(lo, lo + first, offset, offset + first)]
+        if first < length:
+            slots.append((0, length - first, offset + first, offset + length))
+        return slots
+
+
+class RingBufferSink(discord.sinks.Sink):
+    """
+    Keeps only the last `window_seconds` of every speaker (and optionally their
+    mix) in circular arrays allocated when a speaker first talks, so memory
+    stays constant however long the bot records. Needs RecordingVoiceClient:
+    audio is placed by session sample, so speakers stay aligned.
+
+    The rings are counted in the process memory budget (as reserved bytes)
+    until the sink is garbage collected.
+    """
+
+    def __init__(self, seconds=REPLAY_SECONDS, mix=True, users=()):
+        super().__init__(filters={'time': 0, 'users': list(users), 'max_size': 0})
+        # Not `seconds`: that is py-cord's Filters time limit, which would stop the recording
+        self.window_seconds = seconds
+        self.capacity = seconds * SAMPLING_RATE
+        self.rings = {}
+        self.with_mix = mix
+        self.mix = None
+        self.lock = threading.Lock()
+        self.reserved = [0]  # A list, so the finalizer can read it without keeping the sink alive
+        weakref.finalize(self, lambda reserved: PROCESS_BUDGET.unreserve(reserved[0]), self.reserved)
+
+    def _new_ring(self, dtype=np.int16):
+        ring = SpeakerRing(self.capacity, dtype=dtype)
+        self.reserved[0] += ring.samples.nbytes
+        PROCESS_BUDGET.reserve(ring.samples.nbytes)
+        return ring
+
+    def write_packet(self, data, user_id):
+        if self.filtered_users and user_id not in self.filtered_users:
+            return
+        frame = np.frombuffer(data.decoded_data, dtype=np.int16).reshape(-1, CHANNELS)
+        frame = frame[data.pad_samples:]  # Silence padding is implied by the session position
+        with self.lock:
+            ring = self.rings.get(user_id)
+            if ring is None:
+                ring = self.rings[user_id] = self._new_ring()
+            ring.put(data.session_sample, frame)
+            if self.with_mix:
+                if self.mix is None:
+                    self.mix = self._new_ring(dtype=np.int32)
+                self.mix.put(data.session_sample, frame, add=True)
+
+    def write(self, data, user_id):
+        raise RuntimeError("RingBufferSink needs RecordingVoiceClient to place audio on the session clock")
+
+    def snapshot(self):
+        """(per-user int16 arrays, int16 mix or None) of the last `window_seconds`, ending now"""
+        with self.lock:
+            heads = [ring.head for ring in self.rings.values()]
+            if not heads:
+                return {}, None
+            end = max(heads)
+            tracks = {user_id: ring.window(end) for user_id, ring in self.rings.items()}
+            mix = self.mix.window(end) if self.mix is not None else None
+        # Trim the part of the window before the session started
+        start = max(0, self.capacity - end)
+        tracks = {user_id: pcm[start:] for user_id, pcm in tracks.items()}
+        if mix is not None:
+            mix = np.clip(mix[start:], -32768, 32767).astype(np.int16)
+        return tracks, mix
+
+    def cleanup(self):
+        self.finished = True
+
+
+def write_clip(pcm, path):
+    """One contiguous write of an int16 (samples, channels) array as a WAV"""
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(CHANNELS)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLING_RATE)
+        f.writeframes(np.ascontiguousarray(pcm).tobytes())
+    return path
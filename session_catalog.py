@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import wave
+from contextlib import contextmanager
+from datetime import datetime
+
+from track_reader import open_track
+
+RECORDING_DIR = 'recordings'
+CATALOG_PATH = os.path.join(RECORDING_DIR, 'catalog.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id    TEXT PRIMARY KEY,
+    guild_id      INTEGER,
+    started_at    TEXT,
+    timeline_path TEXT,
+    status        TEXT NOT NULL DEFAULT 'recorded'
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    session_id    TEXT NOT NULL REFERENCES sessions(session_id),
+    speaker       TEXT NOT NULL,
+    user_id       INTEGER,
+    name          TEXT,
+    path          TEXT NOT NULL UNIQUE,
+    sample_rate   INTEGER,
+    channels      INTEGER,
+    sample_count  INTEGER,
+    duration      REAL,
+    status        TEXT NOT NULL DEFAULT 'recorded',
+    PRIMARY KEY (session_id, speaker)
+);
+CREATE TABLE IF NOT EXISTS stage_runs (
+    task          TEXT PRIMARY KEY,  -- stage:session_id[:speaker]
+    input_hash    TEXT NOT NULL,
+    finished_at   TEXT
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path          TEXT PRIMARY KEY,
+    mtime_ns      INTEGER,
+    size          INTEGER,
+    sha1          TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_guild ON sessions(guild_id, started_at);
+CREATE INDEX IF NOT EXISTS sessions_status ON sessions(status);
+CREATE INDEX IF NOT EXISTS tracks_status ON tracks(status);
+"""
+
+
+def connect(path=CATALOG_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # Pipeline workers write file hashes concurrently; wait for each other's locks
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# One open connection per catalog, process and thread (sqlite3 connections can't cross threads)
+_connections = threading.local()
+
+
+@contextmanager
+def _db(path):
+    if getattr(_connections, 'pid', None) != os.getpid():
+        # Fresh process (or a forked child): don't reuse the parent's connections
+        _connections.pid = os.getpid()
+        _connections.by_path = {}
+    # Keyed by absolute path: the default catalog path is relative to the working directory
+    key = os.path.abspath(path)
+    conn = _connections.by_path.get(key)
+    if conn is None:
+        conn = _connections.by_path[key] = connect(path)
+    with conn:  # commit on success
+        yield conn
+
+
+def record_session(session_id, guild_id, started_at, timeline_path, tracks, path=CATALOG_PATH):
+    """Insert or replace a finished session and its per-speaker tracks"""
+    with _db(path) as conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (session_id, guild_id, started_at, timeline_path, status) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (session_id, guild_id, _iso(started_at), timeline_path, 'recorded'))
+        conn.executemany(
+            'INSERT OR REPLACE INTO tracks (session_id, speaker, user_id, name, path, sample_rate, '
+            'channels, sample_count, duration, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(session_id, t['speaker'], t.get('user_id'), t.get('name'), t['path'],
+              t.get('sample_rate'), t.get('channels'), t.get('sample_count'), t.get('duration'),
+              t.get('status', 'recorded'))
+             for t in tracks])
+
+
+def get_session(session_id=None, guild_id=None, path=CATALOG_PATH):
+    """One session row; the latest one (optionally for a guild) when no id is given"""
+    with _db(path) as conn:
+        if session_id is not None:
+            return conn.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+        if guild_id is not None:
+            return conn.execute('SELECT * FROM sessions WHERE guild_id = ? ORDER BY started_at DESC LIMIT 1',
+                                (guild_id,)).fetchone()
+        return conn.execute('SELECT * FROM sessions ORDER BY started_at DESC LIMIT 1').fetchone()
+
+
+def list_sessions(status=None, guild_id=None, path=CATALOG_PATH):
+    query, args = 'SELECT * FROM sessions WHERE 1=1', []
+    if status is not None:
+        query += ' AND status = ?'
+        args.append(status)
+    if guild_id is not None:
+        query += ' AND guild_id = ?'
+        args.append(guild_id)
+    with _db(path) as conn:
+        return conn.execute(query + ' ORDER BY started_at', args).fetchall()
+
+
+def session_tracks(session_id, path=CATALOG_PATH):
+    with _db(path) as conn:
+        return conn.execute('SELECT * FROM tracks WHERE session_id = ? ORDER BY speaker',
+                            (session_id,)).fetchall()
+
+
+def list_tracks(status=None, path=CATALOG_PATH):
+    with _db(path) as conn:
+        if status is None:
+            return conn.execute('SELECT * FROM tracks ORDER BY session_id, speaker').fetchall()
+        return conn.execute('SELECT * FROM tracks WHERE status = ? ORDER BY session_id, speaker',
+                            (status,)).fetchall()
+
+
+def set_session_status(session_id, status, path=CATALOG_PATH):
+    with _db(path) as conn:
+        conn.execute('UPDATE sessions SET status = ? WHERE session_id = ?', (status, session_id))
+
+
+def update_track(track_path, path=CATALOG_PATH, **fields):
+    """Update columns of the track stored at track_path (e.g. status, path)"""
+    columns = ', '.join(f'{column} = ?' for column in fields)
+    with _db(path) as conn:
+        conn.execute(f'UPDATE tracks SET {columns} WHERE path = ?', (*fields.values(), track_path))
+
+
+def move_track(old_path, new_path, path=CATALOG_PATH):
+    """Point the track stored at old_path to new_path (e.g. once it has been archived to FLAC)"""
+    with _db(path) as conn:
+        conn.execute('UPDATE tracks SET path = ? WHERE path = ?', (new_path, old_path))
+
+
+def stage_input_hash(task, path=CATALOG_PATH):
+    """Input hash of the last successful run of a pipeline task, or None"""
+    with _db(path) as conn:
+        row = conn.execute('SELECT input_hash FROM stage_runs WHERE task = ?', (task,)).fetchone()
+        return row['input_hash'] if row else None
+
+
+def record_stage_run(task, input_hash, path=CATALOG_PATH):
+    with _db(path) as conn:
+        conn.execute('INSERT OR REPLACE INTO stage_runs (task, input_hash, finished_at) VALUES (?, ?, ?)',
+                     (task, input_hash, datetime.now().isoformat()))
+
+
+def file_hash(file_path, path=CATALOG_PATH):
+    """sha1 of a file's content, only re-read when its mtime or size changed"""
+    stat = os.stat(file_path)
+    with _db(path) as conn:
+        row = conn.execute('SELECT * FROM file_hashes WHERE path = ?', (file_path,)).fetchone()
+        if row and row['mtime_ns'] == stat.st_mtime_ns and row['size'] == stat.st_size:
+            return row['sha1']
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    with _db(path) as conn:
+        conn.execute('INSERT OR REPLACE INTO file_hashes (path, mtime_ns, size, sha1) VALUES (?, ?, ?, ?)',
+                     (file_path, stat.st_mtime_ns, stat.st_size, digest.hexdigest()))
+    return digest.hexdigest()
+
+
+def import_directory(folder=RECORDING_DIR, path=CATALOG_PATH):
+    """
+    One-off backfill for recordings made before the catalog existed.
+
+    Files are named <guild>_<date>_<time>_<name>_<user_id>.wav (or .flac
+    once archived). Their timelines are keyed by speaker_N labels and
+    nothing in the files says which user each label was, so a track only
+    gets its timeline speaker when the session had a single speaker. Other
+    legacy tracks are keyed by user id: they can be cleaned and archived,
+    but the mix and overlap stages won't find them in the timeline.
+    """
+    sessions = {}
+    for filename in sorted(os.listdir(folder)):
+        filepath = os.path.join(folder, filename)
+        stem, ext = os.path.splitext(filename)
+        parts = stem.split('_') if ext in ('.wav', '.flac') else []
+        if filename.endswith('_timeline.json'):
+            session_id = filename[:-len('_timeline.json')]
+            sessions.setdefault(session_id, {'tracks': []})['timeline'] = filepath
+        elif len(parts) >= 5 and parts[-1].isdigit():
+            session_id = '_'.join(parts[:3])
+            track = {'speaker': parts[-1], 'user_id': int(parts[-1]),
+                     'name': '_'.join(parts[3:-1]), 'path': filepath}
+            track.update(probe_wav(filepath))
+            sessions.setdefault(session_id, {'tracks': []})['tracks'].append(track)
+
+    for session_id, info in sessions.items():
+        _map_legacy_speakers(session_id, info)
+        guild_id, started_at = _parse_session_id(session_id)
+        record_session(session_id, guild_id, started_at, info.get('timeline'), info['tracks'], path)
+    print(f"✅ Imported {len(sessions)} sessions into {path}")
+    return len(sessions)
+
+
+def _map_legacy_speakers(session_id, info):
+    """Give a single-speaker session's track its timeline label; warn about the rest"""
+    if not info.get('timeline') or not info['tracks']:
+        return
+    try:
+        with open(info['timeline']) as f:
+            labels = [sp for sp, segments in json.load(f).items()
+                      if any(not seg.get('silent', False) for seg in segments)]
+    except (OSError, ValueError) as e:
+        print(f"⚠️ {session_id}: can't read timeline ({e})")
+        return
+    if len(labels) == 1 and len(info['tracks']) == 1:
+        info['tracks'][0]['speaker'] = labels[0]
+    elif labels:
+        print(f"⚠️ {session_id}: {len(info['tracks'])} tracks can't be matched to timeline speakers, "
+              f"so it can't be mixed")
+
+
+def probe_wav(filepath):
+    try:
+        with open_track(filepath) as w:
+            rate, frames = w.getframerate(), w.getnframes()
+            return {'sample_rate': rate, 'channels': w.getnchannels(),
+                    'sample_count': frames, 'duration': frames / rate if rate else 0}
+    except (wave.Error, EOFError, OSError, RuntimeError):
+        return {}
+
+
+def _parse_session_id(session_id):
+    try:
+        guild, day, clock = session_id.split('_')[:3]
+        return int(guild), datetime.strptime(f'{day}_{clock}', '%Y%m%d_%H%M%S')
+    except ValueError:
+        return None, None
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == 'import':
+        import_directory(sys.argv[2] if len(sys.argv) > 2 else RECORDING_DIR)
+    else:
+        for row in list_sessions():
+            tracks = session_tracks(row['session_id'])
+            print(f"{row['session_id']}  {row['status']:<10} {len(tracks)} tracks  {row['timeline_path']}")
@@ -0,0 +1,140 @@
+import collections
+import time
+
+# How long and how many frames (5 s) of an SSRC with no user yet are kept
+PARKED_SECONDS = 5.0
+MAX_PARKED_FRAMES = 250
+MAX_PARKED_SSRCS = 32
+
+
+class SSRCMap(dict):
+    """
+    The voice websocket's ssrc -> {"user_id", "speaking"} map, with a
+    user -> ssrc index kept up to date on every change, so looking up a
+    user's SSRC doesn't rebuild the reversed dict. `version` changes with
+    every mapping change, for caches derived from it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.by_user = {}
+        self.version = 0
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, ssrc, info):
+        old = self.get(ssrc)
+        if old is not None and self.by_user.get(old.get('user_id')) == ssrc:
+            del self.by_user[old['user_id']]
+        super().__setitem__(ssrc, info)
+        self.by_user[info['user_id']] = ssrc
+        self.version += 1
+
+    def __delitem__(self, ssrc):
+        info = self[ssrc]
+        super().__delitem__(ssrc)
+        if self.by_user.get(info['user_id']) == ssrc:
+            del self.by_user[info['user_id']]
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        for ssrc, info in dict(*args, **kwargs).items():
+            self[ssrc] = info
+
+    def pop(self, ssrc, *default):
+        if ssrc not in self:
+            if default:
+                return default[0]
+            raise KeyError(ssrc)
+        info = self[ssrc]
+        del self[ssrc]
+        return info
+
+    def clear(self):
+        super().clear()
+        self.by_user.clear()
+        self.version += 1
+
+    def user_id(self, ssrc):
+        info = self.get(ssrc)
+        return info['user_id'] if info is not None else None
+
+    def ssrc_of(self, user_id):
+        return self.by_user[user_id]
+
+
+class SSRCFilter:
+    """
+    A sink's user filter compiled to the set of SSRCs to drop.
+
+    Empty `users` records everyone. SSRCs not mapped to a user yet are let
+    through (they may turn out to be wanted), everything mapped to someone
+    else is denied. The set is rebuilt only when the SSRC map changes, so
+    the per-packet check is one set lookup.
+    """
+
+    def __init__(self, users=()):
+        self.users = frozenset(users)
+        self.denied = frozenset()
+        self.compiled_from = (None, None)
+        self.dropped = 0
+
+    def deny(self, ssrc, ssrc_map):
+        if not self.users:
+            return False
+        if self.compiled_from != (id(ssrc_map), ssrc_map.version):
+            # list() snapshots the map, which the gateway may change meanwhile
+            self.denied = frozenset(s for s, info in list(ssrc_map.items()) if info['user_id'] not in self.users)
+            self.compiled_from = (id(ssrc_map), ssrc_map.version)
+        if ssrc in self.denied:
+            self.dropped += 1
+            return True
+        return False
+
+
+class ParkedFrames:
+    """
+    Decoded frames of SSRCs the gateway hasn't told us the user of yet.
+
+    Bounded per SSRC in frames and age and in the number of SSRCs; what
+    falls out is counted in `dropped`. Only touched from the decode thread.
+    """
+
+    def __init__(self, max_age=PARKED_SECONDS, max_frames=MAX_PARKED_FRAMES, max_ssrcs=MAX_PARKED_SSRCS):
+        self.max_age = max_age
+        self.max_frames = max_frames
+        self.max_ssrcs = max_ssrcs
+        self.frames = {}
+        self.dropped = 0
+
+    def __bool__(self):
+        return bool(self.frames)
+
+    def park(self, data):
+        queue = self.frames.get(data.ssrc)
+        if queue is None:
+            if len(self.frames) >= self.max_ssrcs:
+                self.dropped += 1
+                return
+            queue = self.frames[data.ssrc] = collections.deque()
+        if len(queue) >= self.max_frames:
+            queue.popleft()
+            self.dropped += 1
+        queue.append((time.perf_counter(), data))
+
+    def take(self, ssrc_map):
+        """Remove and return (user_id, frames) for every parked SSRC that is mapped now"""
+        ready = []
+        now = time.perf_counter()
+        for ssrc in list(self.frames):
+            user_id = ssrc_map.user_id(ssrc)
+            queue = self.frames[ssrc]
+            if user_id is not None:
+                del self.frames[ssrc]
+                ready.append((user_id, [data for _, data in queue]))
+                continue
+            while queue and now - queue[0][0] > self.max_age:
+                queue.popleft()
+                self.dropped += 1
+            if not queue:
+                del self.frames[ssrc]
+        return ready
@@ -0,0 +1,86 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Cold start budgets in seconds, override with env vars on slower machines
+IMPORT_BUDGET = float(os.getenv('STARTUP_IMPORT_BUDGET', '1.5'))
+READY_BUDGET = float(os.getenv('STARTUP_READY_BUDGET', '10.0'))
+
+# Optional subsystems that must not be loaded until first use
+LAZY_MODULES = ['pyttsx3', 'gtts', 'pydub', 'openai']
+
+PROBE = (
+    "import sys, json, main; "
+    f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+)
+
+
+def slowest_imports(importtime_output, limit=10):
+    """Top cumulative entries from `python -X importtime` stderr"""
+    rows = []
+    for line in importtime_output.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4)))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def check_import():
+    env = dict(os.environ, STARTUP_CHECK='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE],
+                            capture_output=True, text=True, env=env)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        print("❌ import main failed")
+        return False
+
+    print(f"📦 import main: {elapsed:.2f}s (budget {IMPORT_BUDGET:.2f}s)")
+    for cumulative_us, module in slowest_imports(result.stderr):
+        print(f"   {cumulative_us / 1000:8.1f} ms  {module}")
+
+    ok = True
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    if loaded:
+        print(f"❌ Loaded eagerly: {', '.join(loaded)}")
+        ok = False
+    if elapsed > IMPORT_BUDGET:
+        print("❌ Import time over budget")
+        ok = False
+    return ok
+
+
+def check_ready():
+    """Full cold start to on_ready; needs DISCORD_TOKEN_1"""
+    if not os.getenv('DISCORD_TOKEN_1'):
+        print("⚠️  DISCORD_TOKEN_1 not set, skipping on_ready check")
+        return True
+    env = dict(os.environ, STARTUP_CHECK='1')
+    try:
+        result = subprocess.run([sys.executable, 'main.py'], capture_output=True,
+                                text=True, env=env, timeout=READY_BUDGET * 3)
+    except subprocess.TimeoutExpired:
+        print("❌ Bot never reached on_ready")
+        return False
+    match = re.search(r'Bot ready in ([\d.]+)s', result.stdout + result.stderr)
+    if not match:
+        print("❌ Bot never reached on_ready")
+        return False
+    ready = float(match.group(1))
+    print(f"🚀 cold start to on_ready: {ready:.2f}s (budget {READY_BUDGET:.2f}s)")
+    if ready > READY_BUDGET:
+        print("❌ Startup over budget")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    ok = check_import()
+    ok = check_ready() and ok
+    print("✅ Startup within budget" if ok else "❌ Startup check failed")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import logging
+import threading
+import traceback
+
+import discord
+
+# Frames (20 ms each, per speaker) a branch may fall behind by
+BRANCH_QUEUE_FRAMES = 500
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'detach')
+
+logger = logging.getLogger('recorder')
+
+
+class Branch:
+    """
+    One consumer of a TeeSink with its own bounded queue and thread.
+
+    consumer is a sink (write_packet or write) or an `async def
+    consumer(data, user_id)` run on the bot's loop. When the queue is full,
+    overflow decides: drop the oldest frame, drop the new one, or detach
+    the branch altogether.
+    """
+
+    def __init__(self, consumer, maxsize=BRANCH_QUEUE_FRAMES, overflow='drop_oldest', name=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}")
+        self.consumer = consumer
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.name = name or getattr(consumer, '__name__', type(consumer).__name__)
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.detached = False
+        self.dropped = 0
+        self.delivered = 0
+        self.loop = None
+        self.thread = threading.Thread(target=self._run, daemon=True, name=f"TeeBranch-{self.name}")
+
+    def start(self, loop):
+        self.loop = loop
+        self.thread.start()
+
+    def offer(self, item):
+        """Called on the decode thread; never blocks on the consumer"""
+        with self.cond:
+            if self.detached or self.closed:
+                return
+            if len(self.queue) >= self.maxsize:
+                self.dropped += 1
+                if self.overflow == 'drop_newest':
+                    return
+                if self.overflow == 'detach':
+                    self._detach(f"fell {self.maxsize} frames behind")
+                    return
+                self.queue.popleft()
+            self.queue.append(item)
+            self.cond.notify()
+
+    def close(self, timeout=2.0):
+        """Let the consumer finish what is queued, then stop the thread"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def _detach(self, reason):
+        self.detached = True
+        self.queue.clear()
+        self.cond.notify()
+        logger.info(f"Tee branch {self.name} detached: {reason}")
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.queue and not (self.closed or self.detached):
+                    self.cond.wait()
+                if not self.queue:
+                    return
+                data, user_id, is_packet = self.queue.popleft()
+            try:
+                self._deliver(data, user_id, is_packet)
+                self.delivered += 1
+            except Exception:
+                with self.cond:
+                    self._detach(traceback.format_exc())
+                return
+
+    def _deliver(self, data, user_id, is_packet):
+        consumer = self.consumer
+        if asyncio.iscoroutinefunction(consumer):
+            asyncio.run_coroutine_threadsafe(consumer(data, user_id), self.loop).result()
+        elif is_packet and hasattr(consumer, 'write_packet'):
+            consumer.write_packet(data, user_id)
+        else:
+            consumer.write(data.decoded_data if is_packet else data, user_id)
+
+    def stats(self):
+        with self.cond:
+            return {'queued': len(self.queue), 'delivered': self.delivered,
+                    'dropped': self.dropped, 'detached': self.detached}
+
+
+class TeeSink(discord.sinks.Sink):
+    """
+    Hands each decoded frame to a primary sink and any number of branches.
+
+    The primary (normally the disk writer) is written to directly on the
+    decode thread, exactly as if it were the only sink; each branch gets
+    the same frame through its own bounded queue, so a slow branch can
+    only lose its own frames. Audio is decoded once for all of them.
+    """
+
+    def __init__(self, primary, branches=()):
+        # Drop nothing before decrypting unless every consumer filters users
+        children = [primary] + [b.consumer for b in branches if isinstance(b.consumer, discord.sinks.Sink)]
+        users = [getattr(child, 'filtered_users', None) for child in children]
+        super().__init__(filters={'time': 0, 'users': [] if not all(users) else sorted(set().union(*users)),
+                                  'max_size': 0})
+        self.primary = primary
+        self.branches = list(branches)
+
+    def init(self, vc):
+        super().init(vc)
+        self.primary.init(vc)
+        for branch in self.branches:
+            if isinstance(branch.consumer, discord.sinks.Sink):
+                branch.consumer.init(vc)
+            branch.start(vc.loop)
+
+    def write_packet(self, data, user_id):
+        write_packet = getattr(self.primary, 'write_packet', None)
+        if write_packet is not None:
+            write_packet(data, user_id)
+        else:
+            self.primary.write(data.decoded_data, user_id)
+        for branch in self.branches:
+            branch.offer((data, user_id, True))
+
+    def write(self, data, user_id):
+        self.primary.write(data, user_id)
+        for branch in self.branches:
+            branch.offer((data, user_id, False))
+
+    def find(self, cls):
+        """The primary or branch consumer of the given type, if any"""
+        for consumer in [self.primary] + [b.consumer for b in self.branches if not b.detached]:
+            if isinstance(consumer, cls):
+                return consumer
+        return None
+
+    def cleanup(self):
+        self.finished = True
+        self.primary.cleanup()
+        for branch in self.branches:
+            branch.close()
+            if isinstance(branch.consumer, discord.sinks.Sink):
+                branch.consumer.cleanup()
+
+    def stats(self):
+        return {f'{i}:{branch.name}': branch.stats() for i, branch in enumerate(self.branches)}
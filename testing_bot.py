@@ -1,7 +1,6 @@
 import os
-import struct
-import numpy as np
-from pydub import AudioSegment
+from loudness_envelope import level_stats, load_envelope
+from wav_diagnostics import diagnose
 
 def diagnose_wav_file(filepath):
     """Comprehensive WAV file diagnostic tool"""
@@ -13,156 +12,53 @@ def diagnose_wav_file(filepath):
         print("❌ File does not exist!")
         return
     
-    file_size = os.path.getsize(filepath)
-    print(f"📁 File size: {file_size:,} bytes ({file_size/1024/1024:.2f} MB)")
-    
-    # 2. Read and analyze WAV header
-    try:
-        with open(filepath, 'rb') as f:
-            header = f.read(44)
-            
-        if len(header) < 44:
-            print("❌ File too small to contain WAV header")
-            return
-            
-        # Parse WAV header
-        chunk_id = header[0:4]
-        chunk_size = struct.unpack('<I', header[4:8])[0]
-        format_type = header[8:12]
-        subchunk1_id = header[12:16]
-        subchunk1_size = struct.unpack('<I', header[16:20])[0]
-        audio_format = struct.unpack('<H', header[20:22])[0]
-        num_channels = struct.unpack('<H', header[22:24])[0]
-        sample_rate = struct.unpack('<I', header[24:28])[0]
-        byte_rate = struct.unpack('<I', header[28:32])[0]
-        block_align = struct.unpack('<H', header[32:34])[0]
-        bits_per_sample = struct.unpack('<H', header[34:36])[0]
-        subchunk2_id = header[36:40]
-        subchunk2_size = struct.unpack('<I', header[40:44])[0]
-        
-        print("📋 WAV Header Analysis:")
-        print(f"   Chunk ID: {chunk_id} (should be b'RIFF')")
-        print(f"   Format: {format_type} (should be b'WAVE')")
-        print(f"   Audio Format: {audio_format} (1=PCM)")
-        print(f"   Channels: {num_channels}")
-        print(f"   Sample Rate: {sample_rate:,} Hz")
-        print(f"   Bits per Sample: {bits_per_sample}")
-        print(f"   Data Size: {subchunk2_size:,} bytes")
-        
-        # Validate header
-        valid_header = True
-        if chunk_id != b'RIFF':
-            print("❌ Invalid RIFF header")
-            valid_header = False
-        if format_type != b'WAVE':
-            print("❌ Invalid WAVE format")
-            valid_header = False
-        if audio_format != 1:
-            print(f"⚠️  Non-PCM format (format={audio_format})")
-            
-        if valid_header:
-            print("✅ WAV header appears valid")
-            
-        # Calculate expected duration
-        if sample_rate > 0 and num_channels > 0 and bits_per_sample > 0:
-            bytes_per_second = sample_rate * num_channels * (bits_per_sample // 8)
-            expected_duration_ms = (subchunk2_size / bytes_per_second) * 1000
-            print(f"📊 Expected duration: {expected_duration_ms:.2f} ms ({expected_duration_ms/1000:.2f} seconds)")
-        else:
-            print("❌ Invalid audio parameters in header")
-            
-    except Exception as e:
-        print(f"❌ Error reading WAV header: {e}")
-        return
-    
-    # 3. Try pydub loading
-    print("\n🎵 Pydub Analysis:")
-    try:
-        audio = AudioSegment.from_wav(filepath)
-        print(f"   Duration: {len(audio)} ms")
-        print(f"   Frame rate: {audio.frame_rate} Hz")
-        print(f"   Channels: {audio.channels}")
-        print(f"   Sample width: {audio.sample_width} bytes")
-        print(f"   Max amplitude: {audio.max}")
-        
-        if len(audio) == 0:
-            print("❌ Pydub reports 0ms duration")
-        else:
-            print("✅ Pydub loaded successfully")
-            
-    except Exception as e:
-        print(f"❌ Pydub loading failed: {e}")
-    
-    # 4. Analyze actual audio data
+    # Header and every statistic in one chunked pass (wav_diagnostics)
+    result = diagnose(filepath)
+    print(f"📁 File size: {result['file_size']:,} bytes ({result['file_size']/1024/1024:.2f} MB)")
+    if 'error' in result:
+        print(f"❌ Error reading WAV file: {result['error']}")
+        return result
+    
+    # 2. WAV header
+    print("📋 WAV Header Analysis:")
+    print(f"   Audio Format: {result['audio_format']} (1=PCM, 3=float)")
+    print(f"   Channels: {result['channels']}")
+    print(f"   Sample Rate: {result['sample_rate']:,} Hz")
+    print(f"   Bits per Sample: {result['bits_per_sample']}")
+    print(f"   Data Size: {result['header_data_size']:,} bytes in header, {result['data_size']:,} in file")
+    print(f"📊 Duration: {result['duration'] * 1000:.2f} ms ({result['duration']:.2f} seconds)")
+    
+    # Levels recorded alongside the track, without reading the audio
+    envelope = load_envelope(filepath)
+    if envelope is not None:
+        levels = level_stats(envelope)
+        print("\n📈 Levels (from the recorded envelope):")
+        print(f"   Duration: {levels['duration_ms']} ms")
+        print(f"   RMS: {levels['rms_dbfs']:.1f} dBFS")
+        print(f"   Peak: {levels['peak']} ({levels['peak_dbfs']:.1f} dBFS)")
+        print(f"   Below -40 dBFS: {levels['silent_fraction'] * 100:.1f}% of the time")
+
+    # 3. Audio data
     print("\n🔍 Raw Audio Data Analysis:")
-    try:
-        with open(filepath, 'rb') as f:
-            # Skip header (typically 44 bytes, but let's be more careful)
-            f.seek(44)
-            raw_data = f.read()
-            
-        if len(raw_data) == 0:
-            print("❌ No audio data after header")
-            return
-            
-        print(f"   Raw data size: {len(raw_data):,} bytes")
-        
-        # Convert to numpy array (assuming 16-bit stereo)
-        if bits_per_sample == 16 and num_channels == 2:
-            # Interpret as 16-bit signed integers
-            audio_array = np.frombuffer(raw_data, dtype=np.int16)
-            print(f"   Audio samples: {len(audio_array):,}")
-            print(f"   Min value: {audio_array.min()}")
-            print(f"   Max value: {audio_array.max()}")
-            print(f"   Mean: {audio_array.mean():.2f}")
-            print(f"   Std deviation: {audio_array.std():.2f}")
-            
-            # Check for silence
-            non_zero_samples = np.count_nonzero(audio_array)
-            print(f"   Non-zero samples: {non_zero_samples:,} ({non_zero_samples/len(audio_array)*100:.2f}%)")
-            
-            if non_zero_samples == 0:
-                print("❌ ALL SAMPLES ARE ZERO - FILE CONTAINS ONLY SILENCE!")
-            elif non_zero_samples < len(audio_array) * 0.01:  # Less than 1% non-zero
-                print("⚠️  File contains mostly silence")
-            else:
-                print("✅ File contains audio data")
-                
-            # Show first few samples
-            print(f"   First 10 samples: {audio_array[:10]}")
-            
-    except Exception as e:
-        print(f"❌ Error analyzing raw audio data: {e}")
-    
-    # 5. Alternative loading attempts
-    print("\n🔧 Alternative Loading Attempts:")
-    
-    # Try librosa
-    try:
-        import librosa
-        y, sr = librosa.load(filepath, sr=None)
-        duration_ms = len(y) / sr * 1000
-        print(f"   Librosa: {duration_ms:.2f} ms, max amplitude: {np.max(np.abs(y)):.6f}")
-        if duration_ms > 0:
-            print("✅ Librosa loaded successfully")
-    except ImportError:
-        print("   Librosa not available (pip install librosa)")
-    except Exception as e:
-        print(f"   Librosa failed: {e}")
-    
-    # Try raw loading with pydub
-    try:
-        audio_raw = AudioSegment.from_raw(
-            filepath, 
-            frame_rate=sample_rate,
-            channels=num_channels,
-            sample_width=bits_per_sample//8
-        )
-        print(f"   Raw pydub: {len(audio_raw)} ms")
-        if len(audio_raw) > 0:
-            print("✅ Raw pydub loading worked!")
-    except Exception as e:
-        print(f"   Raw pydub failed: {e}")
+    if 'samples' in result:
+        print(f"   Audio samples: {result['samples']:,}")
+        print(f"   Min value: {result['min']}")
+        print(f"   Max value: {result['max']}")
+        print(f"   Mean: {result['mean']:.2f}")
+        print(f"   Std deviation: {result['std']:.2f}")
+        print(f"   RMS: {result['rms_dbfs']:.1f} dBFS, peak: {result['peak_dbfs']:.1f} dBFS")
+        print(f"   Non-zero samples: {result['nonzero_fraction']*100:.2f}%")
+        for channel, stats in enumerate(result['channel_stats']):
+            print(f"   Channel {channel}: mean {stats['mean']:.2f}, RMS {stats['rms_dbfs']:.1f} dBFS, "
+                  f"peak {stats['peak_dbfs']:.1f} dBFS")
+        print(f"   First 10 samples: {result['first_samples']}")
+    
+    # 4. Verdict
+    for issue in result['issues']:
+        print(f"⚠️  {issue}")
+    if not result['issues']:
+        print("✅ File contains audio data and its header is consistent")
+    return result
 
 # Usage
 filepath = 'recordings/1.wav'
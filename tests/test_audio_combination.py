@@ -0,0 +1,66 @@
+import wave
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import session_catalog
+from audio_combination import create_natural_conversation_mix, natural_mix_gains, track_loudness
+from loudness import LoudnessMeter, envelope_loudness, normalization_gain_db
+from loudness_envelope import envelope_path, write_envelope
+
+
+def write_track(path, pcm, sampwidth=2, rate=48000):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(pcm.shape[1])
+        w.setsampwidth(sampwidth)
+        w.setframerate(rate)
+        w.writeframes(pcm.astype(np.int16 if sampwidth == 2 else np.uint8).tobytes())
+    return str(path)
+
+
+def sine(amplitude, seconds, rate=48000):
+    t = np.arange(int(rate * seconds)) / rate
+    return np.repeat(np.round(amplitude * np.sin(2 * np.pi * 1000 * t))[:, None], 2, axis=1).astype(np.int16)
+
+
+def test_track_without_envelope_is_streamed_through_the_meter(tmp_path):
+    pcm = np.concatenate([sine(3000, 2.5), sine(300, 1.7)])
+    meter = LoudnessMeter(1, 2, 48000)
+    meter.add(pcm.reshape(-1, 1, 2))
+    assert track_loudness(write_track(tmp_path / 'a.wav', pcm)) == pytest.approx(meter.integrated()[0])
+
+
+def test_track_with_envelope_is_measured_from_it(tmp_path):
+    path = write_track(tmp_path / 'b.wav', sine(300, 3))
+    envelope = np.tile([[3277, 4000]], (500, 1)).astype(np.int16)
+    write_envelope(envelope, envelope_path(path))
+    assert track_loudness(path) == pytest.approx(envelope_loudness(envelope, 2))
+
+
+def test_natural_mix_gains_for_loaded_16_bit_tracks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tracks = [
+        {'speaker': 'speaker_1', 'path': write_track('a.wav', sine(3000, 3))},
+        {'speaker': 'speaker_2', 'path': write_track('b.wav', sine(30, 3))},
+        {'speaker': 'speaker_3', 'path': write_track('c.wav', np.full((4800, 2), 128), sampwidth=1)},
+        {'speaker': 'speaker_4', 'path': write_track('d.wav', sine(3000, 3))},
+    ]
+    session_catalog.record_session('s', 1, datetime(2025, 1, 1), 's_timeline.json', tracks)
+    gains = natural_mix_gains('s', {'speaker_1': None, 'speaker_2': None, 'speaker_3': None})
+    assert set(gains) == {'speaker_1', 'speaker_2'}
+    assert gains['speaker_1'] == pytest.approx(normalization_gain_db(track_loudness('a.wav')))
+    assert gains['speaker_2'] > gains['speaker_1']
+
+
+def test_sample_offsets_use_the_track_rate():
+    from pydub import AudioSegment
+    rate = 16000
+    pcm = np.repeat(np.arange(rate * 2, dtype=np.int16)[:, None] // 16, 2, axis=1)  # 1 step per ms
+    audio = AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=rate, channels=2)
+    segment = {'start': '2025-01-01T10:00:00', 'end': '2025-01-01T10:00:00.250000', 'silent': False,
+               'sample_offset': rate // 2, 'end_sample_offset': rate // 2 + rate // 4}
+    mix = create_natural_conversation_mix({'speaker_1': audio}, {'speaker_1': [segment]})
+    assert len(mix) == 250
+    samples = np.array(mix.get_array_of_samples()).reshape(-1, 2)
+    assert samples[0, 0] == 500 and samples[-1, 0] == 749
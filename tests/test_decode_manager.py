@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from decode_manager import MAX_CONCEALED_FRAMES, ConcealedFrame, RecordingDecodeManager
+
+SSRC = 7
+SAMPLES = 960
+
+
+class FakeDecoder:
+    """Returns a frame of PCM tagged with how it was asked for"""
+
+    def __init__(self):
+        self.calls = []
+
+    def decode(self, data, fec=False):
+        self.calls.append('plc' if data is None else 'fec' if fec else 'decode')
+        return bytes(SAMPLES * 2 * 2)
+
+
+def packet(seq, silence=False):
+    return SimpleNamespace(ssrc=SSRC, sequence=seq, timestamp=seq * SAMPLES, receive_time=seq * 0.02,
+                           decrypted_data=b'\xf8\xff\xfe' if silence else b'opus', silence=silence)
+
+
+def manager():
+    passed = []
+    m = RecordingDecodeManager(SimpleNamespace(recv_decoded_audio=passed.append))
+    m.decoder[SSRC] = FakeDecoder()
+    return m, passed
+
+
+def run(lost, last_seq, silent=()):
+    m, passed = manager()
+    m._release(SSRC, [(0, packet(0))])
+    m._release(SSRC, [(seq, None if seq in lost else packet(seq, silence=seq in silent))
+                      for seq in range(1, last_seq + 1)])
+    return m, passed
+
+
+def test_single_loss_is_rebuilt_from_the_next_packets_fec():
+    m, passed = run(lost={1}, last_seq=2)
+    assert [p.sequence for p in passed] == [0, 1, 2]
+    assert isinstance(passed[1], ConcealedFrame)
+    assert passed[1].timestamp == SAMPLES and passed[1].receive_time == SAMPLES / 48000
+    assert m.decoder[SSRC].calls == ['decode', 'fec', 'decode']
+    assert (m.recovered[SSRC], m.concealed[SSRC]) == (1, 0)
+
+
+def test_longer_run_uses_plc_then_fec():
+    m, passed = run(lost={1, 2, 3}, last_seq=4)
+    assert [p.sequence for p in passed] == [0, 1, 2, 3, 4]
+    assert m.decoder[SSRC].calls == ['decode', 'plc', 'plc', 'fec', 'decode']
+
+
+def test_runs_longer_than_the_limit_are_left_as_silence():
+    lost = set(range(1, MAX_CONCEALED_FRAMES + 2))
+    m, passed = run(lost=lost, last_seq=MAX_CONCEALED_FRAMES + 2)
+    assert [p.sequence for p in passed] == [0, MAX_CONCEALED_FRAMES + 2]
+    assert not m.concealed[SSRC] and not m.recovered[SSRC]
+
+
+def test_loss_before_the_speaker_stops_is_not_concealed():
+    m, passed = run(lost={1}, last_seq=2, silent={2})
+    assert [p.sequence for p in passed] == [0]
+
+
+def test_loss_before_the_first_packet_is_not_concealed():
+    m, passed = manager()
+    m._release(SSRC, [(0, None), (1, packet(1))])
+    assert [p.sequence for p in passed] == [1]
@@ -0,0 +1,121 @@
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from decode_processes import FRAME_HEADER, DecodeProcessPool, ProcessDecodeManager, ShmRing, run_worker
+from discord.sinks import RecordingException
+
+
+@pytest.fixture
+def ring():
+    ring = ShmRing(slots=4, slot_bytes=32)
+    yield ring
+    ring.close(unlink=True)
+
+
+def test_ring_wraps_around(ring):
+    for lap in range(3):
+        for i in range(3):
+            assert ring.put(b'h', bytes([lap, i]))
+        assert ring.take() == [b'h' + bytes([lap, i]) for i in range(3)]
+    assert ring.take() == []
+    assert ring.dropped == 0
+
+
+def test_full_ring_drops_new_records(ring):
+    assert all(ring.put(b'', bytes([i])) for i in range(4))
+    assert not ring.put(b'', b'x')
+    assert not ring.put(b'', bytes(31))  # Longer than a slot, whatever the room
+    assert ring.dropped == 2
+    assert ring.take() == [bytes([i]) for i in range(4)]
+    assert ring.put(b'', b'y')
+
+
+def test_other_side_sees_the_same_ring(ring):
+    reader = ShmRing(ring.name, ring.slots, ring.slot_bytes)
+    try:
+        ring.put(b'a', b'b')
+        assert reader.take() == [b'ab']
+        # The writer sees the slot freed by the reader
+        assert ring.counters[1] == 1
+    finally:
+        reader.close()
+
+
+def frame(recording_id, sequence):
+    # Discord's silence frame: counted by the jitter buffer, never decoded
+    return FRAME_HEADER.pack(recording_id, 5, sequence * 960, sequence, 0.0, True), b'\xf8\xff\xfe'
+
+
+@pytest.fixture
+def worker(tmp_path):
+    ring = ShmRing(slots=64, slot_bytes=64)
+    control, results = queue.Queue(), queue.Queue()
+    thread = threading.Thread(target=run_worker, args=(ring.name, 64, 64, control, results), daemon=True)
+    thread.start()
+    yield SimpleNamespace(ring=ring, control=control, results=results, directory=str(tmp_path))
+    control.put(('exit', None))
+    thread.join(2)
+    assert not thread.is_alive()
+    ring.close(unlink=True)
+
+
+def reply(worker, kind):
+    while True:
+        message = worker.results.get(timeout=5)
+        if message[0] == kind or message[0] == 'error':
+            return message
+
+
+def test_worker_start_map_finish_save(worker):
+    # Frames that beat the start message through the ring are kept for it
+    for sequence in range(3):
+        worker.ring.put(*frame(1, sequence))
+    worker.control.put(('start', 1, {'max_size': 0, 'users': [], 'vad': None}, False))
+    worker.control.put(('map', 1, {5: 10}))
+    worker.control.put(('finish', 1))
+    kind, recording_id, metrics = reply(worker, 'finished')
+    assert (kind, recording_id) == ('finished', 1)
+    assert metrics['receive'][5]['received'] == 3
+
+    worker.control.put(('save', 1, 'g_20250101_000000', {}, worker.directory))
+    kind, _, saved = reply(worker, 'saved')
+    assert kind == 'saved' and saved['errors'] == {}
+    assert saved['timeline'].endswith('g_20250101_000000_timeline.json')
+
+
+def test_worker_errors_name_the_failed_message(worker):
+    worker.control.put(('finish', 99))
+    kind, recording_id, (step, trace) = reply(worker, 'finished')
+    assert (kind, recording_id, step) == ('error', 99, 'finish')
+    assert 'KeyError' in trace
+
+
+def test_late_finish_reply_isnt_taken_for_the_save():
+    pool = DecodeProcessPool()
+    pool.results = queue.Queue()
+    process = SimpleNamespace(control=queue.Queue(), recordings={1})
+    manager = pool.managers[1] = ProcessDecodeManager(process, 1, client=None)
+    threading.Thread(target=pool._collect, daemon=True).start()
+
+    manager.wait_finished(timeout=0.01)  # Gives up; the worker answers afterwards
+    pool.results.put(('finished', 1, {'users': [10]}))
+    pool.results.put(('saved', 1, {'tracks': [], 'errors': {}}))
+    assert manager.save('s', {}, 'recordings') == {'tracks': [], 'errors': {}}
+    assert process.control.get_nowait()[0] == 'save'
+    assert 1 not in pool.managers and not process.recordings
+
+
+def test_save_error_is_raised():
+    pool = DecodeProcessPool()
+    pool.results = queue.Queue()
+    process = SimpleNamespace(control=queue.Queue(), recordings={1})
+    manager = pool.managers[1] = ProcessDecodeManager(process, 1, client=None)
+    threading.Thread(target=pool._collect, daemon=True).start()
+    pool.results.put(('error', 1, ('finish', 'finish trace')))
+    pool.results.put(('error', 1, ('save', 'save trace')))
+    with pytest.raises(RecordingException, match='save trace'):
+        manager.save('s', {}, 'recordings')
+    assert manager.replies['finish'].get_nowait() == ('error', 'finish trace')
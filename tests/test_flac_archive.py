@@ -0,0 +1,71 @@
+import os
+import wave
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import session_catalog
+from flac_archive import archive_sessions, archive_track
+from track_reader import open_track, read_audio_segment, soundfile
+
+pytestmark = pytest.mark.skipif(soundfile is None, reason="FLAC needs soundfile")
+
+
+def write_wav(path, frames=10000, channels=2, sampwidth=2):
+    rng = np.random.default_rng(0)
+    pcm = rng.integers(-32768, 32767, size=(frames, channels), dtype=np.int16)
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sampwidth)
+        w.setframerate(48000)
+        w.writeframes(pcm.tobytes() if sampwidth == 2 else bytes(frames * channels * sampwidth))
+    return pcm.tobytes()
+
+
+def test_round_trip_is_lossless_across_blocks(tmp_path):
+    wav = str(tmp_path / 'track.wav')
+    pcm = write_wav(wav)
+    result = archive_track(wav, block_frames=4096)
+    assert result['flac'] == str(tmp_path / 'track.flac')
+    assert result['frames'] == 10000
+    assert os.path.exists(wav)
+    with open_track(result['flac']) as reader:
+        assert (reader.getnchannels(), reader.getframerate(), reader.getsampwidth()) == (2, 48000, 2)
+        assert reader.getnframes() == 10000
+        assert reader.readframes(10000) == pcm
+        reader.setpos(1234)
+        assert reader.readframes(10) == pcm[1234 * 4:1244 * 4]
+
+
+def test_only_16_bit_tracks_are_archived(tmp_path):
+    wav = str(tmp_path / 'track.wav')
+    write_wav(wav, sampwidth=3)
+    with pytest.raises(ValueError):
+        archive_track(wav)
+
+
+def test_flac_and_wav_load_to_the_same_audio_segment(tmp_path):
+    wav = str(tmp_path / 'track.wav')
+    write_wav(wav)
+    flac = archive_track(wav)['flac']
+    from_wav, from_flac = read_audio_segment(wav), read_audio_segment(flac)
+    assert from_flac.raw_data == from_wav.raw_data
+    assert (from_flac.channels, from_flac.frame_rate) == (from_wav.channels, from_wav.frame_rate)
+
+
+def test_archive_sessions_repoints_the_catalog(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('recordings')
+    tracks = []
+    for speaker in ('A', 'B'):
+        path = f'recordings/s1_{speaker}.wav'
+        write_wav(path, frames=2000)
+        tracks.append({'speaker': speaker, 'path': path})
+    session_catalog.record_session('s1', 1, datetime(2025, 1, 1), 'recordings/s1_timeline.json', tracks)
+
+    assert len(archive_sessions(workers=1)) == 2
+    paths = [t['path'] for t in session_catalog.session_tracks('s1')]
+    assert paths == ['recordings/s1_A.flac', 'recordings/s1_B.flac']
+    assert not any(os.path.exists(t['path']) for t in tracks)
+    assert session_catalog.get_session('s1')['status'] == 'archived'
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+from jitter_buffer import RESYNC_PACKETS, SEQ_MOD, JitterBuffer, seq_delta
+
+
+def packet(seq):
+    return SimpleNamespace(sequence=seq)
+
+
+def seqs(released):
+    return [(seq, p is not None) for seq, p in released]
+
+
+def test_seq_delta_wraps():
+    assert seq_delta(0, SEQ_MOD - 1) == 1
+    assert seq_delta(SEQ_MOD - 1, 0) == -1
+    assert seq_delta(5, 3) == 2
+
+
+def test_in_order_packets_pass_straight_through():
+    jb = JitterBuffer()
+    for seq in range(5):
+        assert seqs(jb.push(packet(seq), now=seq * 0.02)) == [(seq, True)]
+    assert jb.stats() == {'received': 5, 'reordered': 0, 'late': 0, 'lost': 0, 'held': 0}
+
+
+def test_reordered_packet_is_released_in_sequence():
+    jb = JitterBuffer()
+    jb.push(packet(0), 0)
+    assert jb.push(packet(2), 0.02) == []
+    assert seqs(jb.push(packet(1), 0.03)) == [(1, True), (2, True)]
+    assert jb.reordered == 1 and jb.lost == 0
+
+
+def test_gap_is_given_up_after_the_depth():
+    jb = JitterBuffer(depth_ms=60)
+    jb.push(packet(0), 0)
+    jb.push(packet(2), 0.0)
+    assert jb.poll(0.05) == []
+    assert seqs(jb.poll(0.06)) == [(1, False), (2, True)]
+    assert jb.lost == 1
+
+
+def test_gap_is_given_up_when_too_many_packets_are_held():
+    jb = JitterBuffer(depth_ms=60)  # 3 packets
+    jb.push(packet(0), 0)
+    jb.push(packet(2), 0)
+    jb.push(packet(3), 0)
+    assert seqs(jb.push(packet(4), 0)) == [(1, False), (2, True), (3, True), (4, True)]
+
+
+def test_late_and_duplicate_packets_are_dropped():
+    jb = JitterBuffer()
+    jb.push(packet(0), 0)
+    jb.push(packet(2), 0)
+    assert jb.push(packet(2), 0) == []
+    jb.poll(1)
+    assert jb.push(packet(1), 1) == []
+    assert jb.late == 2
+
+
+def test_sequence_wraparound():
+    jb = JitterBuffer()
+    jb.push(packet(SEQ_MOD - 2), 0)
+    assert jb.push(packet(0), 0) == []
+    assert seqs(jb.push(packet(SEQ_MOD - 1), 0)) == [(SEQ_MOD - 1, True), (0, True)]
+    assert seqs(jb.push(packet(1), 0)) == [(1, True)]
+    assert jb.lost == 0 and jb.late == 0
+
+
+def test_jump_far_ahead_resyncs_instead_of_counting_loss():
+    jb = JitterBuffer()
+    jb.push(packet(0), 0)
+    jb.push(packet(2), 0)
+    released = jb.push(packet(2 + RESYNC_PACKETS + 1), 0)
+    assert seqs(released) == [(1, False), (2, True), (2 + RESYNC_PACKETS + 1, True)]
+    assert jb.lost == 1
+
+
+def test_flush_releases_everything_held():
+    jb = JitterBuffer()
+    jb.push(packet(0), 0)
+    jb.push(packet(3), 0)
+    assert seqs(jb.flush()) == [(1, False), (2, False), (3, True)]
+    assert jb.stats()['held'] == 0
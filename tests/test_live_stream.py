@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+
+from live_stream import CLIENT_QUEUE_FRAMES, FRAME_SAMPLES, MAX_GAP_FRAMES, MIX_DELAY_FRAMES, LiveMixer
+
+
+class Loop:
+    """Stands in for the event loop: records what feed() hands over"""
+
+    def __init__(self):
+        self.calls = []
+
+    def call_soon_threadsafe(self, callback, *args):
+        self.calls.append((callback, args))
+
+
+def packet(session_sample, samples, value, pad=0):
+    pcm = np.full((pad + samples, 2), value, dtype=np.int16)
+    pcm[:pad] = 12345  # Padding is never mixed
+    return SimpleNamespace(decoded_data=pcm.tobytes(), pad_samples=pad, session_sample=session_sample)
+
+
+def listening_mixer():
+    mixer = LiveMixer(Loop())
+    mixer.clients.add(object())
+    return mixer
+
+
+def sent(mixer):
+    chunks = b''.join(args[0] for _, args in mixer.loop.calls)
+    return np.frombuffer(chunks, dtype=np.int16).reshape(-1, 2)
+
+
+def test_nothing_is_mixed_without_listeners():
+    mixer = LiveMixer(Loop())
+    mixer.feed(packet(0, 10 * FRAME_SAMPLES, 100))
+    assert mixer.next_frame is None and not mixer.frames and not mixer.loop.calls
+
+
+def test_speakers_are_summed_into_frames_on_the_session_clock():
+    mixer = listening_mixer()
+    mixer.feed(packet(0, FRAME_SAMPLES, 100))
+    # Straddles frames 1 and 2, after some padding
+    mixer.feed(packet(FRAME_SAMPLES + FRAME_SAMPLES // 2, FRAME_SAMPLES, 50, pad=200))
+    assert not mixer.loop.calls  # Held back for MIX_DELAY_FRAMES
+    mixer.feed(packet(FRAME_SAMPLES, 5 * FRAME_SAMPLES, 100))
+
+    out = sent(mixer)
+    assert len(out) == (6 - MIX_DELAY_FRAMES) * FRAME_SAMPLES
+    half = FRAME_SAMPLES // 2
+    assert (out[:FRAME_SAMPLES + half] == 100).all()
+    assert (out[FRAME_SAMPLES + half:2 * FRAME_SAMPLES + half] == 150).all()
+    assert (out[2 * FRAME_SAMPLES + half:] == 100).all()
+    assert mixer.next_frame == 6 - MIX_DELAY_FRAMES
+
+
+def test_late_audio_is_dropped_and_sums_are_clipped():
+    mixer = listening_mixer()
+    mixer.feed(packet(0, (MIX_DELAY_FRAMES + 1) * FRAME_SAMPLES, 30000))
+    mixer.feed(packet(0, FRAME_SAMPLES, 30000))  # Frame 0 has been sent already
+    mixer.feed(packet(FRAME_SAMPLES, FRAME_SAMPLES, 30000))
+    out = sent(mixer)
+    assert (out[:FRAME_SAMPLES] == 30000).all()
+    assert (out[FRAME_SAMPLES:2 * FRAME_SAMPLES] == 32767).all()
+
+
+def test_gaps_are_filled_with_silence_up_to_a_limit():
+    mixer = listening_mixer()
+    mixer.feed(packet(0, FRAME_SAMPLES, 100))
+    mixer.feed(packet(10 * FRAME_SAMPLES, FRAME_SAMPLES, 100))
+    out = sent(mixer)
+    assert len(out) == (11 - MIX_DELAY_FRAMES) * FRAME_SAMPLES
+    assert (out[:FRAME_SAMPLES] == 100).all() and not out[FRAME_SAMPLES:].any()
+
+    # Everyone was quiet for longer than MAX_GAP_FRAMES: jump ahead
+    mixer.loop.calls.clear()
+    resume = 11 + 2 * MAX_GAP_FRAMES + MIX_DELAY_FRAMES
+    mixer.feed(packet(resume * FRAME_SAMPLES, FRAME_SAMPLES, 100))
+    assert len(sent(mixer)) == (MAX_GAP_FRAMES + 1) * FRAME_SAMPLES
+    assert mixer.next_frame == resume - MIX_DELAY_FRAMES + 1
+
+
+def test_slow_client_is_dropped_without_affecting_others():
+    async def run():
+        mixer = LiveMixer(asyncio.get_running_loop())
+        slow, fast = mixer.listen(), mixer.listen()
+        received = 0
+        for _ in range(CLIENT_QUEUE_FRAMES + 1):
+            mixer._broadcast(b'chunk')
+            while not fast.empty():
+                fast.get_nowait()
+                received += 1
+        return mixer, slow, fast, received
+
+    mixer, slow, fast, received = asyncio.run(run())
+    assert received == CLIENT_QUEUE_FRAMES + 1
+    assert mixer.clients == {fast} and mixer.dropped_clients == 1
+    # Its handler finds only the None telling it to stop
+    assert slow.get_nowait() is None and slow.empty()
+
+
+def test_close_stops_every_listener():
+    async def run():
+        mixer = LiveMixer(asyncio.get_running_loop())
+        queues = [mixer.listen(), mixer.listen()]
+        mixer._broadcast(b'chunk')
+        mixer.close()
+        return mixer, queues
+
+    mixer, queues = asyncio.run(run())
+    assert not mixer.clients
+    assert [q.get_nowait() for q in queues] == [None, None]
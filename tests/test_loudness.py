@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+from loudness import (MAX_BOOST_DB, MAX_CUT_DB, TARGET_LUFS, LoudnessMeter, envelope_loudness, lfilter,
+                      normalization_gain_db)
+
+RATE = 48000
+
+
+def sine(amplitude, seconds, freq=1000, channels=2):
+    t = np.arange(int(RATE * seconds)) / RATE
+    wave = np.round(amplitude * 32767 * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+    return np.repeat(wave[:, None], channels, axis=1)
+
+
+def measure(*streams, block=RATE // 7, weighted=True):
+    """Integrated loudness of equal-length (samples, channels) streams, fed in odd-sized blocks"""
+    data = np.stack(streams, axis=1)
+    meter = LoudnessMeter(len(streams), data.shape[2], RATE, weighted=weighted)
+    for i in range(0, len(data), block):
+        meter.add(data[i:i + block])
+    return meter.integrated()
+
+
+@pytest.mark.skipif(lfilter is None, reason="K-weighting needs scipy")
+def test_1khz_stereo_sine_reads_at_its_level():
+    # BS.1770: K-weighting is ~0 dB at 1 kHz, so a stereo sine at -20 dBFS peak reads -20 LUFS
+    assert measure(sine(0.1, 5))[0] == pytest.approx(-20.0, abs=0.2)
+
+
+def test_unweighted_mono_sine():
+    # RMS of a sine is 3 dB under its peak; -0.691 is the BS.1770 offset
+    expected = -0.691 + 10 * math.log10(0.1 ** 2 / 2)
+    assert measure(sine(0.1, 5, channels=1), weighted=False)[0] == pytest.approx(expected, abs=0.1)
+
+
+def test_block_size_doesnt_change_the_result():
+    speech = np.concatenate([sine(0.1, 2), sine(0.03, 3, freq=300)])
+    assert measure(speech, block=RATE * 10)[0] == pytest.approx(measure(speech, block=997)[0], abs=1e-9)
+
+
+def test_silence_is_gated_out():
+    # Long enough that the few 400 ms blocks straddling the edge barely count
+    tone = sine(0.1, 15)
+    padded = np.concatenate([tone, np.zeros((RATE * 20, 2), dtype=np.int16)])
+    assert measure(padded)[0] == pytest.approx(measure(tone)[0], abs=0.1)
+
+
+def test_quiet_passages_fall_under_the_relative_gate():
+    loud = sine(0.1, 15)
+    quiet = sine(0.005, 10)  # 26 dB down, under the -10 LU relative gate
+    assert measure(np.concatenate([loud, quiet]))[0] == pytest.approx(measure(loud)[0], abs=0.1)
+
+
+def test_streams_are_measured_separately():
+    loud, quiet, silent = measure(sine(0.1, 3), sine(0.01, 3), np.zeros((RATE * 3, 2), dtype=np.int16))
+    assert loud - quiet == pytest.approx(20, abs=0.2)
+    assert silent == -math.inf
+
+
+def test_envelope_loudness_matches_constant_rms():
+    rms = 3276.8  # -20 dBFS
+    envelope = np.full((500, 2), rms)
+    expected = -0.691 + 10 * math.log10(2 * (rms / 32768) ** 2)
+    assert envelope_loudness(envelope) == pytest.approx(expected, abs=0.1)
+
+
+def test_normalization_gain_is_clamped():
+    assert normalization_gain_db(TARGET_LUFS - 5) == pytest.approx(5)
+    assert normalization_gain_db(-90) == MAX_BOOST_DB
+    assert normalization_gain_db(10) == -MAX_CUT_DB
+    assert normalization_gain_db(-math.inf) == 0.0
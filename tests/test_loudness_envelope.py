@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from loudness_envelope import (EnvelopeBuilder, detect_silence, envelope_path, level_stats, load_envelope,
+                               write_envelope)
+
+BLOCK = 480 * 2  # Interleaved samples in 10 ms of stereo at 48 kHz
+
+
+def build(samples, chunk):
+    builder = EnvelopeBuilder()
+    pcm = np.asarray(samples, dtype=np.int16).tobytes()
+    for i in range(0, len(pcm), chunk):
+        builder.add(pcm[i:i + chunk])
+    return builder.finish()
+
+
+def test_blocks_rms_and_peak_whatever_the_chunking():
+    samples = np.concatenate([
+        np.full(BLOCK, 1000),                        # rms 1000, peak 1000
+        np.tile([3000, -3000], BLOCK // 2),          # rms 3000, peak 3000
+        np.concatenate([np.zeros(BLOCK - 1), [-32768]]),  # one full-scale sample, clamped to 32767
+        np.full(100, 200),                           # partial last block
+    ])
+    expected = [[1000, 1000], [3000, 3000], [round(32768 / BLOCK ** 0.5), 32767], [200, 200]]
+    for chunk in (3840, 1922, 14, len(samples) * 2):  # Bytes; frames always hold whole samples
+        assert build(samples, chunk).tolist() == expected
+
+
+def test_round_trip_next_to_the_track(tmp_path):
+    track = str(tmp_path / 's_Ann_7.wav')
+    assert load_envelope(track) is None
+    envelope = build(np.full(BLOCK * 3, 500), 4096)
+    write_envelope(envelope, envelope_path(track))
+    assert envelope_path(track).endswith('s_Ann_7.envelope.npy')
+    assert load_envelope(track).tolist() == envelope.tolist()
+
+
+def speech_and_pauses():
+    """1 s loud, 1.5 s quiet, 0.5 s loud, 0.3 s quiet, 1 s loud (stereo, 48 kHz)"""
+    parts = []
+    for seconds, level in ((1, 8000), (1.5, 20), (0.5, 8000), (0.3, 20), (1, 8000)):
+        n = int(seconds * 48000)
+        parts.append(np.repeat((level * np.sin(np.arange(n) / 7)).astype(np.int16)[:, None], 2, axis=1))
+    return np.concatenate(parts)
+
+
+def test_detect_silence_finds_the_long_pause():
+    envelope = build(speech_and_pauses().reshape(-1), 3840)
+    assert detect_silence(envelope, min_silence_len=1000, silence_thresh=-40) == [[1000, 2500]]
+    assert detect_silence(envelope, min_silence_len=200, silence_thresh=-40) == [[1000, 2500], [3000, 3300]]
+    assert detect_silence(envelope[:50], min_silence_len=1000) == []
+
+
+def test_detect_silence_agrees_with_pydub():
+    silence = pytest.importorskip('pydub.silence')
+    from pydub import AudioSegment
+    pcm = speech_and_pauses()
+    audio = AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=48000, channels=2)
+    envelope = build(pcm.reshape(-1), 3840)
+    assert detect_silence(envelope, 200, -40) == silence.detect_silence(audio, 200, -40, seek_step=10)
+
+
+def test_level_stats():
+    envelope = build(speech_and_pauses().reshape(-1), 3840)
+    stats = level_stats(envelope, silence_thresh=-40)
+    assert stats['duration_ms'] == 4300
+    assert stats['silent_fraction'] == pytest.approx(1800 / 4300)
+    assert 7990 <= stats['peak'] <= 8000
+    assert level_stats(np.zeros((0, 2)))['silent_fraction'] == 1.0
+
+
+def test_cleaning_uses_the_envelope_instead_of_the_audio(tmp_path, monkeypatch):
+    import audio_cleaning
+    track = str(tmp_path / 's_Ann_7.wav')
+    write_envelope(build(speech_and_pauses().reshape(-1), 3840), envelope_path(track))
+    monkeypatch.setattr(audio_cleaning, 'read_audio_segment', lambda path: pytest.fail("audio was decoded"))
+    segment = audio_cleaning.Audiosegment(track)
+    assert segment.split_on_silence(1000, -40) == [[1000, 2500]]
+    output = segment.process_audio(output_file=str(tmp_path / 'silent_parts.txt0'))
+    assert open(output).read() == "[start:0, end:1000\n]\n"
@@ -0,0 +1,81 @@
+import struct
+
+import numpy as np
+import pytest
+
+import media_probe
+from media_probe import probe
+from track_reader import soundfile
+
+needs_soundfile = pytest.mark.skipif(soundfile is None, reason="writing test files needs soundfile")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(media_probe, '_cache', {})
+    monkeypatch.setattr(media_probe, '_cache_loaded', False)
+
+
+def write(path, seconds, rate, channels, **kwargs):
+    frames = int(seconds * rate)
+    t = np.arange(frames) / rate
+    data = np.repeat((0.3 * np.sin(2 * np.pi * 440 * t))[:, None], channels, axis=1)
+    soundfile.write(str(path), data, rate, **kwargs)
+    return str(path)
+
+
+@needs_soundfile
+@pytest.mark.parametrize('subtype, width', [('PCM_16', 2), ('PCM_24', 3), ('FLOAT', 4)])
+def test_wav(tmp_path, subtype, width):
+    info = probe(write(tmp_path / 'a.wav', 1.5, 48000, 2, subtype=subtype), cache_path=None)
+    assert (info['format'], info['sample_rate'], info['channels'], info['sample_width']) == ('wav', 48000, 2, width)
+    assert info['frames'] == 72000 and info['duration'] == pytest.approx(1.5)
+
+
+def test_wav_with_zero_data_size_uses_the_file_size(tmp_path):
+    path = tmp_path / 'z.wav'
+    fmt = struct.pack('<HHIIHH', 1, 1, 8000, 16000, 2, 16)
+    path.write_bytes(b'RIFF' + struct.pack('<I', 0) + b'WAVE' + b'fmt ' + struct.pack('<I', 16) + fmt
+                     + b'LIST' + struct.pack('<I', 3) + b'abc\0'  # Odd-sized chunk with its pad byte
+                     + b'data' + struct.pack('<I', 0) + bytes(8000 * 2))
+    info = probe(str(path), cache_path=None)
+    assert info['frames'] == 8000 and info['duration'] == 1.0
+
+
+@needs_soundfile
+def test_flac(tmp_path):
+    info = probe(write(tmp_path / 'a.flac', 2.0, 44100, 1, subtype='PCM_16'), cache_path=None)
+    assert (info['format'], info['sample_rate'], info['channels'], info['sample_width']) == ('flac', 44100, 1, 2)
+    assert info['frames'] == 88200 and info['duration'] == pytest.approx(2.0)
+
+
+@needs_soundfile
+@pytest.mark.parametrize('subtype, codec, rate', [('VORBIS', 'vorbis', 44100), ('OPUS', 'opus', 48000)])
+def test_ogg(tmp_path, subtype, codec, rate):
+    info = probe(write(tmp_path / 'a.ogg', 3.0, rate, 2, format='OGG', subtype=subtype), cache_path=None)
+    assert (info['format'], info['codec'], info['sample_rate'], info['channels']) == ('ogg', codec, rate, 2)
+    assert info['duration'] == pytest.approx(3.0, abs=0.05)
+
+
+@needs_soundfile
+def test_mp3(tmp_path):
+    info = probe(write(tmp_path / 'a.mp3', 3.0, 44100, 2, format='MP3', subtype='MPEG_LAYER_III'),
+                 cache_path=None)
+    assert (info['format'], info['sample_rate'], info['channels']) == ('mp3', 44100, 2)
+    assert info['duration'] == pytest.approx(3.0, abs=0.1)
+
+
+@needs_soundfile
+def test_cache_follows_file_changes_and_persists(tmp_path, monkeypatch):
+    cache = str(tmp_path / 'cache.json')
+    path = write(tmp_path / 'a.wav', 1.0, 48000, 1, subtype='PCM_16')
+    assert probe(path, cache_path=cache)['duration'] == pytest.approx(1.0)
+    write(path, 2.0, 48000, 1, subtype='PCM_16')
+    assert probe(path, cache_path=cache)['duration'] == pytest.approx(2.0)
+    media_probe.save_cache(cache)
+
+    # A fresh process reads the saved results instead of the file
+    monkeypatch.setattr(media_probe, '_cache', {})
+    monkeypatch.setattr(media_probe, '_cache_loaded', False)
+    monkeypatch.setattr(media_probe, 'probe_wav', lambda f, size: pytest.fail("file was parsed again"))
+    assert probe(path, cache_path=cache)['duration'] == pytest.approx(2.0)
@@ -0,0 +1,92 @@
+import io
+import wave
+
+import pytest
+
+import memory_budget
+from memory_budget import MemoryBudget, SinkMemory, wav_header
+
+
+@pytest.fixture
+def budget():
+    return MemoryBudget(watermark=1000, low_watermark=500)
+
+
+def test_buffer_spills_at_its_threshold(budget, monkeypatch):
+    monkeypatch.setattr(memory_budget, 'BUFFER_SPILL_THRESHOLD', 100)
+    memory = SinkMemory(budget=budget)
+    buffer = memory.new_buffer()
+    buffer.write(bytes(99))
+    assert not buffer.spilled and memory.in_memory == 99
+    buffer.write(b'x')
+    assert buffer.spilled
+    assert (memory.in_memory, budget.in_memory, memory.spills, memory.spilled_bytes) == (0, 0, 1, 100)
+    buffer.write(bytes(50))  # Writes after a spill don't count against memory
+    assert budget.in_memory == 0 and buffer.in_memory_bytes() == 0
+
+
+def test_spilled_buffer_reads_writes_and_seeks_the_same(budget):
+    memory = SinkMemory(budget=budget)
+    buffer = memory.new_buffer()
+    buffer.write(b'hello world')
+    buffer.seek(6)
+    memory.spill(buffer, 'test')
+    assert buffer.spilled and buffer.tell() == 6
+    buffer.write(b'WORLD!')  # Overwrites, then extends
+    assert buffer.getvalue() == b'hello WORLD!'
+    assert buffer.tell() == 12
+    buffer.seek(0)
+    assert buffer.read(5) == b'hello'
+    buffer.seek(-1, io.SEEK_END)
+    assert buffer.read() == b'!'
+    assert memory.spill(buffer, 'again') == 0
+    buffer.close()
+    assert buffer.closed
+
+
+def test_sink_limit_spills_its_largest_buffer(budget):
+    memory = SinkMemory(limit=150, budget=budget)
+    small, large = memory.new_buffer(), memory.new_buffer()
+    small.write(bytes(40))
+    large.write(bytes(100))
+    assert not large.spilled
+    small.write(bytes(20))  # 160 in memory: over the sink's limit
+    assert large.spilled and not small.spilled
+    assert memory.metrics()['in_memory_bytes'] == 60
+
+
+def test_process_watermark_spills_down_to_the_low_watermark(budget):
+    first, second = SinkMemory(budget=budget), SinkMemory(budget=budget)
+    buffers = [first.new_buffer(), first.new_buffer(), second.new_buffer()]
+    for buffer, size in zip(buffers, (400, 300, 250)):
+        buffer.write(bytes(size))
+    assert budget.in_memory == 950 and budget.watermark_hits == 0
+    buffers[2].write(bytes(100))  # 1050: spill the largest buffers (400, then 350) until at most 500
+    assert [b.spilled for b in buffers] == [True, False, True]
+    assert budget.in_memory == 300 and budget.watermark_hits == 1
+    assert budget.peak == 1050
+    assert budget.metrics()['spills'] == 2
+
+
+def test_reserve_counts_and_spills_others(budget):
+    memory = SinkMemory(budget=budget)
+    buffer = memory.new_buffer()
+    buffer.write(bytes(600))
+    budget.reserve(600)
+    assert buffer.spilled
+    assert budget.metrics()['reserved_bytes'] == 600 and budget.in_memory == 600
+    budget.unreserve(600)
+    assert budget.reserved == 0 and budget.in_memory == 0
+
+
+def test_release_returns_memory_and_unregisters(budget):
+    memory = SinkMemory(budget=budget)
+    memory.new_buffer().write(bytes(300))
+    memory.release()
+    assert budget.in_memory == 0 and budget.metrics()['active_sinks'] == 0
+
+
+def test_wav_header_is_readable():
+    pcm = bytes(400)
+    with wave.open(io.BytesIO(wav_header(len(pcm), 2, 48000, 2) + pcm)) as w:
+        assert (w.getnchannels(), w.getframerate(), w.getsampwidth(), w.getnframes()) == (2, 48000, 2, 100)
@@ -0,0 +1,76 @@
+import json
+import wave
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import session_catalog
+from multitrack_export import AlignedSession, export_multitrack
+
+
+def write_track(path, left, right):
+    pcm = np.stack([left, right], axis=1).astype(np.int16)
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(48000)
+        w.writeframes(pcm.tobytes())
+
+
+def placed(session_sample, offset, length, silent=False):
+    return {'start': '2025-01-01T10:00:00', 'end': '2025-01-01T10:00:01', 'silent': silent,
+            'session_sample': session_sample, 'sample_offset': offset, 'end_sample_offset': offset + length}
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """speaker_1 talks from the start; speaker_2 starts late, pauses and comes back"""
+    monkeypatch.chdir(tmp_path)
+    write_track('a.wav', np.full(100, 1000), np.full(100, 3000))
+    write_track('b.wav', np.r_[np.full(80, -400), np.full(20, 600)], np.r_[np.full(80, -200), np.full(20, 800)])
+    timeline = {
+        'speaker_1': [placed(0, 0, 100)],
+        'speaker_2': [placed(150, 0, 80), placed(230, 0, 0, silent=True), placed(300, 80, 20)],
+        'speaker_3': [placed(0, 0, 50)],  # No track in the catalog
+    }
+    with open('s_timeline.json', 'w') as f:
+        json.dump(timeline, f)
+    session_catalog.record_session('s', 1, datetime(2025, 1, 1), 's_timeline.json',
+                                   [{'speaker': 'speaker_1', 'path': 'a.wav'},
+                                    {'speaker': 'speaker_2', 'path': 'b.wav'}])
+    return 's'
+
+
+def expected_mono():
+    out = np.zeros((320, 2), dtype=np.int16)
+    out[:100, 0] = 2000      # (1000 + 3000) / 2
+    out[150:230, 1] = -300   # (-400 + -200) / 2
+    out[300:320, 1] = 700    # (600 + 800) / 2
+    return out
+
+
+def test_blocks_place_each_speaker_on_the_session_clock(session):
+    aligned = AlignedSession(session)
+    assert aligned.speakers == ['speaker_1', 'speaker_2']
+    assert aligned.total_samples == 320
+    blocks = list(aligned.blocks(block_samples=64))
+    assert [start for start, _ in blocks] == [0, 64, 128, 192, 256]
+    stacked = np.concatenate([block for _, block in blocks])
+    assert stacked.shape == (320, 2, 2)
+    assert (stacked[:100, 0] == [1000, 3000]).all() and not stacked[100:, 0].any()
+    assert not stacked[:150, 1].any()  # Zero-filled until speaker_2 starts
+    assert (stacked[150:230, 1] == [-400, -200]).all()
+    assert not stacked[230:300, 1].any()
+    assert (stacked[300:, 1] == [600, 800]).all()
+
+
+def test_export_writes_a_mono_channel_per_speaker(session):
+    path = export_multitrack(session, block_samples=64)
+    assert path == 's_multitrack.wav'
+    with wave.open(path) as w:
+        assert (w.getnchannels(), w.getframerate(), w.getnframes()) == (2, 48000, 320)
+        mono = np.frombuffer(w.readframes(320), dtype=np.int16).reshape(-1, 2)
+    assert (mono == expected_mono()).all()
+    with open('s_multitrack.json') as f:
+        assert json.load(f)['channels'] == ['speaker_1', 'speaker_2']
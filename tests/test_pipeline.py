@@ -0,0 +1,126 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import pipeline
+import session_catalog
+from pipeline import Stage, input_hash, run_pipeline, run_task
+
+
+def copy_track(src, dst, log):
+    with open(log, 'a') as f:
+        f.write(f"copy {os.path.basename(src)}\n")
+    if 'broken' in src:
+        raise RuntimeError("bad track")
+    with open(src, 'rb') as f, open(dst, 'wb') as out:
+        out.write(f.read())
+
+
+def join_tracks(paths, dst, log):
+    with open(log, 'a') as f:
+        f.write("join\n")
+    with open(dst, 'wb') as out:
+        for path in paths:
+            with open(path, 'rb') as f:
+                out.write(f.read())
+
+
+def stages(log):
+    return [
+        Stage('copy', copy_track, 'track',
+              inputs=lambda s, t: [t['path']],
+              outputs=lambda s, t: [t['path'] + '.copy'],
+              args=lambda s, t: (t['path'], t['path'] + '.copy', log)),
+        Stage('join', join_tracks, 'session', after=('copy',),
+              inputs=lambda s, t: [track['path'] + '.copy' for track in t],
+              outputs=lambda s, t: [f"recordings/{s['session_id']}.joined"],
+              args=lambda s, t: ([track['path'] + '.copy' for track in t],
+                                 f"recordings/{s['session_id']}.joined", log)),
+    ]
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """A catalogued session with two speaker tracks, in a fresh recordings/ under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('recordings')
+    tracks = []
+    for speaker in ('A', 'B'):
+        path = f'recordings/s1_{speaker}.wav'
+        with open(path, 'wb') as f:
+            f.write(speaker.encode() * 100)
+        tracks.append({'speaker': speaker, 'path': path})
+    session_catalog.record_session('s1', 1, datetime(2025, 1, 1), 'recordings/s1_timeline.json', tracks)
+    return tracks
+
+
+def runs(log):
+    with open(log) as f:
+        lines = f.read().splitlines()
+    open(log, 'w').close()
+    return sorted(lines)
+
+
+def test_run_task_skips_when_inputs_and_outputs_are_unchanged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    src, dst, log = 'in.wav', 'out.wav', 'log.txt'
+    with open(src, 'wb') as f:
+        f.write(b'x')
+    first, ran = run_task(copy_track, (src, dst, log), 'copy:1', [src], [dst], None)
+    assert ran
+    assert run_task(copy_track, (src, dst, log), 'copy:1', [src], [dst], first) == (first, False)
+    # A new stage version, or a missing output, runs it again
+    assert run_task(copy_track, (src, dst, log), 'copy:2', [src], [dst], first)[1]
+    os.remove(dst)
+    assert run_task(copy_track, (src, dst, log), 'copy:1', [src], [dst], first)[1]
+
+
+def test_input_hash_follows_content_and_stage_version(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open('in.wav', 'wb') as f:
+        f.write(b'x')
+    first = input_hash('copy:1', ['in.wav'])
+    assert input_hash('copy:1', ['in.wav']) == first
+    assert input_hash('copy:2', ['in.wav']) != first
+    with open('in.wav', 'ab') as f:
+        f.write(b'y')
+    assert input_hash('copy:1', ['in.wav']) != first
+
+
+def test_second_run_skips_everything(session):
+    log = 'log.txt'
+    assert run_pipeline(workers=2, stages=stages(log))
+    assert runs(log) == ['copy s1_A.wav', 'copy s1_B.wav', 'join']
+    assert session_catalog.get_session('s1')['status'] == 'processed'
+    assert {t['status'] for t in session_catalog.session_tracks('s1')} == {'recorded'}
+
+    assert run_pipeline(workers=2, stages=stages(log))
+    assert runs(log) == []
+
+
+def test_changed_track_reruns_only_what_depends_on_it(session):
+    log = 'log.txt'
+    run_pipeline(workers=2, stages=stages(log))
+    runs(log)
+    with open(session[1]['path'], 'ab') as f:
+        f.write(b'more')
+    assert run_pipeline(workers=2, stages=stages(log))
+    assert runs(log) == ['copy s1_B.wav', 'join']
+
+
+def test_failed_task_fails_its_dependents(session):
+    log = 'log.txt'
+    broken = 'recordings/s1_broken.wav'
+    os.rename(session[1]['path'], broken)
+    session_catalog.move_track(session[1]['path'], broken)
+    assert not run_pipeline(workers=2, stages=stages(log))
+    assert runs(log) == ['copy s1_A.wav', 'copy s1_broken.wav']
+    assert session_catalog.get_session('s1')['status'] == 'recorded'
+    assert session_catalog.stage_input_hash('join:s1') is None
+
+
+def test_default_stages_clean_output_matches_its_args():
+    clean = next(stage for stage in pipeline.STAGES if stage.name == 'clean')
+    track = {'path': 'recordings/s1_A.wav'}
+    assert clean.outputs(None, track) == [clean.args(None, track)[1]]
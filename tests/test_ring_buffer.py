@@ -0,0 +1,105 @@
+import gc
+import threading
+import wave
+from types import SimpleNamespace
+
+import discord
+import numpy as np
+
+from memory_budget import PROCESS_BUDGET
+from ring_buffer import RingBufferSink, SpeakerRing, write_clip
+from tee_sink import Branch, TeeSink
+from voice_client import CHANNELS, SAMPLING_RATE
+
+FRAME = 960  # 20 ms
+
+
+def frame(value, samples=FRAME):
+    return np.full((samples, CHANNELS), value, dtype=np.int16)
+
+
+def packet(session_sample, value):
+    return SimpleNamespace(session_sample=session_sample, pad_samples=0, decoded_data=frame(value).tobytes())
+
+
+def test_window_wraps_around_the_ring():
+    ring = SpeakerRing(10)
+    ring.put(0, np.arange(8).repeat(CHANNELS).reshape(-1, CHANNELS))
+    ring.put(8, np.arange(8, 14).repeat(CHANNELS).reshape(-1, CHANNELS))
+    assert ring.head == 14
+    assert ring.window(14)[:, 0].tolist() == list(range(4, 14))
+
+
+def test_gaps_are_silent_not_stale():
+    ring = SpeakerRing(10)
+    ring.put(0, frame(7, 10))
+    ring.put(25, frame(1, 2))  # Nothing for samples 10..25: the previous lap must not show through
+    assert ring.window(27)[:, 0].tolist() == [0] * 8 + [1, 1]
+
+
+def test_audio_older_than_the_window_is_dropped():
+    ring = SpeakerRing(10)
+    ring.put(20, frame(1, 2))
+    ring.put(5, frame(9, 10))  # Only samples 12..14 are still inside the window (12..21)
+    assert ring.window(22)[:, 0].tolist() == [9, 9, 9, 0, 0, 0, 0, 0, 1, 1]
+
+
+def test_speakers_stay_aligned_and_are_mixed():
+    sink = RingBufferSink(1)
+    sink.write_packet(packet(0, 100), 1)
+    sink.write_packet(packet(FRAME, 200), 2)
+    sink.write_packet(packet(FRAME, 300), 1)
+    tracks, mix = sink.snapshot()
+    assert set(tracks) == {1, 2} and len(mix) == 2 * FRAME
+    assert tracks[1][:, 0].tolist() == [100] * FRAME + [300] * FRAME
+    assert tracks[2][:, 0].tolist() == [0] * FRAME + [200] * FRAME
+    assert mix[FRAME:, 0].tolist() == [500] * FRAME
+
+
+def test_mix_is_clipped_to_int16():
+    sink = RingBufferSink(1)
+    sink.write_packet(packet(0, 30000), 1)
+    sink.write_packet(packet(0, 30000), 2)
+    assert sink.snapshot()[1].max() == 32767
+
+
+def test_memory_stays_fixed_and_is_returned_to_the_budget():
+    before = PROCESS_BUDGET.reserved
+    sink = RingBufferSink(1, mix=False)
+    assert PROCESS_BUDGET.reserved == before  # Nothing until someone talks
+    for i in range(200):  # Four laps of the ring
+        sink.write_packet(packet(i * FRAME, i), 1)
+    ring_bytes = SAMPLING_RATE * CHANNELS * 2
+    assert PROCESS_BUDGET.reserved == before + ring_bytes
+    del sink
+    gc.collect()
+    assert PROCESS_BUDGET.reserved == before
+
+
+def test_user_filter():
+    sink = RingBufferSink(1, users=[1])
+    sink.write_packet(packet(0, 5), 2)
+    assert sink.snapshot() == ({}, None)
+
+
+def test_write_clip(tmp_path):
+    path = write_clip(frame(3), str(tmp_path / 'clip.wav'))
+    with wave.open(path, 'rb') as w:
+        assert (w.getnchannels(), w.getframerate(), w.getnframes()) == (CHANNELS, SAMPLING_RATE, FRAME)
+
+
+def test_window_is_not_a_recording_time_limit():
+    sink = RingBufferSink(300)
+    assert sink.seconds == 0  # py-cord's Filters time limit; anything else stops the recording
+    assert sink.window_seconds == 300
+
+
+def test_ring_branch_of_a_tee_starts_no_stop_timer(monkeypatch):
+    stopped = threading.Event()
+    monkeypatch.setattr(discord.sinks.Filters, 'wait_and_stop', lambda self: stopped.set())
+    tee = TeeSink(discord.sinks.Sink(), [Branch(RingBufferSink(300))])
+    tee.init(SimpleNamespace(loop=None))
+    try:
+        assert not stopped.wait(0.2)
+    finally:
+        tee.branches[0].close()
@@ -0,0 +1,112 @@
+import json
+import os
+import wave
+from datetime import datetime
+
+import pytest
+
+import session_catalog as catalog
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'catalog.sqlite3')
+
+
+def track(speaker, path, user_id=None):
+    return {'speaker': speaker, 'user_id': user_id, 'path': path, 'sample_rate': 48000}
+
+
+def test_sessions_and_tracks_round_trip(db):
+    catalog.record_session('1_20250101_100000', 1, datetime(2025, 1, 1, 10), 't1.json',
+                           [track('speaker_2', 'b.wav'), track('speaker_1', 'a.wav', 7)], db)
+    catalog.record_session('2_20250102_100000', 2, datetime(2025, 1, 2, 10), 't2.json', [], db)
+    catalog.record_session('1_20250103_100000', 1, datetime(2025, 1, 3, 10), 't3.json', [], db)
+
+    assert catalog.get_session('2_20250102_100000', path=db)['guild_id'] == 2
+    assert catalog.get_session(path=db)['session_id'] == '1_20250103_100000'
+    assert catalog.get_session(guild_id=2, path=db)['session_id'] == '2_20250102_100000'
+    assert catalog.get_session('missing', path=db) is None
+
+    catalog.set_session_status('1_20250101_100000', 'processed', db)
+    assert [r['session_id'] for r in catalog.list_sessions(path=db)] == [
+        '1_20250101_100000', '2_20250102_100000', '1_20250103_100000']
+    assert [r['session_id'] for r in catalog.list_sessions(status='processed', path=db)] == ['1_20250101_100000']
+    assert [r['session_id'] for r in catalog.list_sessions(status='recorded', guild_id=1, path=db)] == [
+        '1_20250103_100000']
+
+    rows = catalog.session_tracks('1_20250101_100000', db)
+    assert [(r['speaker'], r['user_id']) for r in rows] == [('speaker_1', 7), ('speaker_2', None)]
+    catalog.update_track('a.wav', db, status='cleaned')
+    catalog.move_track('b.wav', 'b.flac', db)
+    assert [r['path'] for r in catalog.list_tracks(status='cleaned', path=db)] == ['a.wav']
+    assert {r['path'] for r in catalog.list_tracks(path=db)} == {'a.wav', 'b.flac'}
+
+
+def test_recording_a_session_again_replaces_it(db):
+    catalog.record_session('s', 1, None, 't.json', [track('speaker_1', 'a.wav')], db)
+    catalog.set_session_status('s', 'processed', db)
+    catalog.record_session('s', 1, None, 't.json', [track('speaker_1', 'a.wav', 7)], db)
+    assert catalog.get_session('s', path=db)['status'] == 'recorded'
+    assert catalog.session_tracks('s', db)[0]['user_id'] == 7
+
+
+def test_stage_runs(db):
+    assert catalog.stage_input_hash('mix:s', db) is None
+    catalog.record_stage_run('mix:s', 'abc', db)
+    assert catalog.stage_input_hash('mix:s', db) == 'abc'
+
+
+def test_file_hash_is_cached_until_the_file_changes(db, tmp_path, monkeypatch):
+    path = tmp_path / 'a.wav'
+    path.write_bytes(b'one')
+    first = catalog.file_hash(str(path), db)
+
+    reads = []
+    real_open = open
+    monkeypatch.setattr('builtins.open', lambda *a, **k: reads.append(a[0]) or real_open(*a, **k))
+    assert catalog.file_hash(str(path), db) == first
+    assert reads == []  # Size and mtime unchanged: not read again
+
+    path.write_bytes(b'three')
+    assert catalog.file_hash(str(path), db) != first
+    assert reads == [str(path)]
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    catalog.file_hash(str(path), db)
+    assert len(reads) == 2
+
+
+def write_track(path, frames=480):
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(48000)
+        w.writeframes(bytes(frames * 4))
+
+
+def write_timeline(path, speakers):
+    segment = {'start': '2025-01-01T10:00:00', 'end': '2025-01-01T10:00:01', 'silent': False}
+    path.write_text(json.dumps({sp: [segment] for sp in speakers}))
+
+
+def test_import_directory(db, tmp_path):
+    folder = tmp_path / 'recordings'
+    folder.mkdir()
+    # A single-speaker session gets its timeline label
+    write_track(folder / '1_20250101_100000_Ann_Lee_7.wav')
+    write_timeline(folder / '1_20250101_100000_timeline.json', ['speaker_1'])
+    # Two speakers: nothing says which label is whose, so tracks stay keyed by user id
+    write_track(folder / '2_20250102_100000_Bo_8.wav')
+    write_track(folder / '2_20250102_100000_Cy_9.wav')
+    write_timeline(folder / '2_20250102_100000_timeline.json', ['speaker_1', 'speaker_2'])
+    (folder / 'notes_a_b_c_d.txt').write_text('ignored')
+
+    assert catalog.import_directory(str(folder), db) == 2
+    single = catalog.session_tracks('1_20250101_100000', db)
+    assert [(r['speaker'], r['user_id'], r['name']) for r in single] == [('speaker_1', 7, 'Ann_Lee')]
+    assert single[0]['sample_count'] == 480 and single[0]['duration'] == 0.01
+    session = catalog.get_session('1_20250101_100000', path=db)
+    assert session['guild_id'] == 1 and session['started_at'] == '2025-01-01T10:00:00'
+    assert session['timeline_path'].endswith('1_20250101_100000_timeline.json')
+    assert [r['speaker'] for r in catalog.session_tracks('2_20250102_100000', db)] == ['8', '9']
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from ssrc_map import ParkedFrames, SSRCFilter, SSRCMap
+
+
+def info(user_id):
+    return {'user_id': user_id, 'speaking': True}
+
+
+def test_user_index_follows_every_change():
+    m = SSRCMap({1: info(10)})
+    m[2] = info(20)
+    assert (m.ssrc_of(10), m.ssrc_of(20)) == (1, 2)
+    # The user reconnected with a new SSRC
+    m[3] = info(10)
+    assert m.ssrc_of(10) == 3
+    del m[1]  # The stale SSRC going away keeps the new mapping
+    assert m.ssrc_of(10) == 3
+    assert m.pop(2)['user_id'] == 20 and 20 not in m.by_user
+    assert m.pop(2, None) is None
+    assert m.user_id(3) == 10 and m.user_id(99) is None
+    m.clear()
+    assert not m.by_user
+
+
+def test_version_changes_with_the_mapping():
+    m = SSRCMap()
+    versions = {m.version}
+    m[1] = info(10)
+    versions.add(m.version)
+    m.update({2: info(20)})
+    versions.add(m.version)
+    del m[1]
+    versions.add(m.version)
+    assert len(versions) == 4
+
+
+def test_filter_drops_only_ssrcs_mapped_to_other_users():
+    m = SSRCMap({1: info(10), 2: info(20)})
+    ssrc_filter = SSRCFilter(users=[10])
+    assert not ssrc_filter.deny(1, m)
+    assert ssrc_filter.deny(2, m)
+    assert not ssrc_filter.deny(3, m)  # Not mapped yet: could be a wanted user
+    m[3] = info(30)
+    assert ssrc_filter.deny(3, m)
+    assert ssrc_filter.dropped == 2
+
+
+def test_empty_filter_records_everyone():
+    assert not SSRCFilter().deny(2, SSRCMap({2: info(20)}))
+
+
+def frame(ssrc):
+    return SimpleNamespace(ssrc=ssrc)
+
+
+def test_parked_frames_are_released_once_mapped():
+    parked = ParkedFrames()
+    first, second = frame(5), frame(5)
+    parked.park(first)
+    parked.park(second)
+    assert parked.take(SSRCMap()) == []
+    assert parked
+    assert parked.take(SSRCMap({5: info(50)})) == [(50, [first, second])]
+    assert not parked
+
+
+def test_parked_frames_are_bounded():
+    parked = ParkedFrames(max_frames=2, max_ssrcs=1)
+    for _ in range(3):
+        parked.park(frame(5))
+    parked.park(frame(6))  # No room for another SSRC
+    assert len(parked.frames[5]) == 2 and 6 not in parked.frames
+    assert parked.dropped == 2
+
+
+def test_old_parked_frames_expire():
+    parked = ParkedFrames(max_age=0)
+    parked.park(frame(5))
+    assert parked.take(SSRCMap()) == []
+    assert not parked and parked.dropped == 1
+
+
+def test_wrap_keeps_the_gateways_entries():
+    from voice_client import wrap_ssrc_map
+    ws = SimpleNamespace(ssrc_map={1: info(10)})
+    assert wrap_ssrc_map(ws) is ws
+    wrapped = ws.ssrc_map
+    assert isinstance(wrapped, SSRCMap) and wrapped.ssrc_of(10) == 1
+    wrap_ssrc_map(ws)
+    assert ws.ssrc_map is wrapped
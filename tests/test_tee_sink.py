@@ -0,0 +1,86 @@
+import threading
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from tee_sink import Branch, TeeSink
+
+
+class Recorder:
+    def __init__(self, fail=False):
+        self.packets = []
+        self.fail = fail
+
+    def write_packet(self, data, user_id):
+        if self.fail:
+            raise RuntimeError("consumer broke")
+        self.packets.append((data, user_id))
+
+
+def queued(branch):
+    return [item[0] for item in branch.queue]
+
+
+@pytest.mark.parametrize('overflow, kept', [('drop_oldest', [2, 3, 4]), ('drop_newest', [0, 1, 2])])
+def test_full_queue_drops_by_policy(overflow, kept):
+    branch = Branch(Recorder(), maxsize=3, overflow=overflow)
+    for i in range(5):
+        branch.offer((i, 1, True))
+    assert queued(branch) == kept
+    assert branch.stats()['dropped'] == 2
+
+
+def test_detach_policy_stops_taking_frames():
+    branch = Branch(Recorder(), maxsize=2, overflow='detach')
+    for i in range(4):
+        branch.offer((i, 1, True))
+    assert branch.detached and queued(branch) == []
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        Branch(Recorder(), overflow='block')
+
+
+def test_slow_branch_doesnt_hold_up_the_primary():
+    primary, slow = Recorder(), Recorder()
+    release = threading.Event()
+    slow.write_packet = lambda data, user_id: release.wait()
+    tee = TeeSink(primary, [Branch(slow, maxsize=2, overflow='drop_oldest')])
+    tee.branches[0].start(None)
+    for i in range(10):
+        tee.write_packet(SimpleNamespace(decoded_data=b''), i)
+    assert len(primary.packets) == 10
+    assert tee.branches[0].dropped > 0
+    release.set()
+    tee.branches[0].close()
+
+
+def test_branch_gets_every_frame_in_order_and_detaches_on_error():
+    good, bad = Branch(Recorder()), Branch(Recorder(fail=True))
+    tee = TeeSink(Recorder(), [good, bad])
+    for branch in tee.branches:
+        branch.start(None)
+    for i in range(50):
+        tee.write_packet(i, 1)
+    for branch in tee.branches:
+        branch.close()
+    assert [data for data, _ in good.consumer.packets] == list(range(50))
+    assert bad.detached and not good.detached
+    assert tee.stats()['1:Recorder']['detached']
+
+
+def test_user_filter_only_when_every_consumer_filters():
+    a = discord.sinks.Sink(filters={'users': [1]})
+    b = discord.sinks.Sink(filters={'users': [2]})
+    assert sorted(TeeSink(a, [Branch(b)]).filtered_users) == [1, 2]
+    assert not TeeSink(a, [Branch(discord.sinks.Sink())]).filtered_users
+
+
+def test_find_skips_detached_branches():
+    branch = Branch(Recorder(), maxsize=0, overflow='detach')
+    tee = TeeSink(discord.sinks.Sink(), [branch])
+    assert tee.find(Recorder) is branch.consumer
+    branch.offer((0, 1, True))
+    assert tee.find(Recorder) is None
@@ -0,0 +1,58 @@
+import random
+from datetime import datetime, timedelta
+
+from timeline_index import TimelineIndex
+
+T0 = datetime(2025, 1, 1, 12, 0, 0)
+
+
+def segment(start, end, **extra):
+    return dict(start=(T0 + timedelta(seconds=start)).isoformat(),
+                end=(T0 + timedelta(seconds=end)).isoformat(), **extra)
+
+
+def spans(rows):
+    return [(start, end, speaker) for start, end, speaker, _ in rows]
+
+
+def test_point_and_range_queries():
+    index = TimelineIndex({
+        'alice': [segment(0, 2), segment(5, 8)],
+        'bob': [segment(1, 6), segment(10, 11, silent=True)],
+    })
+    assert len(index) == 3
+    assert index.who_spoke_at(1.5) == ['alice', 'bob']
+    assert index.who_spoke_at(2) == ['bob']  # Ends are exclusive
+    assert index.who_spoke_at(5) == ['alice', 'bob']
+    assert index.who_spoke_at(10.5) == []
+    assert spans(index.between(1.5, 5.5)) == [(0, 2, 'alice'), (1, 6, 'bob'), (5, 8, 'alice')]
+    assert spans(index.between(2, 5)) == [(1, 6, 'bob')]
+    assert spans(index.between(0, 10, speakers=['alice', 'nobody'])) == [(0, 2, 'alice'), (5, 8, 'alice')]
+    assert index.who_spoke_at(T0 + timedelta(seconds=7)) == ['alice']
+
+
+def test_silent_segments_on_request():
+    index = TimelineIndex({'bob': [segment(10, 11, silent=True)]}, include_silent=True)
+    assert index.who_spoke_at(0.5) == ['bob']
+
+
+def test_overlapping_segments_match_brute_force():
+    rng = random.Random(4)
+    timeline = {}
+    for speaker in ('a', 'b', 'c'):
+        segments = []
+        for _ in range(200):
+            start = rng.uniform(0, 500)
+            segments.append(segment(start, start + rng.choice([0.5, 3, 40])))
+        timeline[speaker] = segments
+    index = TimelineIndex(timeline)
+    rows = [(s, e, sp) for sp in index.speakers for s, e, _ in index.iter_speaker(sp)]
+
+    for _ in range(300):
+        t1 = rng.uniform(-10, 550)
+        t2 = t1 + rng.choice([0, 0.1, 5, 100])
+        expected = sorted(r for r in rows if r[0] < t2 and r[1] > t1)
+        found = spans(index.between(t1, t2))
+        assert sorted(found) == expected
+        assert [r[0] for r in found] == sorted(r[0] for r in found)
+        assert sorted(spans(index.at(t1))) == sorted(r for r in rows if r[0] <= t1 < r[1])
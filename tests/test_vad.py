@@ -0,0 +1,71 @@
+import math
+
+import numpy as np
+import pytest
+
+from vad import HANGOVER_FRAMES, NOISE_FLOOR_RISE_DB, SPEECH_MARGIN_DB, VoiceActivityDetector, frame_features
+
+FRAME = 960
+RATE = 48000
+
+
+def tone(dbfs, freq=200, start=0):
+    t = (start + np.arange(FRAME)) / RATE
+    wave = 32768 * 10 ** (dbfs / 20) * math.sqrt(2) * np.sin(2 * np.pi * freq * t)
+    return np.repeat(wave.astype(np.int16)[:, None], 2, axis=1).tobytes()
+
+
+def noise(dbfs, seed=0):
+    wave = np.random.default_rng(seed).normal(0, 32768 * 10 ** (dbfs / 20), FRAME)
+    return np.repeat(wave.astype(np.int16)[:, None], 2, axis=1).tobytes()
+
+
+SILENCE = bytes(FRAME * 4)
+
+
+def test_frame_features():
+    level, zcr = frame_features(tone(-20))
+    assert level == pytest.approx(-20, abs=0.1)
+    assert zcr < 0.01  # About 8 crossings in a 20 ms frame of 200 Hz
+    assert frame_features(noise(-20))[1] > 0.4
+
+
+def test_voice_over_silence_is_speech():
+    vad = VoiceActivityDetector()
+    assert not vad.is_speech(1, SILENCE)
+    assert vad.is_speech(1, tone(-25))
+
+
+def test_quiet_or_noisy_frames_are_not_speech():
+    vad = VoiceActivityDetector()
+    assert not vad.is_speech(1, tone(-55))  # Under MIN_SPEECH_DBFS
+    assert not vad.is_speech(2, noise(-20))  # Hiss crosses zero too often
+
+
+def test_hangover_keeps_word_endings():
+    vad = VoiceActivityDetector()
+    vad.is_speech(1, tone(-25))
+    assert all(vad.is_speech(1, SILENCE) for _ in range(HANGOVER_FRAMES))
+    assert not vad.is_speech(1, SILENCE)
+    assert vad.stats()[1] == {'speech': 1 + HANGOVER_FRAMES, 'non_speech': 1}
+
+
+def test_constant_hum_is_learned_as_the_noise_floor():
+    vad = VoiceActivityDetector(hangover=0)
+    vad.is_speech(1, tone(-60))  # Floor drops to -60
+    frames = int((SPEECH_MARGIN_DB + 30) / NOISE_FLOOR_RISE_DB) + 10
+    decisions = [vad.is_speech(1, tone(-30, freq=100, start=i * FRAME)) for i in range(frames)]
+    assert decisions[0] and not decisions[-1]
+
+
+def test_speakers_have_their_own_floor():
+    vad = VoiceActivityDetector()
+    vad.is_speech(1, tone(-40))
+    vad.is_speech(2, SILENCE)
+    assert vad.noise_floor[1] != vad.noise_floor[2]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        VoiceActivityDetector(mode='mute')
+    assert VoiceActivityDetector(mode='drop').drop
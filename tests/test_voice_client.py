@@ -0,0 +1,51 @@
+import asyncio
+import threading
+import time
+
+from voice_client import RecordingVoiceClient
+
+
+class SlowDecoder:
+    def __init__(self):
+        self.stopped_on = None
+
+    def stop(self):
+        time.sleep(0.2)
+        self.stopped_on = threading.current_thread()
+
+
+def client(loop):
+    vc = RecordingVoiceClient.__new__(RecordingVoiceClient)
+    vc.loop = loop
+    vc.use_reactor = False
+    vc.recording = True
+    vc.paused = False
+    vc.decoder = SlowDecoder()
+    return vc
+
+
+def test_stop_without_reactor_doesnt_block_the_loop():
+    async def stop():
+        vc = client(asyncio.get_running_loop())
+        started = time.perf_counter()
+        vc.stop_recording()
+        vc.stop_recording()  # A second /stop while the first is finishing
+        returned = time.perf_counter() - started
+        await vc.finishing
+        return vc, returned
+
+    vc, returned = asyncio.run(stop())
+    assert returned < 0.1
+    assert not vc.recording
+    assert vc.decoder.stopped_on is not threading.main_thread()
+
+
+def test_stop_from_a_receive_thread_runs_in_place():
+    vc = client(asyncio.new_event_loop())
+    try:
+        thread = threading.Thread(target=vc.stop_recording)
+        thread.start()
+        thread.join()
+        assert vc.decoder.stopped_on is thread and not vc.recording
+    finally:
+        vc.loop.close()
@@ -0,0 +1,135 @@
+import queue
+import socket
+import threading
+
+import pytest
+
+from voice_reactor import DecodeWorker, VoiceReactor
+
+
+class Manager:
+    """Stands in for a RecordingDecodeManager"""
+
+    def __init__(self):
+        self.worker = None
+        self.pumps = 0
+        self.finished = threading.Event()
+
+    def pump(self):
+        self.pumps += 1
+
+    def finish(self):
+        self.finished.set()
+
+
+class Loop:
+    def __init__(self):
+        self.calls = queue.Queue()
+
+    def call_soon_threadsafe(self, func):
+        self.calls.put(func)
+
+
+class Client:
+    """The parts of RecordingVoiceClient the reactor uses"""
+
+    def __init__(self, sock):
+        self.socket = sock
+        self.recording = True
+        self.decoder = Manager()
+        self.loop = Loop()
+        self.packets = queue.Queue()
+
+    def unpack_audio(self, data):
+        self.packets.put(data)
+
+    def stop_recording(self):
+        self.recording = False
+
+
+class BrokenSocket:
+    """Readable, but recv fails as a socket closed under us does"""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv(self, size):
+        raise OSError("socket closed")
+
+
+@pytest.fixture
+def pair():
+    sockets = []
+
+    def make():
+        ours, theirs = socket.socketpair()
+        ours.setblocking(False)
+        sockets.extend((ours, theirs))
+        return ours, theirs
+    yield make
+    for sock in sockets:
+        sock.close()
+
+
+def received(vc, timeout=2):
+    return vc.packets.get(timeout=timeout)
+
+
+def test_register_receive_unregister(pair):
+    reactor = VoiceReactor(workers=1)
+    ours, theirs = pair()
+    vc = Client(ours)
+    reactor.register(vc)
+    assert vc.decoder.worker is reactor.workers[0]
+    theirs.send(b'one')
+    assert received(vc) == b'one'
+
+    reactor.unregister(vc)
+    assert vc not in reactor.clients
+    theirs.send(b'two')
+    with pytest.raises(queue.Empty):
+        received(vc, timeout=0.2)
+
+
+def test_socket_swapped_on_reconnect_is_followed(pair):
+    reactor = VoiceReactor(workers=1)
+    old, _ = pair()
+    vc = Client(old)
+    reactor.register(vc)
+    new, theirs = pair()
+    vc.socket = new  # Checked on every pass of the select loop
+    theirs.send(b'after reconnect')
+    assert received(vc) == b'after reconnect'
+    assert reactor.clients[vc] is new
+
+
+def test_socket_error_stops_the_recording_on_the_loop(pair):
+    reactor = VoiceReactor(workers=1)
+    ours, theirs = pair()
+    vc = Client(BrokenSocket(ours))
+    reactor.register(vc)
+    theirs.send(b'x')
+    stop = vc.loop.calls.get(timeout=2)
+    assert stop == vc.stop_recording
+    assert vc not in reactor.clients
+
+
+def test_worker_finishes_a_stopped_manager():
+    worker = DecodeWorker(0)
+    worker.start()
+    manager = Manager()
+    worker.add(manager)
+    assert manager.worker is worker
+    assert worker.finish(manager, timeout=2)
+    assert manager.finished.is_set() and manager.pumps > 0
+    assert manager not in worker.managers
+
+
+def test_finish_times_out_on_a_stuck_worker():
+    worker = DecodeWorker(0)  # Never started
+    manager = Manager()
+    worker.add(manager)
+    assert not worker.finish(manager, timeout=0.05)
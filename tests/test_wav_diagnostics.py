@@ -0,0 +1,92 @@
+import json
+import math
+import struct
+import wave
+
+import numpy as np
+import pytest
+
+from wav_diagnostics import diagnose, scan_recordings, write_report
+
+
+def write_wav(path, samples, sampwidth=2, rate=48000):
+    samples = np.asarray(samples)
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(samples.shape[1])
+        w.setsampwidth(sampwidth)
+        w.setframerate(rate)
+        w.writeframes(samples.astype(f'<i{sampwidth}').tobytes())
+    return str(path)
+
+
+def test_stats_match_numpy_across_chunks(tmp_path):
+    rng = np.random.default_rng(1)
+    samples = rng.integers(-20000, 20000, size=(5000, 2))
+    result = diagnose(write_wav(tmp_path / 'a.wav', samples), chunk_frames=777)
+    assert result['issues'] == []
+    assert result['duration'] == pytest.approx(5000 / 48000)
+    assert (result['min'], result['max']) == (samples.min(), samples.max())
+    assert result['mean'] == pytest.approx(samples.mean())
+    assert result['std'] == pytest.approx(samples.std())
+    left = result['channel_stats'][0]
+    assert left['std'] == pytest.approx(samples[:, 0].std())
+    assert result['first_samples'] == samples.reshape(-1)[:10].tolist()
+
+
+def test_silence_and_clipping_are_flagged(tmp_path):
+    silent = diagnose(write_wav(tmp_path / 's.wav', np.zeros((1000, 1))))
+    assert silent['issues'] == ["all samples are zero"]
+    clipped = diagnose(write_wav(tmp_path / 'c.wav', np.array([[32767], [-32768], [0], [5]] * 10)))
+    assert "20 clipped samples" in clipped['issues']
+
+
+def test_zero_data_size_in_header_is_recovered(tmp_path):
+    path = write_wav(tmp_path / 'z.wav', np.ones((100, 2)))
+    with open(path, 'r+b') as f:
+        f.seek(40)  # The data chunk's size, as WaveSink used to leave it
+        f.write(struct.pack('<I', 0))
+    result = diagnose(path)
+    assert result['data_size'] == 400 and result['header_data_size'] == 0
+    assert any('fix the header' in issue for issue in result['issues'])
+
+
+def test_24_bit_samples_are_sign_extended(tmp_path):
+    path = tmp_path / 'p.wav'
+    frames = [-1, 1, -(1 << 23)]
+    with wave.open(str(path), 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(3)
+        w.setframerate(48000)
+        w.writeframes(b''.join(v.to_bytes(3, 'little', signed=True) for v in frames))
+    result = diagnose(str(path))
+    assert (result['min'], result['max']) == (-(1 << 23), 1)
+
+
+def test_unreadable_files_get_an_error(tmp_path):
+    path = tmp_path / 'bad.wav'
+    path.write_bytes(b'not a wav')
+    assert 'error' in diagnose(str(path))
+
+
+def test_batch_scan_and_reports(tmp_path):
+    folder = tmp_path / 'recordings'
+    (folder / 'sub').mkdir(parents=True)
+    write_wav(folder / 'b.wav', np.ones((100, 1)))
+    write_wav(folder / 'sub' / 'a.wav', np.zeros((100, 1)))
+    (folder / 'notes.txt').write_text('skip me')
+    results = scan_recordings(str(folder), workers=2)
+    assert [r['path'] for r in results] == [str(folder / 'b.wav'), str(folder / 'sub' / 'a.wav')]
+    csv_text = open(write_report(results, str(tmp_path / 'report.csv'))).read()
+    assert csv_text.splitlines()[0].startswith('path,file_size')
+    assert 'all samples are zero' in csv_text
+
+
+def test_json_report_writes_silence_levels_as_null(tmp_path):
+    results = [diagnose(write_wav(tmp_path / 's.wav', np.zeros((100, 2))))]
+    path = write_report(results, str(tmp_path / 'report.json'))
+    text = open(path).read()
+    assert 'Infinity' not in text and 'NaN' not in text
+    report = json.loads(text)
+    levels = [key for key, value in results[0].items() if value == -math.inf]
+    assert levels and all(report[0][key] is None for key in levels)
+    assert report[0]['channel_stats'][0]['peak_dbfs'] is None
@@ -0,0 +1,123 @@
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from heapq import heappop, heappush, merge
+
+
+class TimelineIndex:
+    """
+    Speaker-activity index over a session timeline (the *_timeline.json that
+    save_to_file writes).
+
+    Each speaker's segments are split into layers of segments that don't
+    overlap one another (greedily, in start order), so within a layer both
+    starts and ends are sorted and two bisects give exactly the segments a
+    query hits. A query is O(d log n + k) per speaker, d being the most of
+    that speaker's segments overlapping at once: 1 for recorded tracks,
+    whose segments never overlap. Times are seconds since the earliest
+    segment start (`origin`); datetimes are accepted anywhere a time is
+    expected.
+    """
+
+    def __init__(self, timeline, include_silent=False):
+        parsed = {}
+        for speaker, segments in timeline.items():
+            rows = []
+            for seg in segments:
+                if seg.get('silent', False) and not include_silent:
+                    continue
+                rows.append((_parse(seg['start']), _parse(seg['end']), seg))
+            parsed[speaker] = rows
+
+        starts = [row[0] for rows in parsed.values() for row in rows]
+        self.origin = min(starts) if starts else datetime.now()
+
+        self.speakers = list(parsed)
+        self._starts = {}
+        self._ends = {}
+        self._segments = {}
+        self._layers = {}
+        for speaker, rows in parsed.items():
+            rows.sort(key=lambda row: row[0])
+            starts = [(row[0] - self.origin).total_seconds() for row in rows]
+            ends = [(row[1] - self.origin).total_seconds() for row in rows]
+            self._starts[speaker] = starts
+            self._ends[speaker] = ends
+            self._segments[speaker] = [row[2] for row in rows]
+            self._layers[speaker] = _layers(starts, ends, self._segments[speaker])
+
+    @classmethod
+    def from_file(cls, path, include_silent=False):
+        with open(path, 'r') as f:
+            return cls(json.load(f), include_silent=include_silent)
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+    def to_seconds(self, t):
+        if isinstance(t, str):
+            t = _parse(t)
+        if isinstance(t, datetime):
+            return (t - self.origin).total_seconds()
+        return t
+
+    def _speaker_range(self, speaker, t1, t2):
+        # Segments with start < t2 and end > t1: in a layer, a contiguous run
+        def layer_range(starts, ends, segments):
+            for i in range(bisect_right(ends, t1), bisect_left(starts, t2)):
+                yield starts[i], ends[i], speaker, segments[i]
+        return merge(*(layer_range(*layer) for layer in self._layers[speaker]), key=_start)
+
+    def between(self, t1, t2, speakers=None):
+        """All segments active somewhere in [t1, t2), as (start, end, speaker, segment) in start order"""
+        t1, t2 = self.to_seconds(t1), self.to_seconds(t2)
+        speakers = self.speakers if speakers is None else [sp for sp in speakers if sp in self._starts]
+        return list(merge(*(self._speaker_range(sp, t1, t2) for sp in speakers), key=_start))
+
+    def at(self, t, speakers=None):
+        """Segments active at instant t"""
+        t = self.to_seconds(t)
+        speakers = self.speakers if speakers is None else [sp for sp in speakers if sp in self._starts]
+        result = []
+        for speaker in speakers:
+            for starts, ends, segments in self._layers[speaker]:
+                for i in range(bisect_right(ends, t), bisect_right(starts, t)):
+                    result.append((starts[i], ends[i], speaker, segments[i]))
+        return result
+
+    def who_spoke_at(self, t):
+        return sorted({speaker for _, _, speaker, _ in self.at(t)})
+
+    def iter_speaker(self, speaker):
+        """One speaker's segments in time order"""
+        for start, end, seg in zip(self._starts.get(speaker, []), self._ends.get(speaker, []),
+                                   self._segments.get(speaker, [])):
+            yield start, end, seg
+
+
+def _layers(starts, ends, segments):
+    """
+    Split segments (in start order) into as few layers of non-overlapping
+    segments as possible: each goes on the layer that freed up earliest,
+    if that one ended by its start. Returns [(starts, ends, segments)].
+    """
+    layers = []
+    free_at = []  # (end of the layer's last segment, layer index)
+    for start, end, seg in zip(starts, ends, segments):
+        if free_at and free_at[0][0] <= start:
+            _, index = heappop(free_at)
+        else:
+            index = len(layers)
+            layers.append(([], [], []))
+        for column, value in zip(layers[index], (start, end, seg)):
+            column.append(value)
+        heappush(free_at, (end, index))
+    return layers
+
+
+def _start(row):
+    return row[0]
+
+
+def _parse(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
@@ -0,0 +1,75 @@
+import wave
+
+try:
+    import soundfile
+except ImportError:  # Optional: only needed once tracks have been archived to FLAC
+    soundfile = None
+
+
+def is_flac(path):
+    return path.lower().endswith('.flac')
+
+
+def open_track(path):
+    """A wave.Wave_read-style reader for a speaker track, WAV or (archived) FLAC"""
+    if is_flac(path):
+        return FlacReader(path)
+    return wave.open(path, 'rb')
+
+
+class FlacReader:
+    """
+    The part of wave.Wave_read the track readers use, over soundfile, so
+    FLAC tracks read as 16-bit PCM and seek by frame like WAV ones.
+    """
+
+    def __init__(self, path):
+        if soundfile is None:
+            raise RuntimeError("Reading FLAC tracks needs soundfile (pip install soundfile)")
+        self.file = soundfile.SoundFile(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def getnchannels(self):
+        return self.file.channels
+
+    def getframerate(self):
+        return self.file.samplerate
+
+    def getsampwidth(self):
+        return 2
+
+    def getnframes(self):
+        return self.file.frames
+
+    def setpos(self, pos):
+        # Seeking FLAC means finding and decoding a frame; sequential reads don't need it
+        if pos != self.file.tell():
+            self.file.seek(pos)
+
+    def tell(self):
+        return self.file.tell()
+
+    def readframes(self, n):
+        return self.file.read(n, dtype='int16').tobytes()
+
+    def close(self):
+        self.file.close()
+
+
+def read_audio_segment(path):
+    """
+    A whole track as a pydub AudioSegment. FLAC is decoded here rather
+    than by ffmpeg; anything else goes to AudioSegment.from_file, which
+    reads WAV itself and falls back to ffmpeg only when it can't.
+    """
+    from pydub import AudioSegment
+    if not is_flac(path):
+        return AudioSegment.from_file(path)
+    with open_track(path) as reader:
+        return AudioSegment(data=reader.readframes(reader.getnframes()), sample_width=reader.getsampwidth(),
+                            frame_rate=reader.getframerate(), channels=reader.getnchannels())
@@ -0,0 +1,86 @@
+import collections
+import math
+import os
+
+import numpy as np
+
+from receive_path import CHANNELS
+
+# RECORDING_VAD=tag keeps every frame but only speech extends the timeline;
+# drop also leaves non-speech frames out of the tracks
+VAD_MODE = os.getenv('RECORDING_VAD') or None
+VAD_MODES = ('tag', 'drop')
+# Speech has to be this far above the speaker's noise floor...
+SPEECH_MARGIN_DB = 9.0
+# ...and above this level at all
+MIN_SPEECH_DBFS = -50.0
+# Fraction of neighbouring samples changing sign; hiss and clicks cross far more often than voice
+MAX_SPEECH_ZCR = 0.35
+# Frames (20 ms each) still counted as speech after the last voiced one, so word endings aren't cut
+HANGOVER_FRAMES = 15
+# Where the noise floor starts, and how fast (dB per frame) it creeps up towards louder frames
+INITIAL_NOISE_FLOOR_DBFS = -65.0
+NOISE_FLOOR_RISE_DB = 0.02
+
+
+def frame_features(pcm):
+    """(level in dBFS, zero-crossing rate) of one frame of interleaved int16 PCM"""
+    samples = np.frombuffer(pcm, dtype=np.int16).reshape(-1, CHANNELS).mean(axis=1)
+    if len(samples) < 2:
+        return -math.inf, 0.0
+    rms = math.sqrt(float(np.dot(samples, samples)) / len(samples))
+    signs = np.signbit(samples)
+    zcr = np.count_nonzero(signs[1:] != signs[:-1]) / (len(samples) - 1)
+    return 20 * math.log10(max(rms, 1.0) / 32768), zcr
+
+
+class VoiceActivityDetector:
+    """
+    Streaming speech / non-speech decision per 20 ms frame and speaker.
+
+    Each speaker has a noise floor that drops straight to any quieter
+    frame and rises slowly otherwise (minimum tracking). A frame is voiced
+    when it is MIN_SPEECH_DBFS or louder, SPEECH_MARGIN_DB above the floor
+    and not noise-like by zero-crossing rate; HANGOVER_FRAMES after the
+    last voiced frame still count as speech.
+    """
+
+    def __init__(self, mode='tag', margin_db=SPEECH_MARGIN_DB, min_dbfs=MIN_SPEECH_DBFS,
+                 max_zcr=MAX_SPEECH_ZCR, hangover=HANGOVER_FRAMES):
+        if mode not in VAD_MODES:
+            raise ValueError(f"VAD mode must be one of {VAD_MODES}")
+        self.mode = mode
+        self.margin_db = margin_db
+        self.min_dbfs = min_dbfs
+        self.max_zcr = max_zcr
+        self.hangover = hangover
+        self.noise_floor = {}
+        self.hangover_left = {}
+        self.speech = collections.Counter()
+        self.non_speech = collections.Counter()
+
+    @property
+    def drop(self):
+        return self.mode == 'drop'
+
+    def is_speech(self, user_id, pcm):
+        level, zcr = frame_features(pcm)
+        floor = self.noise_floor.get(user_id, INITIAL_NOISE_FLOOR_DBFS)
+        floor = level if level < floor else min(level, floor + NOISE_FLOOR_RISE_DB)
+        self.noise_floor[user_id] = floor
+
+        if level >= self.min_dbfs and level >= floor + self.margin_db and zcr <= self.max_zcr:
+            self.hangover_left[user_id] = self.hangover
+            speech = True
+        else:
+            left = self.hangover_left.get(user_id, 0)
+            self.hangover_left[user_id] = max(0, left - 1)
+            speech = left > 0
+        (self.speech if speech else self.non_speech)[user_id] += 1
+        return speech
+
+    def stats(self):
+        """Speech and non-speech frame counts per user"""
+        users = set(self.speech) | set(self.non_speech)
+        return {user_id: {'speech': self.speech[user_id], 'non_speech': self.non_speech[user_id]}
+                for user_id in users}
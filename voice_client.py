@@ -0,0 +1,177 @@
+import asyncio
+import os
+import threading
+import time
+
+import discord
+from discord.sinks import RawData, RecordingException, Sink
+
+from decode_manager import RecordingDecodeManager
+from receive_path import CHANNELS, RTP_WRAP, SAMPLING_RATE, ReceivePath
+from ssrc_map import ParkedFrames, SSRCFilter, SSRCMap
+from voice_reactor import get_reactor
+
+# VOICE_REACTOR=0 goes back to py-cord's receive and decode threads per recording
+USE_REACTOR = os.getenv('VOICE_REACTOR', '1') != '0'
+
+
+class RecordingVoiceClient(ReceivePath, discord.VoiceClient):
+    """
+    VoiceClient used for recording. Connect with
+    `channel.connect(cls=RecordingVoiceClient)`.
+
+    On top of py-cord's recv_decoded_audio it places every packet on a
+    common session clock: `data.session_sample` is the sample index (at
+    48 kHz, counted from the first packet of the session) where the packet's
+    audio starts, derived from its RTP timestamp. Sinks that implement
+    `write_packet(data, user_id)` get the whole packet instead of just PCM.
+    A `mixer` (live_stream.LiveMixer) set on the client is fed every packet.
+
+    Packets go through a per-SSRC jitter buffer (RecordingDecodeManager)
+    before decoding, so they reach the decoder and the sink in sequence
+    order.
+
+    Frames from an SSRC the gateway hasn't mapped to a user yet are parked
+    (ParkedFrames) and written once the SPEAKING event lands, instead of
+    blocking the decode thread until it does.
+
+    The sink's user filter is applied to the SSRC in the RTP header, before
+    a packet is decrypted or decoded.
+
+    By default no threads are started per recording: the socket is
+    registered with the shared VoiceReactor, decoding runs on its worker
+    pool and a sink time limit is a loop timer rather than a sleeper thread.
+
+    With a ProcessSink, frames are not decoded here at all: they go to a
+    decode worker process (decode_processes) through shared memory.
+    """
+
+    use_reactor = USE_REACTOR
+
+    def start_recording(self, sink, callback, *args, sync_start: bool = False):
+        # Same as py-cord's, but with our decode manager
+        if not self.is_connected():
+            raise RecordingException("Not connected to voice channel.")
+        if self.recording:
+            raise RecordingException("Already recording.")
+        if getattr(self, 'finishing', None) is not None and not self.finishing.done():
+            raise RecordingException("Still finishing the previous recording.")
+        if not isinstance(sink, Sink):
+            raise RecordingException("Must provide a Sink object.")
+
+        wrap_ssrc_map(self.ws)
+        self.rtp_clock = {}  # ssrc -> [session sample of rtp 0, newest unwrapped rtp]
+        self.parked = ParkedFrames()
+        self.ssrc_filter = SSRCFilter(getattr(sink, 'filtered_users', None) or ())
+        self.empty_socket()
+
+        self.recording = True
+        self.sync_start = sync_start
+        self.sink = sink
+        # decode_processes pulls in multiprocessing and numpy; only load it when recording
+        from decode_processes import ProcessSink, get_decode_pool
+        if isinstance(sink, ProcessSink):
+            self.decoder = get_decode_pool().open(self, sink)
+        else:
+            self.decoder = RecordingDecodeManager(self)
+        if not self.use_reactor:
+            self.decoder.start()
+            sink.init(self)
+            t = threading.Thread(target=self.recv_audio, args=(sink, callback, *args))
+            t.start()
+            return
+
+        # What recv_audio would set up
+        self.user_timestamps = {}
+        self.starting_time = time.perf_counter()
+        self.record_callback = (callback, args)
+        # Filters.init would start a sleeper thread for a time limit; use a loop timer instead
+        time_limit, sink.seconds = sink.seconds, 0
+        sink.init(self)
+        sink.seconds = time_limit
+        self.time_limit_handle = None
+        if time_limit:
+            self.time_limit_handle = self.loop.call_later(time_limit, self._time_limit_reached)
+        get_reactor().register(self)
+
+    def _time_limit_reached(self):
+        if self.recording and not self.sink.finished:
+            self.stop_recording()
+
+    def stop_recording(self):
+        if not self.use_reactor:
+            # py-cord's stop waits for the decode thread; on the loop that stalls every guild
+            if not self._on_loop():
+                return super().stop_recording()
+            if not self.recording:
+                raise RecordingException("Not currently recording audio.")
+            if getattr(self, 'finishing', None) is None or self.finishing.done():
+                self.finishing = self.loop.run_in_executor(None, super().stop_recording)
+            return
+        if not self.recording:
+            raise RecordingException("Not currently recording audio.")
+        # The reactor stops reading this socket as soon as recording is False
+        self.recording = False
+        self.paused = False
+        if self.time_limit_handle is not None:
+            self.time_limit_handle.cancel()
+        self.stopping_time = time.perf_counter()
+        # Joining the decode worker and closing the sink can take seconds; keep that off the loop
+        self.finishing = self.loop.run_in_executor(None, self._finish_recording, self.decoder, self.sink,
+                                                   self.record_callback)
+
+    def _on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _finish_recording(self, decoder, sink, record_callback):
+        # The end of recv_audio: finish the files, then hand them to the callback on the loop
+        get_reactor().unregister(self)
+        decoder.stop()
+        sink.cleanup()
+        callback, args = record_callback
+        asyncio.run_coroutine_threadsafe(callback(sink, *args), self.loop)
+
+    def unpack_audio(self, data):
+        if self.paused:
+            return
+        if 200 <= data[1] <= 204:
+            return  # RTCP
+        # SSRC is bytes 8-12 of the RTP header; filtered speakers cost no crypto or decode
+        if self.ssrc_filter.deny(int.from_bytes(data[8:12], 'big'), self.ssrc_map()):
+            return
+
+        data = RawData(data, self)
+        # Silence frames still go to the jitter buffer, so their sequence numbers don't count as lost
+        data.silence = data.decrypted_data == b"\xf8\xff\xfe"
+        self.decoder.decode(data)
+
+    def receive_stats(self):
+        """Packet counts per user: received, reordered, late, lost"""
+        ssrc_map = self.ssrc_map()
+        stats = {}
+        for ssrc, counts in self.decoder.stats().items():
+            user_id = ssrc_map.user_id(ssrc)
+            stats[ssrc if user_id is None else user_id] = counts
+        return stats
+
+    async def connect_websocket(self):
+        # Every (re)connect makes a websocket with a plain dict; swap it here, on the loop
+        # thread that applies SPEAKING events, so no update can land mid-swap
+        return wrap_ssrc_map(await super().connect_websocket())
+
+    def ssrc_map(self):
+        """The websocket's SSRCMap (see wrap_ssrc_map); safe to call from any thread"""
+        return self.ws.ssrc_map
+
+    def get_ssrc(self, user_id):
+        return self.ssrc_map().ssrc_of(user_id)
+
+
+def wrap_ssrc_map(ws):
+    """Replace ws.ssrc_map with an SSRCMap of the same entries; only call on the event loop"""
+    if not isinstance(ws.ssrc_map, SSRCMap):
+        ws.ssrc_map = SSRCMap(ws.ssrc_map)
+    return ws
@@ -0,0 +1,184 @@
+import collections
+import os
+import selectors
+import socket
+import threading
+
+# Decode threads shared by every recording, whatever the number of guilds
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', min(4, os.cpu_count() or 1)))
+# Longest a worker sleeps with nothing queued; bounds how late jitter buffer timeouts fire
+WORKER_POLL_SECONDS = 0.005
+SELECT_TIMEOUT = 0.05
+
+
+class DecodeWorker(threading.Thread):
+    """
+    Runs the decode stage of several recordings, one RecordingDecodeManager
+    each. A manager stays on one worker for its whole life, so each SSRC's
+    packets are still decoded in order by a single thread.
+    """
+
+    def __init__(self, index):
+        super().__init__(daemon=True, name=f"DecodeWorker-{index}")
+        self.managers = []
+        self.finishing = collections.deque()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+
+    def add(self, manager):
+        manager.worker = self
+        with self.lock:
+            self.managers.append(manager)
+
+    def finish(self, manager, timeout=1.0):
+        """Have the worker flush and drop a stopped manager; True once it has"""
+        done = threading.Event()
+        self.finishing.append((manager, done))
+        self.wake.set()
+        return done.wait(timeout)
+
+    def run(self):
+        while True:
+            self.wake.wait(WORKER_POLL_SECONDS)
+            self.wake.clear()
+            with self.lock:
+                managers = list(self.managers)
+            for manager in managers:
+                try:
+                    manager.pump()
+                except Exception as e:
+                    print(f"Decode error: {e}")
+            while self.finishing:
+                manager, done = self.finishing.popleft()
+                with self.lock:
+                    if manager in self.managers:
+                        self.managers.remove(manager)
+                try:
+                    manager.finish()
+                finally:
+                    done.set()
+
+
+class VoiceReactor:
+    """
+    One thread that waits on every recording's UDP socket with epoll (via
+    selectors) and hands packets to a fixed pool of DecodeWorkers, in place
+    of py-cord's receive thread and DecodeManager thread per recording.
+
+    Registration changes are queued and applied by the reactor thread
+    itself, which a socketpair wakes out of select().
+    """
+
+    def __init__(self, workers=DECODE_WORKERS):
+        self.selector = selectors.DefaultSelector()
+        self.workers = [DecodeWorker(i) for i in range(workers)]
+        self.clients = {}  # voice client -> socket it is registered with
+        self.pending = collections.deque()
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ, None)
+        self.thread = threading.Thread(target=self._run, daemon=True, name="VoiceReactor")
+        self.started = False
+        self.lock = threading.Lock()
+
+    def register(self, vc):
+        """Start receiving for vc; its decoder is pinned to the least busy worker"""
+        with self.lock:
+            if not self.started:
+                for worker in self.workers:
+                    worker.start()
+                self.thread.start()
+                self.started = True
+        if hasattr(vc.decoder, 'pump'):  # Not when a decode process does the decoding
+            worker = min(self.workers, key=lambda w: len(w.managers))
+            worker.add(vc.decoder)
+        self._apply(('add', vc, None))
+
+    def unregister(self, vc, timeout=1.0):
+        """Stop receiving for vc; returns once the reactor won't touch it again"""
+        if threading.current_thread() is self.thread:
+            self._remove(vc)
+            return
+        done = threading.Event()
+        self._apply(('remove', vc, done))
+        done.wait(timeout)
+
+    def _apply(self, op):
+        self.pending.append(op)
+        self.wakeup_send.send(b'\0')
+
+    def _run(self):
+        while True:
+            for key, _ in self.selector.select(SELECT_TIMEOUT):
+                vc = key.data
+                if vc is None:
+                    self._drain_wakeups()
+                    continue
+                self._receive(vc, key.fileobj)
+            while self.pending:
+                action, vc, done = self.pending.popleft()
+                if action == 'add':
+                    self._add(vc)
+                else:
+                    self._remove(vc)
+                    done.set()
+            self._check_sockets()
+
+    def _receive(self, vc, sock):
+        worker = vc.decoder.worker
+        while vc.recording:
+            try:
+                data = sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Same as py-cord's receive loop: a dead socket ends the recording
+                self._remove(vc)
+                vc.loop.call_soon_threadsafe(vc.stop_recording)
+                break
+            try:
+                vc.unpack_audio(data)
+            except Exception as e:
+                print(f"Receive error: {e}")
+        if worker is not None:
+            worker.wake.set()
+
+    def _add(self, vc):
+        self.clients[vc] = vc.socket
+        self.selector.register(vc.socket, selectors.EVENT_READ, vc)
+
+    def _remove(self, vc):
+        sock = self.clients.pop(vc, None)
+        if sock is not None:
+            try:
+                self.selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+
+    def _check_sockets(self):
+        # A voice reconnect replaces vc.socket; follow it
+        for vc, sock in list(self.clients.items()):
+            if vc.socket is not sock:
+                self._remove(vc)
+                if vc.socket:
+                    self._add(vc)
+
+    def _drain_wakeups(self):
+        try:
+            while self.wakeup_recv.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+
+_reactor = None
+_reactor_lock = threading.Lock()
+
+
+def get_reactor():
+    """The process-wide reactor, created on first use"""
+    global _reactor
+    with _reactor_lock:
+        if _reactor is None:
+            _reactor = VoiceReactor()
+        return _reactor
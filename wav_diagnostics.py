@@ -0,0 +1,281 @@
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+# Frames read per pass; memory stays at one chunk whatever the file length
+DIAGNOSE_CHUNK_FRAMES = 1 << 16
+# Fewer non-zero samples than this and a file is reported as mostly silence
+MOSTLY_SILENT_FRACTION = 0.01
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# Columns of the CSV report; per-channel stats are only in the JSON one
+REPORT_FIELDS = ['path', 'file_size', 'audio_format', 'channels', 'sample_rate', 'sample_width',
+                 'header_data_size', 'data_size', 'duration', 'min', 'max', 'mean', 'std',
+                 'rms_dbfs', 'peak_dbfs', 'nonzero_fraction', 'clipped', 'issues', 'error']
+
+
+def read_wav_header(f, file_size):
+    """
+    fmt fields and data chunk location by walking the RIFF chunks, rather
+    than assuming the 44-byte header. A data size of 0 (what WaveSink used
+    to leave) or one running past the end is replaced by what the file holds.
+    """
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("no data chunk")
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            body = f.read(size + (size & 1))
+            audio_format, channels, rate, byte_rate, block_align, bits = struct.unpack_from('<HHIIHH', body)
+            if audio_format == WAVE_FORMAT_EXTENSIBLE and size >= 40:
+                # The real format is the first two bytes of the sub-format GUID
+                audio_format = struct.unpack_from('<H', body, 24)[0]
+            fmt = {'audio_format': audio_format, 'channels': channels, 'sample_rate': rate,
+                   'byte_rate': byte_rate, 'block_align': block_align, 'bits_per_sample': bits}
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            data_start = f.tell()
+            available = file_size - data_start
+            return dict(fmt, data_start=data_start, header_data_size=size,
+                        data_size=size if 0 < size <= available else available)
+        else:
+            f.seek(size + (size & 1), 1)
+
+
+def decode_samples(raw, audio_format, sample_width, channels):
+    """Interleaved PCM bytes as a (frames, channels) array, and the full-scale value"""
+    if audio_format == WAVE_FORMAT_IEEE_FLOAT:
+        if sample_width not in (4, 8):
+            raise ValueError(f"unsupported {sample_width * 8}-bit float")
+        return np.frombuffer(raw, dtype=f'<f{sample_width}').reshape(-1, channels), 1.0
+    if audio_format != WAVE_FORMAT_PCM:
+        raise ValueError(f"unsupported audio format {audio_format}")
+    if sample_width == 1:
+        # 8-bit WAV is unsigned
+        samples = np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128
+    elif sample_width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8) >> 8
+    elif sample_width in (2, 4, 8):
+        samples = np.frombuffer(raw, dtype=f'<i{sample_width}')
+    else:
+        raise ValueError(f"unsupported {sample_width * 8}-bit PCM")
+    return samples.reshape(-1, channels), float(1 << (8 * sample_width - 1))
+
+
+class StreamingStats:
+    """
+    Per-channel count, min, max, mean, variance, non-zero and clipped
+    samples over chunks of (frames, channels) samples. Means and variances
+    of chunks are merged pairwise (Chan et al.), so one pass is enough and
+    long files don't lose precision in a running sum of squares.
+    """
+
+    def __init__(self, channels, full_scale):
+        self.full_scale = full_scale
+        self.count = 0
+        self.mean = np.zeros(channels)
+        self.m2 = np.zeros(channels)
+        self.min = np.full(channels, np.inf)
+        self.max = np.full(channels, -np.inf)
+        self.nonzero = np.zeros(channels, dtype=np.int64)
+        self.clipped = np.zeros(channels, dtype=np.int64)
+
+    def add(self, samples):
+        n = len(samples)
+        if not n:
+            return
+        x = samples.astype(np.float64)
+        mean = x.mean(axis=0)
+        m2 = ((x - mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+        self.min = np.minimum(self.min, x.min(axis=0))
+        self.max = np.maximum(self.max, x.max(axis=0))
+        self.nonzero += np.count_nonzero(samples, axis=0)
+        # Integer full scale is asymmetric: -32768 and 32767 both count as clipped
+        top = self.full_scale - 1 if samples.dtype.kind == 'i' else self.full_scale
+        self.clipped += np.count_nonzero((x <= -self.full_scale) | (x >= top), axis=0)
+
+    def _summary(self, count, mean, m2, lo, hi, nonzero, clipped):
+        if not count:
+            return {'samples': 0}
+        mean_square = m2 / count + mean ** 2
+        peak = max(abs(lo), abs(hi))
+        return {
+            'samples': int(count),
+            'min': _number(lo),
+            'max': _number(hi),
+            'mean': float(mean),
+            'std': math.sqrt(m2 / count),
+            'rms_dbfs': _dbfs(math.sqrt(mean_square) / self.full_scale),
+            'peak_dbfs': _dbfs(peak / self.full_scale),
+            'nonzero_fraction': float(nonzero / count),
+            'clipped': int(clipped),
+        }
+
+    def channels(self):
+        return [self._summary(self.count, self.mean[c], self.m2[c], self.min[c], self.max[c],
+                              self.nonzero[c], self.clipped[c]) for c in range(len(self.mean))]
+
+    def overall(self):
+        """All channels' samples together, as the old single-array diagnosis reported them"""
+        k = len(self.mean)
+        mean = float(self.mean.mean())
+        m2 = float(self.m2.sum() + self.count * ((self.mean - mean) ** 2).sum())
+        return self._summary(self.count * k, mean, m2, float(self.min.min()), float(self.max.max()),
+                             int(self.nonzero.sum()), int(self.clipped.sum()))
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def _dbfs(ratio):
+    return 20 * math.log10(ratio) if ratio > 0 else -math.inf
+
+
+def diagnose(filepath, chunk_frames=DIAGNOSE_CHUNK_FRAMES):
+    """
+    Header, data layout and sample statistics of one WAV file in a single
+    chunked pass, as a dict. Problems found go in 'issues'; a file that
+    can't be read at all gets an 'error' instead of the statistics.
+    """
+    result = {'path': filepath, 'issues': []}
+    issues = result['issues']
+    try:
+        result['file_size'] = file_size = os.path.getsize(filepath)
+        with open(filepath, 'rb') as f:
+            header = read_wav_header(f, file_size)
+            channels, block_align = header['channels'], header['block_align']
+            if not channels or not block_align or not header['sample_rate']:
+                raise ValueError("invalid audio parameters in header")
+            sample_width = block_align // channels
+            result.update(header, sample_width=sample_width,
+                          duration=header['data_size'] // block_align / header['sample_rate'])
+            if header['header_data_size'] != header['data_size']:
+                issues.append(f"header says {header['header_data_size']:,} data bytes, "
+                              f"file holds {header['data_size']:,} (fix the header)")
+            if header['data_size'] % block_align:
+                issues.append(f"{header['data_size'] % block_align} trailing bytes after the last frame")
+
+            stats, first = None, None
+            remaining = header['data_size'] // block_align * block_align
+            while remaining:
+                raw = f.read(min(remaining, chunk_frames * block_align))
+                if not raw:
+                    issues.append("data ends before the size in the header")
+                    break
+                raw = raw[:len(raw) - len(raw) % block_align]
+                remaining -= len(raw)
+                samples, full_scale = decode_samples(raw, header['audio_format'], sample_width, channels)
+                if stats is None:
+                    stats = StreamingStats(channels, full_scale)
+                    first = samples.reshape(-1)[:10].tolist()
+                stats.add(samples)
+    except (OSError, ValueError, struct.error) as e:
+        result['error'] = str(e)
+        return result
+
+    if stats is None:
+        issues.append("no audio data")
+        return result
+    result.update(stats.overall())
+    result['first_samples'] = first
+    result['channel_stats'] = stats.channels()
+    if not result['nonzero_fraction']:
+        issues.append("all samples are zero")
+    elif result['nonzero_fraction'] < MOSTLY_SILENT_FRACTION:
+        issues.append("mostly silence")
+    if result['clipped']:
+        issues.append(f"{result['clipped']:,} clipped samples")
+    return result
+
+
+def find_wav_files(root):
+    for folder, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if filename.lower().endswith('.wav'):
+                yield os.path.join(folder, filename)
+
+
+def scan_recordings(root='recordings', workers=None, chunk_frames=DIAGNOSE_CHUNK_FRAMES):
+    """Diagnose every WAV under root across a process pool; results sorted by path"""
+    paths = list(find_wav_files(root))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(diagnose, path, chunk_frames): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append({'path': futures[future], 'issues': [], 'error': str(e)})
+    return sorted(results, key=lambda r: r['path'])
+
+
+def write_report(results, report_path):
+    """JSON (everything) or CSV (one row of REPORT_FIELDS per file), by extension"""
+    if report_path.lower().endswith('.csv'):
+        with open(report_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for result in results:
+                writer.writerow(dict(result, issues='; '.join(result.get('issues', []))))
+    else:
+        with open(report_path, 'w') as f:
+            json.dump(_finite(results), f, indent=2, default=str, allow_nan=False)
+    return report_path
+
+
+def _finite(value):
+    # -inf dBFS for silence (and any NaN) would be written as bare -Infinity, which isn't JSON
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def print_batch_summary(results):
+    errors = [r for r in results if 'error' in r]
+    flagged = [r for r in results if r.get('issues') and 'error' not in r]
+    print(f"📋 {len(results)} files: {len(results) - len(errors) - len(flagged)} fine, "
+          f"{len(flagged)} with issues, {len(errors)} unreadable")
+    for r in errors:
+        print(f"   ❌ {r['path']}: {r['error']}")
+    for r in flagged:
+        print(f"   ⚠️  {r['path']}: {'; '.join(r['issues'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan a recordings tree for broken or silent WAV files")
+    parser.add_argument('root', nargs='?', default='recordings')
+    parser.add_argument('--report', default=None, help="write a .json or .csv report here")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    if not os.path.isdir(args.root):
+        print(f"❌ Directory {args.root} does not exist")
+        sys.exit(1)
+    results = scan_recordings(args.root, args.workers)
+    print_batch_summary(results)
+    if args.report:
+        print(f"✅ Report written to {write_report(results, args.report)}")
@@ -0,0 +1,237 @@
+import json
+import os
+import shutil
+import traceback
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import discord
+
+from live_stats import SpeakerActivityTracker
+from loudness_envelope import EnvelopeBuilder, envelope_path, write_envelope
+from memory_budget import SinkMemory, WAV_HEADER_BYTES, wav_header
+from receive_path import CHANNELS, SAMPLING_RATE
+from vad import VoiceActivityDetector
+
+RECORDING_DIR = 'recordings'
+SEGMENT_GAP_SECONDS = 2.0
+# Start a new segment when a speaker's track drifts this far from the session clock
+DRIFT_TOLERANCE_SAMPLES = 960
+BYTES_PER_SAMPLE = 2 * CHANNELS
+SAMPLE_KEYS = ('sample_offset', 'session_sample', 'end_sample_offset', 'end_session_sample')
+# In-memory PCM one recording may hold before its largest buffers spill to disk
+SINK_MAX_SIZE = 256 * 1024 * 1024
+
+
+class CustomWaveSink(discord.sinks.WaveSink):
+    def __init__(self, max_size=SINK_MAX_SIZE, users=(), vad=None):
+        # users: record only these user ids (RecordingVoiceClient drops the rest before decrypting)
+        # vad: 'tag' or 'drop' to run vad.VoiceActivityDetector on every frame
+        super().__init__(filters={'time': 0, 'users': list(users), 'max_size': max_size})
+        # py-cord reads max_size but never enforces it; SinkMemory does
+        self.memory = SinkMemory(self.max_size)
+        self.time_segments = defaultdict(list)
+        self.last_seen = {}
+        self.user_id_map = {}
+        self.speaker_counter = 1
+        self.first_data_received = {}  # Track first data per user
+        self.activity = SpeakerActivityTracker(gap=SEGMENT_GAP_SECONDS)
+        self.track_samples = {}  # Samples written per user, i.e. the track position
+        self.envelopes = {}  # Per-10 ms RMS/peak of each track, written next to it
+        self.vad = VoiceActivityDetector(vad) if vad else None
+        self.resync = set()  # Users whose next frame starts a new segment, after dropped frames
+
+    def write_packet(self, data, user_id):
+        """Called by RecordingVoiceClient with the whole packet so segments get sample positions"""
+        pcm, pad = data.decoded_data, data.pad_samples
+        speech = True
+        if self.vad is not None:
+            speech = self.vad.is_speech(user_id, pcm[pad * BYTES_PER_SAMPLE:])
+            if self.vad.drop:
+                if not speech:
+                    self.resync.add(user_id)
+                    return
+                if user_id in self.resync:
+                    # The padding only bridges the dropped frames; the new segment's anchor places the audio
+                    pcm, pad = pcm[pad * BYTES_PER_SAMPLE:], 0
+        track_pos = self.track_samples.get(user_id, 0) + pad
+        frame_samples = len(pcm) // BYTES_PER_SAMPLE - pad
+        self.write(pcm, user_id, (track_pos, data.session_sample, frame_samples), speech)
+
+    def write(self, data, user_id, samples=None, speech=True):
+        """Fixed parameter order: (data, user_id)
+
+        samples is (track sample, session sample, frame length) of this
+        packet's audio when the voice client knows it. Frames the VAD
+        found no speech in are stored but leave the timeline alone.
+        """
+        if self.filtered_users and user_id not in self.filtered_users:
+            return
+        if user_id not in self.user_id_map:
+            speaker_label = f"speaker_{len(self.user_id_map) + 1}"
+            self.user_id_map[user_id] = speaker_label
+        if user_id not in self.audio_data:
+            # Spillable buffer with room for the WAV header, filled in by format_audio
+            buffer = self.memory.new_buffer()
+            buffer.write(bytes(WAV_HEADER_BYTES))
+            self.audio_data[user_id] = discord.sinks.AudioData(buffer)
+            self.envelopes[user_id] = EnvelopeBuilder(SAMPLING_RATE, CHANNELS)
+
+        speaker = self.user_id_map[user_id]
+        self.track_samples[user_id] = self.track_samples.get(user_id, 0) + len(data) // BYTES_PER_SAMPLE
+        self.envelopes[user_id].add(data)
+        if not speech:
+            super().write(data, user_id)
+            return
+        now = datetime.now()
+        self.first_data_received.setdefault(user_id, now)
+        self.activity.update(speaker, now)
+
+        # Initialize if first segment
+        if user_id not in self.last_seen:
+            segment = {
+                'start': self.first_data_received[user_id],
+                'end': now
+            }
+            self.time_segments[speaker].append(segment)
+            self._anchor(segment, samples)
+            self.resync.discard(user_id)
+            self.last_seen[user_id] = now
+            super().write(data, user_id)
+            return
+
+        last = self.last_seen[user_id]
+        gap = (now - last).total_seconds()
+        segment = self.time_segments[speaker][-1]
+
+        # Extend segment if within 2s gap, else new segment
+        if gap <= SEGMENT_GAP_SECONDS and not self._drifted(segment, samples) and user_id not in self.resync:
+            segment['end'] = now
+        else:
+            if gap > SEGMENT_GAP_SECONDS:
+                # Insert silence segment
+                self.time_segments[speaker].append({
+                    'start': last + timedelta(seconds=1),
+                    'end': now - timedelta(seconds=1),
+                    'silent': True
+                })
+            # New speech segment
+            segment = {
+                'start': now,
+                'end': now
+            }
+            self.time_segments[speaker].append(segment)
+            self._anchor(segment, samples)
+            self.resync.discard(user_id)
+
+        self._extend(segment, samples)
+        self.last_seen[user_id] = now
+        super().write(data, user_id)
+
+    @staticmethod
+    def _anchor(segment, samples):
+        if samples is not None:
+            segment['sample_offset'] = samples[0]
+            segment['session_sample'] = samples[1]
+            CustomWaveSink._extend(segment, samples)
+
+    @staticmethod
+    def _extend(segment, samples):
+        if samples is not None and 'sample_offset' in segment:
+            segment['end_sample_offset'] = samples[0] + samples[2]
+            segment['end_session_sample'] = samples[1] + samples[2]
+
+    @staticmethod
+    def _drifted(segment, samples):
+        # Within a segment, track position and session clock must advance together
+        if samples is None or 'sample_offset' not in segment:
+            return False
+        expected = segment['session_sample'] + samples[0] - segment['sample_offset']
+        return abs(samples[1] - expected) > DRIFT_TOLERANCE_SAMPLES
+
+    def format_audio(self, audio):
+        """Fill in the WAV header reserved at the start of the buffer, without copying the PCM"""
+        data_bytes = audio.file.seek(0, os.SEEK_END) - WAV_HEADER_BYTES
+        audio.file.seek(0)
+        audio.file.write(wav_header(data_bytes, CHANNELS, SAMPLING_RATE, 2))
+        audio.file.seek(0)
+        audio.on_format(self.encoding)
+
+    def get_timeline_data(self):
+        return dict(self.time_segments)
+
+    def recorded_users(self):
+        return list(self.audio_data)
+
+    def live_stats(self):
+        """(activity snapshot, user id -> speaker label, memory metrics) for /live_stats"""
+        return self.activity.snapshot(), dict(self.user_id_map), self.memory.metrics()
+
+
+def write_session(sink, session_id, names, directory=RECORDING_DIR):
+    """
+    Write a stopped CustomWaveSink's tracks (for the users in names, user
+    id -> file-safe display name) with their loudness envelopes, its
+    timeline and its overlap details.
+
+    Returns {'tracks', 'timeline', 'memory', 'vad', 'errors'}; a track that fails
+    is left out and its traceback listed under errors, by user id.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    # 1. Save audio files
+    tracks = []
+    errors = {}
+    for user_id, audio in sink.audio_data.items():
+        if user_id not in names:
+            continue
+        try:
+            filename = f"{directory}/{session_id}_{names[user_id]}_{user_id}.wav"
+            with open(filename, 'wb') as f:
+                audio.file.seek(0)
+                shutil.copyfileobj(audio.file, f)
+            write_envelope(sink.envelopes[user_id].finish(), envelope_path(filename))
+            sample_count = sink.track_samples.get(user_id, 0)
+            tracks.append({
+                'speaker': sink.user_id_map.get(user_id, str(user_id)),
+                'user_id': user_id,
+                'name': names[user_id],
+                'path': filename,
+                'sample_rate': SAMPLING_RATE,
+                'channels': CHANNELS,
+                'sample_count': sample_count,
+                'duration': sample_count / SAMPLING_RATE
+            })
+        except Exception:
+            errors[user_id] = traceback.format_exc()
+    memory = sink.memory.metrics()
+    sink.memory.release()
+
+    # 2. Save timeline with silence segments
+    timeline = {
+        user_id: [
+            {
+                'start': seg['start'].isoformat(),
+                'end': seg['end'].isoformat(),
+                'silent': seg.get('silent', False),
+                **{key: seg[key] for key in SAMPLE_KEYS if key in seg}
+            }
+            for seg in segments
+        ]
+        for user_id, segments in sink.get_timeline_data().items()
+    }
+
+    timeline_path = f"{directory}/{session_id}_timeline.json"
+    with open(timeline_path, 'w') as f:
+        json.dump(timeline, f, indent=2)
+
+    # 3. Overlaps and talk time were tracked while recording
+    with open(f"{directory}/{session_id}_overlap_details.json", 'w') as f:
+        json.dump({
+            'overlaps': sink.activity.overlap_details(),
+            'late_segments': [],
+            'stats': sink.activity.snapshot()
+        }, f, indent=2)
+
+    vad = sink.vad.stats() if sink.vad is not None else None
+    return {'tracks': tracks, 'timeline': timeline_path, 'memory': memory, 'vad': vad, 'errors': errors}